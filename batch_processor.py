@@ -11,43 +11,40 @@ runs OCR, and organizes outputs into separate folders.
 import os
 import json
 import shutil
+import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, List
 import subprocess
 import sys
 
-def load_config(config_file: str = "config.json") -> Dict:
-    """Load configuration from JSON file"""
-    try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config
-    except FileNotFoundError:
-        print(f"❌ Config file not found: {config_file}")
-        raise
-    except json.JSONDecodeError as e:
-        print(f"❌ Invalid JSON in config file: {e}")
-        raise
+from config_loader import load_config
 
 def find_pdf_files(input_dir: str) -> List[str]:
     """Find all PDF files in the input directory"""
-    pdf_files = []
-    input_path = Path(input_dir)
-    
-    if not input_path.exists():
+    try:
+        with os.scandir(input_dir) as entries:
+            pdf_files = [entry.path for entry in entries if entry.name.endswith('.pdf') and entry.is_file()]
+    except FileNotFoundError:
         print(f"❌ Input directory not found: {input_dir}")
         return []
     
-    for file in input_path.glob("*.pdf"):
-        pdf_files.append(str(file))
-    
     return sorted(pdf_files)
 
-def ensure_directories(config: Dict):
-    """Ensure all required directories exist"""
+def ensure_directories(config: Dict, base_dir: str = ""):
+    """
+    Ensure all required directories exist
+    
+    Args:
+        config: Configuration whose folders to create
+        base_dir: Directory relative folder paths are resolved against (default: current directory)
+    """
     folders = config.get('folders', {})
     
     dirs_to_create = [
+        folders.get('to_read', 'to-read'),
+        folders.get('input', 'read'),
         folders.get('output', 'output'),
         folders.get('images', 'output/images'),
         folders.get('markdown', 'output/markdown'),
@@ -55,7 +52,7 @@ def ensure_directories(config: Dict):
     ]
     
     for dir_path in dirs_to_create:
-        Path(dir_path).mkdir(parents=True, exist_ok=True)
+        (Path(base_dir) / dir_path).mkdir(parents=True, exist_ok=True)
         print(f"📁 Ensured directory exists: {dir_path}")
 
 def extract_pdf_images(pdf_path: str, config: Dict) -> str:
@@ -85,60 +82,166 @@ def extract_pdf_images(pdf_path: str, config: Dict) -> str:
         print(f"❌ Error extracting from {pdf_path}: {e}")
         return ""
 
-def run_ocr_on_images(images_dir: str, pdf_name: str, config: Dict):
-    """Run OCR on extracted images and save results to organized folders"""
-    if not os.path.exists(images_dir) or not os.listdir(images_dir):
+def _is_empty_dir(path: str) -> bool:
+    """Check for an empty directory without listing all of its entries"""
+    with os.scandir(path) as entries:
+        return not any(entries)
+
+def run_ocr_on_images(images_dir: str, pdf_name: str, config: Dict) -> int:
+    """Run OCR on extracted images and save results to organized folders
+
+    Returns:
+        Number of successful OCR extractions
+    """
+    if not os.path.exists(images_dir) or _is_empty_dir(images_dir):
         print(f"⚠️  No images found in {images_dir}")
-        return
+        return 0
     
     ocr_engine = config.get('ocr_engine', 'tesseract').lower()
     
     # Import the unified OCR processor functions
     try:
-        from unified_ocr_processor import process_images_with_ocr, generate_markdown, generate_html
+        from unified_ocr_processor import process_images_with_ocr
         
         print(f"🔍 Running {ocr_engine.upper()} OCR on {pdf_name}...")
         
         # Process images with OCR
         results = process_images_with_ocr(images_dir, config)
         
-        if not results:
-            print(f"❌ No OCR results for {pdf_name}")
-            return
-        
-        # Generate output files
-        folders = config.get('folders', {})
-        markdown_dir = folders.get('markdown', 'output/markdown')
-        html_dir = folders.get('html', 'output/html')
-        
-        # Create output filenames
-        markdown_file = os.path.join(markdown_dir, f"{pdf_name}_{ocr_engine}_results.md")
-        html_file = os.path.join(html_dir, f"{pdf_name}_{ocr_engine}_results.html")
-        
-        # Generate outputs based on config
-        output_config = config.get('output', {})
-        
-        if output_config.get('generate_markdown', True):
-            generate_markdown(results, markdown_file, config)
-            print(f"📝 Markdown saved: {markdown_file}")
-        
-        if output_config.get('generate_html', True):
-            generate_html(markdown_file, html_file, config)
-            print(f"🌐 HTML saved: {html_file}")
-        
-        # Print summary statistics
-        successful = sum(1 for r in results if r['success'])
-        success_rate = (successful / len(results)) * 100 if results else 0
-        avg_confidence = sum(r['confidence'] for r in results if r['success']) / successful if successful > 0 else 0
-        
-        print(f"📊 {pdf_name} Results:")
-        print(f"   • {len(results)} images processed")
-        print(f"   • {successful} successful extractions")
-        print(f"   • {success_rate:.1f}% success rate")
-        print(f"   • {avg_confidence:.1%} average confidence")
+        return save_ocr_outputs(results, pdf_name, config)
         
     except Exception as e:
         print(f"❌ Error running OCR on {pdf_name}: {e}")
+        return 0
+
+def save_ocr_outputs(results: List[Dict], pdf_name: str, config: Dict) -> int:
+    """Write the markdown and HTML outputs for one PDF's OCR results
+
+    Returns:
+        Number of successful OCR extractions
+    """
+    from unified_ocr_processor import generate_markdown, generate_html
+    from ocr_stats import compute_ocr_statistics
+    
+    ocr_engine = config.get('ocr_engine', 'tesseract').lower()
+    
+    if not results:
+        print(f"❌ No OCR results for {pdf_name}")
+        return 0
+    
+    # Generate output files
+    folders = config.get('folders', {})
+    markdown_dir = folders.get('markdown', 'output/markdown')
+    html_dir = folders.get('html', 'output/html')
+    
+    # Create output filenames
+    markdown_file = os.path.join(markdown_dir, f"{pdf_name}_{ocr_engine}_results.md")
+    html_file = os.path.join(html_dir, f"{pdf_name}_{ocr_engine}_results.html")
+    
+    # Generate outputs based on config
+    output_config = config.get('output', {})
+    
+    if output_config.get('generate_markdown', True):
+        generate_markdown(results, markdown_file, config)
+        print(f"📝 Markdown saved: {markdown_file}")
+    
+    if output_config.get('generate_html', True):
+        generate_html(markdown_file, html_file, config)
+        print(f"🌐 HTML saved: {html_file}")
+    
+    # Print summary statistics
+    stats = compute_ocr_statistics(results)
+    
+    print(f"📊 {pdf_name} Results:")
+    print(f"   • {stats['total_images']} images processed")
+    print(f"   • {stats['successful_extractions']} successful extractions")
+    print(f"   • {stats['success_rate']:.1f}% success rate")
+    print(f"   • {stats['avg_confidence']:.1%} average confidence")
+    
+    return stats['successful_extractions']
+
+def _extract_single_pdf(pdf_path: str, config: Dict) -> Dict:
+    """
+    Extract images for a single PDF.
+    
+    Runs in a worker process, so it only returns plain values that the
+    parent collects for the OCR pass.
+    """
+    pdf_name = Path(pdf_path).stem
+    image_count = 0
+    
+    # Extract images
+    images_dir = extract_pdf_images(pdf_path, config)
+    
+    if images_dir:
+        # Count images for summary
+        with os.scandir(images_dir) as entries:
+            image_count = sum(1 for e in entries if e.name.endswith('.png') and e.is_file())
+    
+    return {
+        'pdf_path': pdf_path,
+        'pdf_name': pdf_name,
+        'images_dir': images_dir,
+        'image_count': image_count
+    }
+
+def ocr_extracted_pdfs(extracted: List[Dict], config: Dict) -> int:
+    """
+    OCR the images of every extracted PDF in one batch and save per-PDF outputs.
+    
+    Tesseract loads once for the whole batch instead of once per PDF; the
+    results come back in input order, so they are split by each PDF's image count.
+    
+    Returns:
+        Total number of successful OCR extractions
+    """
+    from unified_ocr_processor import find_image_files, ocr_image_files
+    
+    ocr_engine = config.get('ocr_engine', 'tesseract').lower()
+    
+    # Keyed by PDF path, since PDFs from different folders can share a name
+    image_files = {}
+    pdf_names = {}
+    for pdf in extracted:
+        pdf_path = pdf['pdf_path']
+        pdf_names[pdf_path] = pdf['pdf_name']
+        if pdf['images_dir'] and os.path.exists(pdf['images_dir']):
+            image_files[pdf_path] = find_image_files(pdf['images_dir'])
+        if not image_files.get(pdf_path):
+            print(f"⚠️  No images found for {pdf['pdf_name']}")
+            image_files.pop(pdf_path, None)
+    
+    all_files = [f for files in image_files.values() for f in files]
+    if not all_files:
+        return 0
+    
+    print(f"🔍 Running {ocr_engine.upper()} OCR on {len(all_files)} images from {len(image_files)} PDFs...")
+    
+    try:
+        results = ocr_image_files(all_files, config)
+    except Exception as e:
+        print(f"❌ Error running OCR: {e}")
+        return 0
+    
+    total_successful = 0
+    start = 0
+    for pdf_path, files in image_files.items():
+        pdf_name = pdf_names[pdf_path]
+        pdf_results = results[start:start + len(files)]
+        start += len(files)
+        
+        try:
+            total_successful += save_ocr_outputs(pdf_results, pdf_name, config)
+        except Exception as e:
+            print(f"❌ Error saving OCR results for {pdf_name}: {e}")
+    
+    return total_successful
+
+def _get_mp_context():
+    """Use the spawn start method on macOS, where forking after fitz/cv2 init is unsafe"""
+    if platform.system() == "Darwin":
+        return multiprocessing.get_context("spawn")
+    return None
 
 def process_all_pdfs(config: Dict):
     """Process all PDF files in the input directory"""
@@ -160,34 +263,57 @@ def process_all_pdfs(config: Dict):
     print(f"\\n🚀 Starting batch processing with {config.get('ocr_engine', 'tesseract').upper()} OCR...")
     print("=" * 60)
     
-    # Process each PDF
-    total_images = 0
-    total_successful = 0
+    # Extract PDFs in parallel - each PDF has its own output paths and no shared state
+    extracted = []
+    max_workers = min(config.get('workers') or os.cpu_count() or 1, len(pdf_files))
     
-    for i, pdf_path in enumerate(pdf_files, 1):
-        pdf_name = Path(pdf_path).stem
-        
-        print(f"\\n📄 Processing PDF {i}/{len(pdf_files)}: {pdf_name}")
-        print("-" * 40)
+    if max_workers <= 1:
+        for i, pdf_path in enumerate(pdf_files, 1):
+            print(f"\\n📄 Processing PDF {i}/{len(pdf_files)}: {Path(pdf_path).stem}")
+            print("-" * 40)
+            
+            extracted.append(_extract_single_pdf(pdf_path, config))
+            
+            print("-" * 40)
+    else:
+        print(f"⚙️  Using {max_workers} worker processes")
         
-        # Extract images
-        images_dir = extract_pdf_images(pdf_path, config)
+        # Each PDF already has its own process, so keep page extraction serial
+        # inside workers unless explicitly configured
+        extraction_config = config.get('extraction', {})
+        worker_config = config
+        if 'workers' not in extraction_config:
+            worker_config = {**config, 'extraction': {**extraction_config, 'workers': 1}}
         
-        if images_dir:
-            # Run OCR and generate outputs
-            run_ocr_on_images(images_dir, pdf_name, config)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=_get_mp_context()) as executor:
+            futures = {executor.submit(_extract_single_pdf, pdf_path, worker_config): pdf_path for pdf_path in pdf_files}
             
-            # Count images for summary
-            image_count = len([f for f in os.listdir(images_dir) if f.endswith('.png')])
-            total_images += image_count
+            for i, future in enumerate(as_completed(futures), 1):
+                pdf_name = Path(futures[future]).stem
+                try:
+                    extracted.append(future.result())
+                except Exception as e:
+                    print(f"❌ Error processing {pdf_name}: {e}")
+                    continue
+                
+                print(f"✅ Extracted PDF {i}/{len(pdf_files)}: {pdf_name}")
         
-        print("-" * 40)
+        # Keep outputs in input order regardless of completion order
+        order = {pdf_path: i for i, pdf_path in enumerate(pdf_files)}
+        extracted.sort(key=lambda pdf: order[pdf['pdf_path']])
+    
+    total_images = sum(pdf['image_count'] for pdf in extracted)
+    
+    # OCR every PDF's images in one pass so the engine only starts once
+    print("=" * 60)
+    total_successful = ocr_extracted_pdfs(extracted, config)
     
     # Final summary
     print(f"\\n🎉 Batch processing complete!")
     print(f"📊 Summary:")
     print(f"   • {len(pdf_files)} PDFs processed")
     print(f"   • {total_images} total images extracted")
+    print(f"   • {total_successful} successful OCR extractions")
     print(f"   • OCR engine: {config.get('ocr_engine', 'tesseract').upper()}")
     
     folders = config.get('folders', {})
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Color Mask Kernels
+==================
+
+Builds the yellow highlight and red mark masks used by the extractor.
+
+With Numba installed, a fused kernel reads each BGR pixel once, converts it
+to HSV and classifies it into both masks in a single pass. The kernel is
+single-threaded on purpose: extraction already runs pages in worker
+processes and pipeline threads, and Numba's default threading layer is
+neither fork-safe nor safe to launch from several threads at once. Without
+Numba, the same masks are built with cv2.cvtColor and cv2.inRange, on the
+OpenCL device through cv2.UMat when OpenCV has one.
+
+"""
+
+import functools
+import cv2
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# HSV ranges for yellow highlights
+YELLOW_LOWER = np.array([15, 50, 50])
+YELLOW_UPPER = np.array([35, 255, 255])
+# HSV ranges for red marks (red hue wraps around 0/180)
+RED_LOWER1 = np.array([0, 50, 50])
+RED_UPPER1 = np.array([10, 255, 255])
+RED_LOWER2 = np.array([170, 50, 50])
+RED_UPPER2 = np.array([180, 255, 255])
+
+# Fixed-point division tables from OpenCV's 8-bit BGR2HSV, so the kernel
+# produces exactly the same H and S values as cv2.cvtColor
+_HSV_SHIFT = 12
+_divisors = np.arange(256, dtype=np.float64)
+_divisors[0] = 1.0
+_SDIV_TABLE = np.rint((255 << _HSV_SHIFT) / _divisors).astype(np.int64)
+_HDIV_TABLE = np.rint((180 << _HSV_SHIFT) / (6.0 * _divisors)).astype(np.int64)
+_SDIV_TABLE[0] = _HDIV_TABLE[0] = 0
+
+# Rows: yellow lower/upper, red lower1/upper1, red lower2/upper2
+_BOUNDS = np.array([YELLOW_LOWER, YELLOW_UPPER, RED_LOWER1, RED_UPPER1, RED_LOWER2, RED_UPPER2], dtype=np.int64)
+# Pixels below every range's saturation or value floor can't match any mask
+_MIN_S = int(_BOUNDS[::2, 1].min())
+_MIN_V = int(_BOUNDS[::2, 2].min())
+
+def _in_range(h, s, v, bounds, lower):
+    upper = lower + 1
+    return (bounds[lower, 0] <= h <= bounds[upper, 0] and
+            bounds[lower, 1] <= s <= bounds[upper, 1] and
+            bounds[lower, 2] <= v <= bounds[upper, 2])
+
+def _classify_bgr(img, sdiv, hdiv, bounds, min_s, min_v, yellow_mask, red_mask):
+    """Fill yellow_mask and red_mask (255/0) from a BGR image in one pass"""
+    rows, cols = img.shape[0], img.shape[1]
+    for y in range(rows):
+        for x in range(cols):
+            b = np.int64(img[y, x, 0])
+            g = np.int64(img[y, x, 1])
+            r = np.int64(img[y, x, 2])
+
+            v = max(b, g, r)
+            diff = v - min(b, g, r)
+
+            s = (diff * sdiv[v] + (1 << (_HSV_SHIFT - 1))) >> _HSV_SHIFT
+            # Paper and text are unsaturated, so most pixels never need a hue
+            if s < min_s or v < min_v:
+                yellow_mask[y, x] = 0
+                red_mask[y, x] = 0
+                continue
+
+            if v == r:
+                h = g - b
+            elif v == g:
+                h = b - r + 2 * diff
+            else:
+                h = r - g + 4 * diff
+            h = (h * hdiv[diff] + (1 << (_HSV_SHIFT - 1))) >> _HSV_SHIFT
+            if h < 0:
+                h += 180
+
+            yellow_mask[y, x] = 255 if _in_range(h, s, v, bounds, 0) else 0
+            red_mask[y, x] = 255 if (_in_range(h, s, v, bounds, 2) or _in_range(h, s, v, bounds, 4)) else 0
+
+if NUMBA_AVAILABLE:
+    _in_range = njit(inline='always')(_in_range)
+    _classify_bgr = njit(cache=True, boundscheck=False)(_classify_bgr)
+
+def color_masks(img, extract_highlights=True, extract_handwriting=True):
+    """
+    Build the yellow and red masks for a BGR image.
+
+    Args:
+        img: BGR image (uint8)
+        extract_highlights: Whether the yellow mask is needed
+        extract_handwriting: Whether the red mask is needed
+
+    Returns:
+        Tuple of (yellow_mask, red_mask); a mask is None when it wasn't requested
+    """
+    if not (extract_highlights or extract_handwriting):
+        return None, None
+
+    if NUMBA_AVAILABLE:
+        yellow_mask = np.empty(img.shape[:2], dtype=np.uint8)
+        red_mask = np.empty(img.shape[:2], dtype=np.uint8)
+        _classify_bgr(np.ascontiguousarray(img), _SDIV_TABLE, _HDIV_TABLE, _BOUNDS, _MIN_S, _MIN_V, yellow_mask, red_mask)
+        return (yellow_mask if extract_highlights else None,
+                red_mask if extract_handwriting else None)
+
+    if _use_opencl():
+        # Run the HSV pass on the OpenCL device and download the masks once
+        yellow_mask, red_mask = _opencv_masks(cv2.UMat(img), extract_highlights, extract_handwriting)
+        return (yellow_mask.get() if yellow_mask is not None else None,
+                red_mask.get() if red_mask is not None else None)
+
+    return _opencv_masks(img, extract_highlights, extract_handwriting)
+
+@functools.lru_cache(maxsize=1)
+def _use_opencl() -> bool:
+    """Whether OpenCV has a usable OpenCL device; probed once since it initializes the runtime"""
+    return cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+
+def _opencv_masks(img, extract_highlights, extract_handwriting):
+    """Build the masks with cvtColor + inRange; img may be a numpy array or a cv2.UMat"""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+
+    yellow_mask = None
+    if extract_highlights:
+        yellow_mask = cv2.inRange(hsv, YELLOW_LOWER, YELLOW_UPPER)
+
+    red_mask = None
+    if extract_handwriting:
+        # Combine both ends of the red hue range
+        red_mask = cv2.bitwise_or(cv2.inRange(hsv, RED_LOWER1, RED_UPPER1), cv2.inRange(hsv, RED_LOWER2, RED_UPPER2))
+
+    return yellow_mask, red_mask
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Configuration Loader
+====================
+
+Shared loader for config.json used by the processing scripts. Parsed configs
+are cached per file and modification time, so loading the same file from
+several modules only reads and parses it once.
+
+"""
+
+import os
+import json
+import functools
+from typing import Dict
+
+from json_io import read_json
+
+@functools.lru_cache(maxsize=4)
+def _read_config_cached(config_path: str, mtime_ns: int) -> Dict:
+    """Parse a config file; mtime_ns is part of the cache key so edits are picked up"""
+    return read_json(config_path)
+
+def read_config(config_file: str = "config.json") -> Dict:
+    """
+    Read configuration from JSON file without printing anything
+
+    The returned dict is cached and shared between callers, so treat it as read-only.
+
+    Raises:
+        FileNotFoundError: If the config file does not exist
+        json.JSONDecodeError: If the config file is not valid JSON
+    """
+    config_path = os.path.abspath(config_file)
+    return _read_config_cached(config_path, os.stat(config_path).st_mtime_ns)
+
+def load_config(config_file: str = "config.json") -> Dict:
+    """Load configuration from JSON file"""
+    try:
+        return read_config(config_file)
+    except FileNotFoundError:
+        print(f"❌ Config file not found: {config_file}")
+        raise
+    except json.JSONDecodeError as e:
+        print(f"❌ Invalid JSON in config file: {e}")
+        raise
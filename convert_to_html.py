@@ -4,17 +4,17 @@ Convert the markdown with images to HTML for better viewing.
 Supports both Tesseract and Mathpix OCR results.
 """
 
-import markdown
 import os
 import json
+import functools
 from typing import Dict, Optional
 
+from config_loader import read_config
+
 def load_config(config_file: str = "config.json") -> Dict:
     """Load configuration from JSON file"""
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config
+        return read_config(config_file)
     except FileNotFoundError:
         print(f"❌ Config file not found: {config_file}")
         # Return default config
@@ -23,6 +23,30 @@ def load_config(config_file: str = "config.json") -> Dict:
         print(f"❌ Invalid JSON in config file: {e}")
         return {"ocr_engine": "tesseract"}
 
+@functools.lru_cache(maxsize=1)
+def _get_markdown() -> "markdown.Markdown":
+    """
+    Build the Markdown converter once.
+
+    The pages ship no Pygments stylesheet, so tokenizing every LaTeX block only
+    produced unstyled spans; codehilite instead emits plain <pre><code> tagged
+    with a language-* class, at a fraction of the cost.
+    """
+    # Imported here so modules that only import render_markdown don't load it up front
+    import markdown
+    
+    return markdown.Markdown(extensions=['extra', 'codehilite'],
+                             extension_configs={'codehilite': {'use_pygments': False}})
+
+def render_markdown(markdown_content: str) -> str:
+    """
+    Convert markdown text to an HTML fragment.
+
+    Reuses one converter across calls and resets it in between, so it must not
+    be shared between threads.
+    """
+    return _get_markdown().reset().convert(markdown_content)
+
 def convert_to_html(markdown_file: Optional[str] = None, html_file: Optional[str] = None):
     """
     Convert markdown file to HTML with proper image handling.
@@ -47,7 +71,7 @@ def convert_to_html(markdown_file: Optional[str] = None, html_file: Optional[str
         markdown_content = f.read()
     
     # Convert markdown to HTML
-    html_content = markdown.markdown(markdown_content, extensions=['extra', 'codehilite'])
+    html_content = render_markdown(markdown_content)
     
     # Create a complete HTML document with CSS styling
     full_html = f"""<!DOCTYPE html>
@@ -4,13 +4,45 @@ import numpy as np
 from PIL import Image
 import os
 import json
+import queue
+import logging
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from config_loader import read_config
+from extraction_results import ExtractedItems, save_extraction_summary
+from color_kernels import color_masks
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Zoom used for the saved crops (3x for better OCR quality)
+CROP_ZOOM = 3.0
+# Zoom used to locate highlights with the color masks; contours don't need full resolution
+DETECTION_ZOOM = 1.5
+# Pages in flight between pipeline stages; bounds memory to a couple of page renders
+PIPELINE_QUEUE_SIZE = 2
+# Threads PNG-encoding and writing crops; cv2.imwrite releases the GIL
+WRITE_WORKERS = 4
+# Zoom for the thumbnail that screens out pages without any yellow or red pixels
+PRESCREEN_ZOOM = 0.5
+# Crops are intermediate OCR inputs; fast deflate is much cheaper to encode than the default level
+PNG_WRITE_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+# Color regions with this many pixels or fewer are noise (CROP_ZOOM pixels)
+YELLOW_MIN_AREA = 500
+RED_MIN_AREA = 200
+# (horizontal, vertical) distance within which color regions merge into one group (CROP_ZOOM pixels)
+YELLOW_MERGE_THRESHOLDS = (100, 50)
+RED_MERGE_THRESHOLDS = (80, 40)
 
 def load_config(config_file="config.json"):
     """Load configuration from JSON file"""
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config
+        return read_config(config_file)
     except FileNotFoundError:
         print(f"⚠️  Config file not found: {config_file}, using defaults")
         return {
@@ -28,7 +60,7 @@ def load_config(config_file="config.json"):
             }
         }
 
-def extract_highlights_and_red_annotations(pdf_path, output_dir="extracted_content", config=None):
+def extract_highlights_and_red_annotations(pdf_path, output_dir="extracted_content", config=None, merge_thresholds=None):
     """
     Extract yellow highlights and red marker annotations as images from a PDF.
     
@@ -36,6 +68,11 @@ def extract_highlights_and_red_annotations(pdf_path, output_dir="extracted_conte
         pdf_path (str): Path to the PDF file
         output_dir (str): Directory to save extracted images
         config (dict): Configuration dictionary with extraction options
+        merge_thresholds (tuple): ((h, v) for yellow, (h, v) for red) in crop pixels;
+            defaults to YELLOW_MERGE_THRESHOLDS and RED_MERGE_THRESHOLDS
+    
+    Returns:
+        ExtractedItems ordered by page
     """
     
     # Load config if not provided
@@ -51,81 +88,38 @@ def extract_highlights_and_red_annotations(pdf_path, output_dir="extracted_conte
     print(f"   - Red handwriting: {'✅ Enabled' if extract_handwriting else '❌ Disabled'}")
     
     # Create output directory if it doesn't exist
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
     
-    # Open the PDF
-    doc = fitz.open(pdf_path)
+    # Count pages up front; each worker reopens the PDF since fitz documents can't be pickled
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
     
-    extracted_items = []
+    workers = min(config.get("extraction", {}).get("workers") or min(os.cpu_count() or 1, 6), page_count)
     
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        
-        # Get page as image with high resolution
-        mat = fitz.Matrix(3.0, 3.0)  # 3x zoom for better quality
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
-        
-        # Convert to numpy array for OpenCV processing
-        nparr = np.frombuffer(img_data, np.uint8)
-        page_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if page_img is None:
-            print(f"Warning: Could not convert page {page_num + 1} to image")
-            continue
-        
-        # Extract annotations (highlights, ink annotations, etc.)
-        annotations = page.annots()
-        
-        for annot in annotations:
-            annot_type = annot.type[1]  # Get annotation type name
-            
-            # Check for yellow highlights or red ink annotations
-            if should_extract_annotation(annot, annot_type, extract_highlights, extract_handwriting):
-                rect = annot.rect
-                
-                # Convert PDF coordinates to image coordinates (accounting for zoom)
-                x1 = int(rect.x0 * 3.0)
-                y1 = int(rect.y0 * 3.0)
-                x2 = int(rect.x1 * 3.0)
-                y2 = int(rect.y1 * 3.0)
-                
-                # Add padding around the annotation
-                padding = 10
-                x1 = max(0, x1 - padding)
-                y1 = max(0, y1 - padding)
-                x2 = min(page_img.shape[1], x2 + padding)
-                y2 = min(page_img.shape[0], y2 + padding)
-                
-                # Extract the region
-                extracted_region = page_img[y1:y2, x1:x2]
-                
-                if extracted_region.size > 0:
-                    # Save the extracted region
-                    filename = f"page_{page_num + 1}_{annot_type}_{len(extracted_items) + 1}.png"
-                    filepath = os.path.join(output_dir, filename)
-                    cv2.imwrite(filepath, extracted_region)
-                    
-                    extracted_items.append({
-                        "page": page_num + 1,
-                        "type": annot_type,
-                        "filename": filename,
-                        "coordinates": {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
-                    })
-                    
-                    print(f"Extracted {annot_type} from page {page_num + 1}: {filename}")
-        
-        # Also try to detect highlights and red marks using detection
-        color_based_extractions = extract_by_color_detection(page_img, page_num, output_dir, len(extracted_items), extract_highlights, extract_handwriting)
-        extracted_items.extend(color_based_extractions)
+    if merge_thresholds is None:
+        merge_thresholds = (YELLOW_MERGE_THRESHOLDS, RED_MERGE_THRESHOLDS)
+    
+    extracted_items = ExtractedItems()
     
-    doc.close()
+    if workers <= 1:
+        extracted_items = _process_pages((pdf_path, range(page_count), output_dir, extract_highlights, extract_handwriting,
+                                          merge_thresholds))
+    else:
+        # Pages are independent, so each worker process pipelines its own contiguous run of pages.
+        # More than ~6 workers regresses on PyMuPDF rendering, hence the default cap.
+        chunk_size = -(-page_count // workers)
+        jobs = [(pdf_path, range(start, min(start + chunk_size, page_count)), output_dir, extract_highlights, extract_handwriting,
+                 merge_thresholds)
+                for start in range(0, page_count, chunk_size)]
+        with mp.Pool(workers) as pool:
+            for page_items in pool.imap_unordered(_process_pages, jobs):
+                extracted_items.extend(page_items)
+    
+    extracted_items = extracted_items.sorted_by_page()
     
     # Save extraction summary
     summary_file = os.path.join(output_dir, "extraction_summary.json")
-    with open(summary_file, 'w') as f:
-        json.dump(extracted_items, f, indent=2)
+    save_extraction_summary(summary_file, extracted_items)
     
     print(f"\nExtraction complete! Found {len(extracted_items)} items.")
     print(f"Images saved to: {output_dir}")
@@ -133,6 +127,268 @@ def extract_highlights_and_red_annotations(pdf_path, output_dir="extracted_conte
     
     return extracted_items
 
+def _process_pages(args):
+    """
+    Extract annotations from a run of pages (multiprocessing worker).
+    
+    Pages stream through a three-stage pipeline so rendering, color detection
+    and PNG encoding overlap:
+    
+        render (this thread) -> detect (thread) -> encode + write (WRITE_WORKERS threads)
+    
+    All fitz calls stay on the calling thread since PyMuPDF documents are not
+    thread-safe; the detection thread hands its regions back to be cropped
+    while later pages render. Bounded queues keep at most a couple of page
+    images in flight.
+    
+    Args:
+        args: Tuple of (pdf_path, page_nums, output_dir, extract_highlights, extract_handwriting, merge_thresholds)
+    
+    Returns:
+        ExtractedItems for the pages. Image indices are numbered per page
+        so workers never need to coordinate filenames.
+    """
+    pdf_path, page_nums, output_dir, extract_highlights, extract_handwriting, merge_thresholds = args
+    yellow_thresholds, red_thresholds = merge_thresholds
+    
+    extracted_items = ExtractedItems()
+    
+    detect_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    write_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE * WRITE_WORKERS)
+    # Unbounded: the detection thread must never block on the thread that feeds it
+    region_queue = queue.Queue()
+    
+    def detect_stage():
+        while True:
+            job = detect_queue.get()
+            if job is None:
+                region_queue.put(None)
+                return
+            
+            page_num, page_img, page_width, page_height, start_index = job
+            try:
+                regions = detect_color_regions(page_img, page_width, page_height, extract_highlights, extract_handwriting,
+                                               detection_zoom=DETECTION_ZOOM, yellow_thresholds=yellow_thresholds,
+                                               red_thresholds=red_thresholds)
+            except Exception as e:
+                print(f"Warning: Color detection failed on page {page_num + 1}: {e}")
+                regions = []
+            region_queue.put((page_num, start_index, regions))
+    
+    def write_stage():
+        while True:
+            job = write_queue.get()
+            if job is None:
+                return
+            
+            filepath, image = job
+            try:
+                write_image((filepath, image))
+            except Exception as e:
+                print(f"Warning: Could not write {filepath}: {e}")
+    
+    def crop_detected(doc, result):
+        page_num, start_index, regions = result
+        extracted_items.extend(
+            crop_color_regions(doc[page_num], page_num, output_dir, start_index, regions, write_queue.put)
+        )
+    
+    with ThreadPoolExecutor(max_workers=1 + WRITE_WORKERS) as executor:
+        executor.submit(detect_stage)
+        for _ in range(WRITE_WORKERS):
+            executor.submit(write_stage)
+        
+        try:
+            with fitz.open(pdf_path) as doc:
+                try:
+                    for page_num in page_nums:
+                        page = doc[page_num]
+                        page_items = extract_page_annotations(page, page_num, output_dir, extract_highlights, extract_handwriting,
+                                                              write_queue.put)
+                        extracted_items.extend(page_items)
+                        
+                        # Once every annotation has its own crop, color detection only needs the page content
+                        render_annots = not all_annotations_extracted(page, page_items)
+                        
+                        # Skip the detection render on pages a thumbnail shows have no yellow or red at all
+                        if not page_has_color(page, extract_highlights, extract_handwriting, annots=render_annots):
+                            continue
+                        
+                        # Also try to detect highlights and red marks using detection on a low-res render
+                        pix = page.get_pixmap(matrix=fitz.Matrix(DETECTION_ZOOM, DETECTION_ZOOM), annots=render_annots)
+                        page_img = pixmap_to_bgr(pix)
+                        
+                        if page_img is None:
+                            print(f"Warning: Could not convert page {page_num + 1} to image")
+                        else:
+                            page_width = int(page.rect.width * CROP_ZOOM)
+                            page_height = int(page.rect.height * CROP_ZOOM)
+                            detect_queue.put((page_num, page_img, page_width, page_height, len(page_items)))
+                        
+                        # Crop whatever the detection thread has finished in the meantime
+                        while True:
+                            try:
+                                result = region_queue.get_nowait()
+                            except queue.Empty:
+                                break
+                            crop_detected(doc, result)
+                finally:
+                    detect_queue.put(None)
+                
+                result = region_queue.get()
+                while result is not None:
+                    crop_detected(doc, result)
+                    result = region_queue.get()
+        finally:
+            for _ in range(WRITE_WORKERS):
+                write_queue.put(None)
+    
+    return extracted_items
+
+def extract_page_annotations(page, page_num, output_dir, extract_highlights=True, extract_handwriting=True, save=None):
+    """
+    Extract highlight and ink annotations stored in the PDF for one page.
+    
+    Args:
+        page: fitz page
+        page_num: Page number
+        output_dir: Output directory
+        extract_highlights: Whether to extract yellow highlights
+        extract_handwriting: Whether to extract red handwriting
+        save: Callable taking a (filepath, image) tuple; defaults to write_image
+    
+    Returns:
+        ExtractedItems for the page
+    """
+    if save is None:
+        save = write_image
+    
+    extracted_items = ExtractedItems()
+    
+    # Extract annotations (highlights, ink annotations, etc.)
+    annotations = page.annots()
+    page_width = int(page.rect.width * CROP_ZOOM)
+    page_height = int(page.rect.height * CROP_ZOOM)
+    
+    for annot in annotations:
+        annot_type = annot.type[1]  # Get annotation type name
+        
+        # Check for yellow highlights or red ink annotations
+        if should_extract_annotation(annot, annot_type, extract_highlights, extract_handwriting):
+            rect = annot.rect
+            
+            # Convert PDF coordinates to image coordinates (accounting for zoom)
+            x1 = int(rect.x0 * CROP_ZOOM)
+            y1 = int(rect.y0 * CROP_ZOOM)
+            x2 = int(rect.x1 * CROP_ZOOM)
+            y2 = int(rect.y1 * CROP_ZOOM)
+            
+            # Add padding around the annotation
+            padding = 10
+            x1 = max(0, x1 - padding)
+            y1 = max(0, y1 - padding)
+            x2 = min(page_width, x2 + padding)
+            y2 = min(page_height, y2 + padding)
+            
+            # Render just the annotation region
+            extracted_region = render_region(page, x1, y1, x2, y2)
+            
+            if extracted_region is not None and extracted_region.size > 0:
+                # Save the extracted region
+                filename = f"page_{page_num + 1}_{annot_type}_{len(extracted_items) + 1}.png"
+                save((os.path.join(output_dir, filename), extracted_region))
+                
+                extracted_items.add(page_num + 1, annot_type, filename, (x1, y1, x2, y2))
+                
+                logger.debug("Extracted %s from page %d: %s", annot_type, page_num + 1, filename)
+    
+    return extracted_items
+
+def all_annotations_extracted(page, page_items):
+    """
+    Check whether the annotation pass produced a crop for every annotation on a page.
+    
+    Popups only show another annotation's note, so they don't count.
+    
+    Args:
+        page: fitz page
+        page_items: ExtractedItems returned by extract_page_annotations for the page
+    """
+    annotation_count = sum(1 for annot in page.annots() if annot.type[1] != "Popup")
+    return annotation_count > 0 and len(page_items) == annotation_count
+
+def page_has_color(page, extract_highlights=True, extract_handwriting=True, annots=True):
+    """
+    Cheaply check whether a page has any pixels in the highlight or red mark ranges.
+    
+    Renders a small thumbnail so pages without any marks can skip the
+    detection render. Rendered annotations show up here too.
+    
+    Args:
+        page: fitz page
+        extract_highlights: Whether to look for yellow pixels
+        extract_handwriting: Whether to look for red pixels
+        annots: Whether to render the page's annotations into the thumbnail
+    
+    Returns:
+        True if the page may contain regions worth detecting
+    """
+    if not (extract_highlights or extract_handwriting):
+        return False
+    
+    thumb = pixmap_to_bgr(page.get_pixmap(matrix=fitz.Matrix(PRESCREEN_ZOOM, PRESCREEN_ZOOM), annots=annots))
+    if thumb is None:
+        # Can't screen it, so let the full detection path decide
+        return True
+    
+    return any(mask is not None and cv2.countNonZero(mask) > 0
+               for mask in color_masks(thumb, extract_highlights, extract_handwriting))
+
+def write_image(args):
+    """
+    Write a crop to disk as a lightly compressed PNG.
+    
+    Args:
+        args: Tuple of (filepath, image)
+    """
+    filepath, image = args
+    return cv2.imwrite(filepath, image, PNG_WRITE_PARAMS)
+
+def pixmap_to_bgr(pix):
+    """
+    Convert a PyMuPDF pixmap to a BGR numpy array for OpenCV.
+    
+    Reads the raw samples buffer directly instead of PNG-encoding the page
+    and decoding it again with cv2.imdecode.
+    
+    Returns:
+        BGR image array, or None if the pixmap is not RGB(A)
+    """
+    if pix.n not in (3, 4):
+        return None
+    
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w, pix.n)
+    if pix.n == 4:
+        return cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR)
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+
+def render_region(page, x1, y1, x2, y2):
+    """
+    Render a region of a page at crop resolution.
+    
+    Args:
+        page: fitz page
+        x1, y1, x2, y2: Region in CROP_ZOOM image coordinates
+    
+    Returns:
+        BGR image of the region, or None if it could not be rendered
+    """
+    clip = fitz.Rect(x1 / CROP_ZOOM, y1 / CROP_ZOOM, x2 / CROP_ZOOM, y2 / CROP_ZOOM)
+    if clip.is_empty:
+        return None
+    pix = page.get_pixmap(matrix=fitz.Matrix(CROP_ZOOM, CROP_ZOOM), clip=clip)
+    return pixmap_to_bgr(pix)
+
 def should_extract_annotation(annot, annot_type, extract_highlights=True, extract_handwriting=True):
     """
     Determine if an annotation should be extracted based on type, color, and configuration.
@@ -172,6 +428,10 @@ def merge_nearby_rectangles(rectangles, horizontal_threshold=50, vertical_thresh
     """
     Merge rectangles that are close to each other to form logical groups.
     
+    Rectangles are swept left to right and nearby pairs are joined with a
+    union-find, so each group is the connected component of all rectangles
+    within the thresholds of one another.
+    
     Args:
         rectangles: List of (x, y, w, h) tuples
         horizontal_threshold: Maximum horizontal distance to merge
@@ -186,38 +446,18 @@ def merge_nearby_rectangles(rectangles, horizontal_threshold=50, vertical_thresh
     # Convert to (x1, y1, x2, y2) format for easier processing
     rects = [(x, y, x + w, y + h) for x, y, w, h in rectangles]
     
-    merged = []
-    used = [False] * len(rects)
+    if NUMBA_AVAILABLE:
+        roots = _group_roots(np.array(rects, dtype=np.int64), float(horizontal_threshold), float(vertical_threshold))
+    else:
+        roots = _group_roots_python(rects, horizontal_threshold, vertical_threshold)
     
-    for i, rect1 in enumerate(rects):
-        if used[i]:
-            continue
-            
-        # Start a new group with this rectangle
-        group = [rect1]
-        used[i] = True
-        
-        # Keep trying to add more rectangles to this group
-        changed = True
-        while changed:
-            changed = False
-            for j, rect2 in enumerate(rects):
-                if used[j]:
-                    continue
-                
-                # Check if rect2 should be merged with any rectangle in the current group
-                should_merge = False
-                for group_rect in group:
-                    if rectangles_should_merge(group_rect, rect2, horizontal_threshold, vertical_threshold):
-                        should_merge = True
-                        break
-                
-                if should_merge:
-                    group.append(rect2)
-                    used[j] = True
-                    changed = True
-        
-        # Calculate bounding box for the entire group
+    # Calculate bounding box for each group, ordered by the group's first rectangle
+    groups = {}
+    for i, rect in enumerate(rects):
+        groups.setdefault(int(roots[i]), []).append(rect)
+    
+    merged = []
+    for group in groups.values():
         min_x = min(rect[0] for rect in group)
         min_y = min(rect[1] for rect in group)
         max_x = max(rect[2] for rect in group)
@@ -227,6 +467,83 @@ def merge_nearby_rectangles(rectangles, horizontal_threshold=50, vertical_thresh
     
     return merged
 
+def _group_roots_python(rects, horizontal_threshold, vertical_threshold):
+    """Group (x1, y1, x2, y2) rectangles; returns the lowest member index of each one's group"""
+    parent = list(range(len(rects)))
+    
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    # Sweep by left edge; a rectangle leaves the active set once the sweep line
+    # is further than horizontal_threshold past its right edge
+    active = []
+    for i in sorted(range(len(rects)), key=lambda k: rects[k][0]):
+        rect = rects[i]
+        active = [j for j in active if rects[j][2] >= rect[0] - horizontal_threshold]
+        
+        for j in active:
+            if rectangles_should_merge(rects[j], rect, horizontal_threshold, vertical_threshold):
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+        
+        active.append(i)
+    
+    return [find(i) for i in range(len(rects))]
+
+def _group_roots_kernel(rects, horizontal_threshold, vertical_threshold):
+    """Array version of _group_roots_python for Numba; rects is an (n, 4) int64 array"""
+    n = rects.shape[0]
+    parent = np.arange(n)
+    active = np.empty(n, dtype=np.int64)
+    active_count = 0
+    
+    for i in np.argsort(rects[:, 0], kind='mergesort'):
+        # Drop rectangles the sweep line has moved past, keeping their order
+        kept = 0
+        for k in range(active_count):
+            j = active[k]
+            if rects[j, 2] >= rects[i, 0] - horizontal_threshold:
+                active[kept] = j
+                kept += 1
+        active_count = kept
+        
+        for k in range(active_count):
+            j = active[k]
+            h_overlap = not (rects[j, 2] < rects[i, 0] - horizontal_threshold or
+                             rects[i, 2] < rects[j, 0] - horizontal_threshold)
+            v_overlap = not (rects[j, 3] < rects[i, 1] - vertical_threshold or
+                             rects[i, 3] < rects[j, 1] - vertical_threshold)
+            if h_overlap and v_overlap:
+                root_i = i
+                while parent[root_i] != root_i:
+                    parent[root_i] = parent[parent[root_i]]
+                    root_i = parent[root_i]
+                root_j = j
+                while parent[root_j] != root_j:
+                    parent[root_j] = parent[parent[root_j]]
+                    root_j = parent[root_j]
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+        
+        active[active_count] = i
+        active_count += 1
+    
+    for i in range(n):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        parent[i] = root
+    return parent
+
+# Single-threaded like the color kernel: grouping runs inside page workers,
+# where Numba's parallel threading layer isn't safe
+if NUMBA_AVAILABLE:
+    _group_roots = njit(cache=True)(_group_roots_kernel)
+
 def rectangles_should_merge(rect1, rect2, horizontal_threshold, vertical_threshold):
     """
     Determine if two rectangles should be merged based on proximity.
@@ -244,124 +561,180 @@ def rectangles_should_merge(rect1, rect2, horizontal_threshold, vertical_thresho
     
     return h_overlap and v_overlap
 
-def extract_by_color_detection(page_img, page_num, output_dir, start_index, extract_highlights=True, extract_handwriting=True):
+def extract_by_color_detection(page_img, page_num, output_dir, start_index, extract_highlights=True, extract_handwriting=True,
+                               page=None, detection_zoom=CROP_ZOOM):
     """
     Extract content using color detection for yellow highlights and red marks.
     Merges nearby regions into logical groups.
     
     Args:
-        page_img: Page image
+        page_img: Page image used for detection, rendered at detection_zoom
         page_num: Page number
         output_dir: Output directory
         start_index: Starting index for naming
         extract_highlights: Whether to extract yellow highlights
         extract_handwriting: Whether to extract red handwriting
+        page: fitz page to render crops from at CROP_ZOOM; if None, crops are cut from page_img
+        detection_zoom: Zoom page_img was rendered at
     """
-    extracted_items = []
+    if page is not None:
+        page_width = int(page.rect.width * CROP_ZOOM)
+        page_height = int(page.rect.height * CROP_ZOOM)
+    else:
+        page_height, page_width = page_img.shape[:2]
     
-    # Convert to HSV for better color detection
-    hsv = cv2.cvtColor(page_img, cv2.COLOR_BGR2HSV)
+    regions = detect_color_regions(page_img, page_width, page_height, extract_highlights, extract_handwriting,
+                                   detection_zoom=detection_zoom)
     
-    # Process yellow highlights if enabled
-    if extract_highlights:
-        # Define ranges for yellow highlights
-        yellow_lower = np.array([15, 50, 50])
-        yellow_upper = np.array([35, 255, 255])
-        
-        # Process yellow highlights
-        yellow_mask = cv2.inRange(hsv, yellow_lower, yellow_upper)
-        yellow_contours, _ = cv2.findContours(yellow_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Get individual rectangles for yellow highlights
-        yellow_rects = []
-        for contour in yellow_contours:
-            area = cv2.contourArea(contour)
-            if area > 500:  # Filter small noise
-                x, y, w, h = cv2.boundingRect(contour)
-                yellow_rects.append((x, y, w, h))
-        
-        # Merge nearby yellow rectangles
-        merged_yellow = merge_nearby_rectangles(yellow_rects, horizontal_threshold=100, vertical_threshold=50)
-        
-        # Extract merged yellow regions
-        for i, (x, y, w, h) in enumerate(merged_yellow):
-            # Add padding
-            padding = 15
-            x1 = max(0, x - padding)
-            y1 = max(0, y - padding)
-            x2 = min(page_img.shape[1], x + w + padding)
-            y2 = min(page_img.shape[0], y + h + padding)
-            
-            extracted_region = page_img[y1:y2, x1:x2]
+    return crop_color_regions(page, page_num, output_dir, start_index, regions, page_img=page_img)
+
+def find_color_rects(page_img, extract_highlights=True, extract_handwriting=True, detection_zoom=CROP_ZOOM):
+    """
+    Find the individual yellow and red regions on a page image, before grouping.
+    
+    This is the per-pixel part of detection; grouping the rectangles is cheap,
+    so callers trying several merge thresholds only need to run this once.
+    
+    Args:
+        page_img: Page image used for detection, rendered at detection_zoom
+        extract_highlights: Whether to detect yellow highlights
+        extract_handwriting: Whether to detect red handwriting
+        detection_zoom: Zoom page_img was rendered at
+    
+    Returns:
+        Tuple of (yellow_rects, red_rects) as (x, y, w, h) lists in page_img
+        pixels; a disabled color gives an empty list
+    """
+    # Areas are tuned in CROP_ZOOM pixels; scale them to the detection image
+    scale = detection_zoom / CROP_ZOOM
+    
+    # Classify pixels against the HSV ranges for both colors in one pass
+    yellow_mask, red_mask = color_masks(page_img, extract_highlights, extract_handwriting)
+    
+    # Get individual rectangles for each color, filtering small noise
+    yellow_rects = mask_bounding_rects(yellow_mask, YELLOW_MIN_AREA * scale * scale) if extract_highlights else []
+    red_rects = mask_bounding_rects(red_mask, RED_MIN_AREA * scale * scale) if extract_handwriting else []
+    
+    return yellow_rects, red_rects
+
+def detect_color_regions(page_img, page_width, page_height, extract_highlights=True, extract_handwriting=True,
+                         detection_zoom=CROP_ZOOM, yellow_thresholds=YELLOW_MERGE_THRESHOLDS,
+                         red_thresholds=RED_MERGE_THRESHOLDS):
+    """
+    Find grouped yellow highlight and red mark regions on a page image.
+    
+    Only uses OpenCV, so it is safe to run off the thread that owns the fitz document.
+    
+    Args:
+        page_img: Page image used for detection, rendered at detection_zoom
+        page_width, page_height: Page size in CROP_ZOOM pixels, used to clamp the padded regions
+        extract_highlights: Whether to detect yellow highlights
+        extract_handwriting: Whether to detect red handwriting
+        detection_zoom: Zoom page_img was rendered at
+        yellow_thresholds, red_thresholds: (horizontal, vertical) merge thresholds in CROP_ZOOM pixels
+    
+    Returns:
+        List of dicts with "type", "coordinates" (x1, y1, x2, y2 in CROP_ZOOM pixels)
+        and "individual_regions"
+    """
+    regions = []
+    
+    # Thresholds below are tuned in CROP_ZOOM pixels; scale them to the detection image
+    scale = detection_zoom / CROP_ZOOM
+    
+    def add_regions(region_type, rects, merged):
+        for x, y, w, h in merged:
+            individual_regions = len([r for r in rects if rectangles_overlap((x, y, w, h), r)])
             
-            if extracted_region.size > 0:
-                filename = f"page_{page_num + 1}_yellow_highlight_group_{start_index + len(extracted_items) + 1}.png"
-                filepath = os.path.join(output_dir, filename)
-                cv2.imwrite(filepath, extracted_region)
-                
-                extracted_items.append({
-                    "page": page_num + 1,
-                    "type": "yellow_highlight_group",
-                    "filename": filename,
-                    "coordinates": {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
-                    "individual_regions": len([r for r in yellow_rects if rectangles_overlap((x, y, w, h), r)])
-                })
-                
-                print(f"Extracted yellow highlight group on page {page_num + 1}: {filename}")
+            # Back to crop coordinates, then add padding
+            x, y, w, h = int(x / scale), int(y / scale), int(w / scale), int(h / scale)
+            padding = 15
+            regions.append({
+                "type": region_type,
+                "coordinates": (max(0, x - padding), max(0, y - padding),
+                                min(page_width, x + w + padding), min(page_height, y + h + padding)),
+                "individual_regions": individual_regions
+            })
+    
+    yellow_rects, red_rects = find_color_rects(page_img, extract_highlights, extract_handwriting, detection_zoom)
+    
+    # Merge nearby yellow rectangles
+    if extract_highlights:
+        h_thresh, v_thresh = yellow_thresholds
+        merged_yellow = merge_nearby_rectangles(yellow_rects, horizontal_threshold=h_thresh * scale, vertical_threshold=v_thresh * scale)
+        add_regions("yellow_highlight_group", yellow_rects, merged_yellow)
     
-    # Process red marks if enabled
+    # Merge nearby red rectangles (more aggressive merging for connected text/marks)
     if extract_handwriting:
-        # Define ranges for red marks
-        red_lower1 = np.array([0, 50, 50])
-        red_upper1 = np.array([10, 255, 255])
-        red_lower2 = np.array([170, 50, 50])
-        red_upper2 = np.array([180, 255, 255])
-        
-        red_mask1 = cv2.inRange(hsv, red_lower1, red_upper1)
-        red_mask2 = cv2.inRange(hsv, red_lower2, red_upper2)
-        red_mask = red_mask1 + red_mask2
-        
-        red_contours, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Get individual rectangles for red marks
-        red_rects = []
-        for contour in red_contours:
-            area = cv2.contourArea(contour)
-            if area > 200:  # Filter small noise
-                x, y, w, h = cv2.boundingRect(contour)
-                red_rects.append((x, y, w, h))
+        h_thresh, v_thresh = red_thresholds
+        merged_red = merge_nearby_rectangles(red_rects, horizontal_threshold=h_thresh * scale, vertical_threshold=v_thresh * scale)
+        add_regions("red_mark_group", red_rects, merged_red)
+    
+    return regions
+
+def crop_color_regions(page, page_num, output_dir, start_index, regions, save=None, page_img=None):
+    """
+    Crop and save regions found by detect_color_regions.
+    
+    Args:
+        page: fitz page to render crops from at CROP_ZOOM; if None, crops are cut from page_img
+        page_num: Page number
+        output_dir: Output directory
+        start_index: Starting index for naming
+        regions: Regions returned by detect_color_regions
+        save: Callable taking a (filepath, image) tuple; defaults to write_image
+        page_img: Page image at CROP_ZOOM, only used when page is None
+    
+    Returns:
+        ExtractedItems for the regions
+    """
+    if save is None:
+        save = write_image
+    
+    extracted_items = ExtractedItems()
+    
+    for region in regions:
+        x1, y1, x2, y2 = region["coordinates"]
         
-        # Merge nearby red rectangles (more aggressive merging for connected text/marks)
-        merged_red = merge_nearby_rectangles(red_rects, horizontal_threshold=80, vertical_threshold=40)
+        if page is not None:
+            extracted_region = render_region(page, x1, y1, x2, y2)
+        else:
+            extracted_region = page_img[y1:y2, x1:x2]
         
-        # Extract merged red regions
-        for i, (x, y, w, h) in enumerate(merged_red):
-            # Add padding
-            padding = 15
-            x1 = max(0, x - padding)
-            y1 = max(0, y - padding)
-            x2 = min(page_img.shape[1], x + w + padding)
-            y2 = min(page_img.shape[0], y + h + padding)
+        if extracted_region is not None and extracted_region.size > 0:
+            filename = f"page_{page_num + 1}_{region['type']}_{start_index + len(extracted_items) + 1}.png"
+            save((os.path.join(output_dir, filename), extracted_region))
             
-            extracted_region = page_img[y1:y2, x1:x2]
+            extracted_items.add(page_num + 1, region["type"], filename, (x1, y1, x2, y2), region["individual_regions"])
             
-            if extracted_region.size > 0:
-                filename = f"page_{page_num + 1}_red_mark_group_{start_index + len(extracted_items) + 1}.png"
-                filepath = os.path.join(output_dir, filename)
-                cv2.imwrite(filepath, extracted_region)
-                
-                extracted_items.append({
-                    "page": page_num + 1,
-                    "type": "red_mark_group",
-                    "filename": filename,
-                    "coordinates": {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
-                    "individual_regions": len([r for r in red_rects if rectangles_overlap((x, y, w, h), r)])
-                })
-                
-                print(f"Extracted red mark group on page {page_num + 1}: {filename}")
+            label = "yellow highlight group" if region["type"] == "yellow_highlight_group" else "red mark group"
+            logger.debug("Extracted %s on page %d: %s", label, page_num + 1, filename)
     
     return extracted_items
 
+def mask_bounding_rects(mask, min_area):
+    """
+    Find bounding rectangles of the connected regions in a binary mask.
+    
+    Uses a single cv2.connectedComponentsWithStats call, which returns every
+    region's bounding box and pixel area at once instead of looping over contours.
+    
+    Args:
+        mask: Binary mask (uint8)
+        min_area: Regions with this many pixels or fewer are dropped as noise
+    
+    Returns:
+        List of (x, y, w, h) tuples
+    """
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    
+    # Row 0 is the background component
+    stats = stats[1:]
+    keep = stats[:, cv2.CC_STAT_AREA] > min_area
+    boxes = stats[keep][:, [cv2.CC_STAT_LEFT, cv2.CC_STAT_TOP, cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT]]
+    
+    return [tuple(int(v) for v in box) for box in boxes]
+
 def rectangles_overlap(rect1, rect2):
     """Check if two rectangles overlap."""
     x1, y1, w1, h1 = rect1
@@ -383,6 +756,9 @@ def main():
         print(f"Error: PDF file '{pdf_path}' not found!")
         return
     
+    # Per-crop messages are debug level; the summary below lists every extracted group
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Create new output directory for grouped extractions
     output_dir = "extracted_content_grouped"
     
@@ -398,28 +774,31 @@ def main():
     if extracted_items:
         print(f"\n✅ Successfully extracted {len(extracted_items)} grouped items!")
         
-        # Count by type
-        yellow_groups = [item for item in extracted_items if 'yellow' in item['type']]
-        red_groups = [item for item in extracted_items if 'red' in item['type']]
+        # Count by type with masks over the type and region columns
+        region_counts = extracted_items.region_counts
+        yellow_mask = extracted_items.type_mask('yellow')
+        red_mask = extracted_items.type_mask('red')
+        yellow_count = int(yellow_mask.sum())
+        red_count = int(red_mask.sum())
         
         print("\n 📊  Summary:")
-        print(f"  - {len(yellow_groups)} yellow highlight groups")
-        print(f"  - {len(red_groups)} red mark groups")
+        print(f"  - {yellow_count} yellow highlight groups")
+        print(f"  - {red_count} red mark groups")
         
         # Show total individual regions that were merged
-        total_individual_yellow = sum(item.get('individual_regions', 1) for item in yellow_groups)
-        total_individual_red = sum(item.get('individual_regions', 1) for item in red_groups)
+        total_individual_yellow = int(region_counts[yellow_mask].sum())
+        total_individual_red = int(region_counts[red_mask].sum())
         
         print("\n🔗 Merging efficiency:")
-        print(f"  - Yellow: {total_individual_yellow} individual regions → {len(yellow_groups)} groups")
-        print(f"  - Red: {total_individual_red} individual regions → {len(red_groups)} groups")
+        print(f"  - Yellow: {total_individual_yellow} individual regions → {yellow_count} groups")
+        print(f"  - Red: {total_individual_red} individual regions → {red_count} groups")
         
         print(f"\n📁 Output saved to: {output_dir}/")
         
         print("\nExtracted groups:")
-        for item in extracted_items:
-            regions_info = f" (merged {item.get('individual_regions', 1)} regions)" if item.get('individual_regions', 1) > 1 else ""
-            print(f"  - Page {item['page']}: {item['type']}{regions_info} -> {item['filename']}")
+        for page, item_type, n, filename in zip(extracted_items.pages, extracted_items.types, region_counts.tolist(), extracted_items.filenames):
+            regions_info = f" (merged {n} regions)" if n > 1 else ""
+            print(f"  - Page {page}: {item_type}{regions_info} -> {filename}")
     else:
         print("\n⚠️  No highlighted content or red annotations found.")
         print("This could mean:")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Extraction Results
+==================
+
+Column-oriented storage for the items found by the highlight extractor.
+
+Each field is kept in its own list (one entry per cropped image) instead of
+one dict per item, and extraction_summary.json is written in the same
+columnar layout:
+
+    {"page": [...], "type": [...], "filename": [...],
+     "coordinates": [[x1, y1, x2, y2], ...], "individual_regions": [...]}
+
+Summaries written as a list of item dicts by older versions still load.
+
+"""
+
+import numpy as np
+from typing import Dict, Iterator, List, Optional
+
+from json_io import read_json, write_json
+
+class ExtractedItems:
+    """Extracted items stored as parallel columns"""
+
+    def __init__(self):
+        self.pages: List[int] = []
+        self.types: List[str] = []
+        self.filenames: List[str] = []
+        # Flattened x1, y1, x2, y2 per item
+        self._coords: List[int] = []
+        # None for items that weren't merged from color regions (PDF annotations)
+        self.individual_regions: List[Optional[int]] = []
+
+    def add(self, page: int, item_type: str, filename: str, coordinates, individual_regions: Optional[int] = None):
+        """
+        Append one item
+
+        Args:
+            page: 1-based page number
+            item_type: Annotation type or color group type
+            filename: Image filename relative to the output directory
+            coordinates: (x1, y1, x2, y2) of the crop in page pixels
+            individual_regions: Number of regions merged into the item, if any
+        """
+        self.pages.append(page)
+        self.types.append(item_type)
+        self.filenames.append(filename)
+        self._coords.extend(int(v) for v in coordinates)
+        self.individual_regions.append(individual_regions)
+
+    def extend(self, other: "ExtractedItems"):
+        """Append all items from another ExtractedItems"""
+        self.pages.extend(other.pages)
+        self.types.extend(other.types)
+        self.filenames.extend(other.filenames)
+        self._coords.extend(other._coords)
+        self.individual_regions.extend(other.individual_regions)
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        """Crop coordinates as an (N, 4) int32 array of x1, y1, x2, y2"""
+        return np.array(self._coords, dtype=np.int32).reshape(-1, 4)
+
+    @property
+    def region_counts(self) -> np.ndarray:
+        """Regions merged into each item as an int32 array, 1 for items that weren't merged"""
+        return np.array([1 if n is None else n for n in self.individual_regions], dtype=np.int32)
+
+    def type_mask(self, kind: str) -> np.ndarray:
+        """Boolean mask of the items whose type contains kind (e.g. 'yellow' or 'red')"""
+        return np.char.find(np.array(self.types, dtype=str), kind) >= 0
+
+    def sorted_by_page(self) -> "ExtractedItems":
+        """Return a copy ordered by page, keeping the order of items within a page"""
+        order = sorted(range(len(self)), key=self.pages.__getitem__)
+
+        items = ExtractedItems()
+        items.pages = [self.pages[i] for i in order]
+        items.types = [self.types[i] for i in order]
+        items.filenames = [self.filenames[i] for i in order]
+        items._coords = [v for i in order for v in self._coords[4 * i:4 * i + 4]]
+        items.individual_regions = [self.individual_regions[i] for i in order]
+        return items
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __getitem__(self, index: int) -> Dict:
+        """Item as a dict, in the per-item layout used before the columnar format"""
+        x1, y1, x2, y2 = self._coords[4 * index:4 * index + 4]
+        item = {
+            "page": self.pages[index],
+            "type": self.types[index],
+            "filename": self.filenames[index],
+            "coordinates": {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
+        }
+        if self.individual_regions[index] is not None:
+            item["individual_regions"] = self.individual_regions[index]
+        return item
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self[i] for i in range(len(self)))
+
+    def to_columns(self) -> Dict:
+        """Columnar dict for the JSON summary; coordinates stay an (N, 4) array, which write_json serializes directly"""
+        return {
+            "page": self.pages,
+            "type": self.types,
+            "filename": self.filenames,
+            "coordinates": self.coordinates,
+            "individual_regions": self.individual_regions
+        }
+
+    @classmethod
+    def from_columns(cls, data: Dict) -> "ExtractedItems":
+        """Build from a columnar summary dict"""
+        items = cls()
+        items.pages = list(data["page"])
+        items.types = list(data["type"])
+        items.filenames = list(data["filename"])
+        items._coords = [int(v) for coords in data["coordinates"] for v in coords]
+        items.individual_regions = list(data.get("individual_regions") or [None] * len(items.pages))
+        return items
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "ExtractedItems":
+        """Build from a list of per-item dicts"""
+        items = cls()
+        for record in records:
+            coords = record["coordinates"]
+            items.add(record["page"], record["type"], record["filename"],
+                      (coords["x1"], coords["y1"], coords["x2"], coords["y2"]),
+                      record.get("individual_regions"))
+        return items
+
+def save_extraction_summary(summary_file: str, items: ExtractedItems):
+    """Write an extraction summary in the columnar layout"""
+    write_json(summary_file, items.to_columns())
+
+def load_extraction_summary(summary_file: str) -> ExtractedItems:
+    """
+    Load an extraction summary in either the columnar or the per-item layout
+
+    Raises:
+        FileNotFoundError: If the summary file does not exist
+        json.JSONDecodeError: If the summary file is not valid JSON
+    """
+    data = read_json(summary_file)
+    if isinstance(data, list):
+        return ExtractedItems.from_records(data)
+    return ExtractedItems.from_columns(data)
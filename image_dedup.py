@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Image Deduplication
+===================
+
+Finds repeated extracted images (the same equation highlighted twice, an
+annotation box repeated across pages) so OCR runs once per distinct image.
+
+By default only byte-identical images share an OCR result. Near-duplicate
+matching is opt-in: candidates are found by a 64-bit DCT perceptual hash (the
+image is shrunk to 32x32 grayscale, the low-frequency 8x8 corner of its DCT
+is compared against its median, and each coefficient becomes one bit) and then
+confirmed pixel by pixel, since crops whose text differs by one character
+("a + b" and "a - b") can have the same hash.
+
+"""
+
+import os
+import cv2
+import numpy as np
+from typing import List, Optional, Sequence
+
+from ocr_cache import hash_image_file
+
+# Pixels of a confirmed near-duplicate differ from the first copy by at most
+# this much (of 255): enough for rendering noise, not for a missing stroke
+PIXEL_TOLERANCE = 48
+
+def _read_gray(image_path: str, data: Optional[bytes] = None) -> Optional[np.ndarray]:
+    """Decode an image as grayscale, or None if it could not be read"""
+    if data is not None:
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if os.path.isfile(image_path):
+        return cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
+    return None
+
+def compute_phash(image_path: str, data: Optional[bytes] = None,
+                  image: Optional[np.ndarray] = None) -> Optional[int]:
+    """
+    Compute the 64-bit perceptual hash of an image
+
+    Args:
+        image_path: Path to the image file
+        data: Contents of the image file, if already read
+        image: The image decoded as grayscale, if already decoded
+
+    Returns:
+        Hash as an int, or None if the image could not be read
+    """
+    if image is None:
+        image = _read_gray(image_path, data)
+    if image is None:
+        return None
+
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA)
+    low_freq = cv2.dct(np.float32(small))[:8, :8]
+    bits = (low_freq > np.median(low_freq)).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def _same_pixels(a: np.ndarray, b: np.ndarray) -> bool:
+    """Whether two grayscale crops have the same size and no pixel differs by more than PIXEL_TOLERANCE"""
+    if a.shape != b.shape:
+        return False
+    return not np.any(cv2.absdiff(a, b) > PIXEL_TOLERANCE)
+
+def _find_exact_duplicates(image_paths: List[str], image_data: Optional[Sequence[bytes]]) -> List[int]:
+    sources = list(range(len(image_paths)))
+    first_with_hash = {}
+
+    for i, path in enumerate(image_paths):
+        try:
+            content_hash = hash_image_file(path, image_data[i] if image_data is not None else None)
+        except OSError:
+            continue
+        sources[i] = first_with_hash.setdefault(content_hash, i)
+
+    return sources
+
+def find_near_duplicates(image_paths: List[str], max_distance: Optional[int] = None,
+                         image_data: Optional[Sequence[bytes]] = None) -> List[int]:
+    """
+    Map each image to the first earlier image it duplicates
+
+    Args:
+        image_paths: Images in processing order
+        max_distance: None merges only byte-identical images; a value of 0 or
+            more also merges images whose hashes differ in at most that many
+            bits and whose pixels match; a negative value disables deduplication
+        image_data: Contents of each image file, if already read
+
+    Returns:
+        For each image, the index of the image whose OCR result it can reuse
+        (its own index if it is the first of its kind)
+    """
+    if max_distance is None:
+        return _find_exact_duplicates(image_paths, image_data)
+
+    sources = list(range(len(image_paths)))
+    if max_distance < 0:
+        return sources
+
+    # Distinct images seen so far; a run has at most a few hundred crops, so
+    # a linear scan is cheaper than maintaining a tree
+    unique = []
+
+    for i, path in enumerate(image_paths):
+        image = _read_gray(path, image_data[i] if image_data is not None else None)
+        if image is None:
+            continue
+        image_hash = compute_phash(path, image=image)
+
+        for seen_hash, seen_image, seen_index in unique:
+            if bin(image_hash ^ seen_hash).count('1') <= max_distance and _same_pixels(image, seen_image):
+                sources[i] = seen_index
+                break
+        else:
+            unique.append((image_hash, image, i))
+
+    return sources
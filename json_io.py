@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+JSON File Helpers
+=================
+
+Reads and writes the JSON files used across the workflow (config.json,
+extraction summaries). Uses orjson when it is installed, which parses and
+serializes several times faster, and falls back to the standard library.
+
+"""
+
+import json
+import sys
+from typing import Any
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def read_json(path: str) -> Any:
+    """
+    Read a JSON file
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        json.JSONDecodeError: If the file is not valid JSON (orjson's error subclasses it)
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _numpy_default(obj: Any) -> Any:
+    """json.dump fallback for the numpy arrays and scalars orjson serializes natively"""
+    # A numpy object can only exist once numpy is imported, so reading config doesn't have to import it
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def write_json(path: str, data: Any):
+    """Write data to a JSON file indented by two spaces; numpy arrays are written as lists"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        return
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, default=_numpy_default)
@@ -8,26 +8,49 @@ especially optimized for academic documents and mathematical content.
 """
 
 import os
+import io
 import json
-import base64
 from pathlib import Path
 from PIL import Image
 import requests
-import time
-from typing import Dict, List, Tuple, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Union
 
-def load_config(config_file: str = "config.json") -> Dict:
-    """Load configuration from JSON file"""
-    try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config
-    except FileNotFoundError:
-        print(f"❌ Config file not found: {config_file}")
-        raise
-    except json.JSONDecodeError as e:
-        print(f"❌ Invalid JSON in config file: {e}")
-        raise
+from config_loader import load_config
+from rate_limiter import RateLimiter
+from image_dedup import find_near_duplicates
+from ocr_cache import OCRCache, ocr_cache_path
+from ocr_stats import compute_ocr_statistics
+
+# Defaults for overlapping API requests; the rate matches the old 0.5s delay between calls
+MATHPIX_CONCURRENCY = 8
+MATHPIX_REQUESTS_PER_SECOND = 2
+# (connect, read) timeout in seconds; a request that times out is retried like a 429
+MATHPIX_TIMEOUT = (10, 60)
+# Retries after the first attempt, and the cap on each backoff wait in seconds
+MATHPIX_RETRIES = 3
+MATHPIX_MAX_BACKOFF = 30
+
+MATHPIX_URL = "https://api.mathpix.com/v3/text"
+# OCR options for academic documents, serialized once for every request
+MATHPIX_OPTIONS_JSON = json.dumps({
+    "formats": ["text", "latex_styled"],  # Get both plain text and LaTeX
+    "data_options": {
+        "include_asciimath": True,
+        "include_latex": True,
+        "include_tsv": False
+    }
+})
+
+# Markdown for one OCR result, filled in with str.format and written in one call
+EXTRACT_TEMPLATE = "## Extract {index}: {image_file}\n\n![Extract {index}]({image_path})\n\n{body}---\n\n"
+CONFIDENCE_TEMPLATE = "**Confidence**: {confidence:.1%}\n\n"
+TEXT_TEMPLATE = "### Extracted Text\n\n{text}\n\n"
+LATEX_TEMPLATE = "### LaTeX Format\n\n```latex\n{latex}\n```\n\n"
+NO_CONTENT_MARKDOWN = "*No text content extracted from this image*\n\n"
+ERROR_TEMPLATE = "**Error**: {error}\n\n"
 
 def setup_mathpix_credentials(config: Dict):
     """
@@ -56,48 +79,63 @@ def setup_mathpix_credentials(config: Dict):
     
     return app_id, app_key
 
-def encode_image_to_base64(image_path: str) -> str:
-    """Convert image to base64 string for Mathpix API"""
-    with open(image_path, 'rb') as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+def create_mathpix_session(pool_size: int = MATHPIX_CONCURRENCY) -> requests.Session:
+    """
+    Create an HTTP session that keeps connections to the Mathpix API open
+    
+    Args:
+        pool_size: Maximum number of pooled connections (one per concurrent request)
+        
+    Returns:
+        requests.Session reusing TLS connections across requests and retrying
+        rate-limited, failed or timed-out requests with jittered exponential
+        backoff, waiting for the server's Retry-After when it sends one
+    """
+    # OCR requests have no side effects, so POSTs are safe to retry
+    retry_options = dict(total=MATHPIX_RETRIES, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                         allowed_methods=frozenset({"POST"}), respect_retry_after_header=True)
+    try:
+        # Jitter keeps the worker threads from retrying in lockstep after a shared 429
+        retry = Retry(backoff_jitter=0.5, backoff_max=MATHPIX_MAX_BACKOFF, **retry_options)
+    except TypeError:
+        # urllib3 < 2 has neither option
+        retry = Retry(**retry_options)
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
 
-def extract_text_with_mathpix(image_path: str, app_id: str, app_key: str) -> Dict:
+def extract_text_with_mathpix(image: Union[str, bytes], app_id: str, app_key: str,
+                              session: Optional[requests.Session] = None) -> Dict:
     """
     Extract text from image using Mathpix OCR API
     
     Args:
-        image_path: Path to the image file
+        image: Path to the image file, or the file contents
         app_id: Mathpix App ID
         app_key: Mathpix App Key
+        session: Session to send the request on; a new connection is opened if omitted
         
     Returns:
         Dictionary containing extracted text and metadata
     """
     try:
-        # Encode image to base64
-        image_base64 = encode_image_to_base64(image_path)
-        
-        # Prepare API request
-        url = "https://api.mathpix.com/v3/text"
+        # Prepare API request; the image goes up as a raw multipart file
         headers = {
             "app_id": app_id,
-            "app_key": app_key,
-            "Content-type": "application/json"
+            "app_key": app_key
         }
         
-        # Configure OCR options for academic documents
-        data = {
-            "src": f"data:image/jpeg;base64,{image_base64}",
-            "formats": ["text", "latex_styled"],  # Get both plain text and LaTeX
-            "data_options": {
-                "include_asciimath": True,
-                "include_latex": True,
-                "include_tsv": False
-            }
-        }
+        if isinstance(image, str):
+            with open(image, 'rb') as image_file:
+                image = image_file.read()
         
         # Make API request
-        response = requests.post(url, headers=headers, json=data)
+        response = (session or requests).post(MATHPIX_URL, headers=headers,
+                                              files={"file": ("image", image)},
+                                              data={"options_json": MATHPIX_OPTIONS_JSON},
+                                              timeout=MATHPIX_TIMEOUT)
         response.raise_for_status()
         
         result = response.json()
@@ -132,37 +170,49 @@ def extract_text_with_mathpix(image_path: str, app_id: str, app_key: str) -> Dic
             'error': f"Processing failed: {str(e)}"
         }
 
-def preprocess_image_for_mathpix(image_path: str) -> str:
+def preprocess_image_for_mathpix(image_path: str, max_size: int = 1024, quality: int = 95,
+                                 data: Optional[bytes] = None) -> Union[str, bytes]:
     """
     Preprocess image for better Mathpix OCR results
     
+    The image is encoded in memory, so nothing is written next to the crops.
+    
     Args:
         image_path: Path to input image
+        max_size: Largest width or height sent to Mathpix
+        quality: JPEG quality for images that had to be converted or resized
+        data: Contents of image_path, if already read
         
     Returns:
-        Path to preprocessed image
+        Image file contents to upload, or image_path if preprocessing failed
     """
     try:
-        img = Image.open(image_path)
+        if data is None:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        
+        img = Image.open(io.BytesIO(data))
+        
+        # Already uploadable as is
+        if img.mode == 'RGB' and max(img.size) <= max_size:
+            return data
         
         # Convert to RGB if necessary
         if img.mode != 'RGB':
             img = img.convert('RGB')
         
         # Resize if image is too large (Mathpix has size limits)
-        max_size = 1024
         if max(img.size) > max_size:
             img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
         
-        # Save preprocessed image
-        preprocessed_path = image_path.replace('.png', '_preprocessed.png')
-        img.save(preprocessed_path, 'PNG', quality=95)
-        
-        return preprocessed_path
+        # JPEG encodes far faster than PNG and keeps the upload small
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=quality)
+        return buffer.getvalue()
         
     except Exception as e:
         print(f"⚠️  Preprocessing failed for {image_path}: {e}")
-        return image_path  # Return original if preprocessing fails
+        return image_path  # Upload the original if preprocessing fails
 
 def process_extracted_images_mathpix(images_dir: str, output_file: str, config: Dict):
     """
@@ -189,10 +239,13 @@ def process_extracted_images_mathpix(images_dir: str, output_file: str, config:
         print(f"❌ Images directory not found: {images_dir}")
         return
     
-    image_files = sorted([
-        f for f in images_dir_path.glob('*.png') 
-        if not f.name.endswith('_preprocessed.png')
-    ])
+    with os.scandir(images_dir_path) as entries:
+        image_names = sorted(
+            entry.name for entry in entries
+            if entry.name.endswith('.png') and not entry.name.endswith('_preprocessed.png')
+            and entry.is_file()
+        )
+    image_files = [images_dir_path / name for name in image_names]
     
     if not image_files:
         print(f"❌ No PNG images found in {images_dir}")
@@ -200,73 +253,116 @@ def process_extracted_images_mathpix(images_dir: str, output_file: str, config:
     
     print(f"📁 Found {len(image_files)} images to process with Mathpix OCR")
     
-    # Process each image
-    results = []
-    successful_extractions = 0
-    total_confidence = 0
+    # Requests overlap on worker threads; the limiter keeps them under the API rate limit
+    mathpix_config = config.get('mathpix', {})
+    concurrency = max(1, mathpix_config.get('concurrency', MATHPIX_CONCURRENCY))
+    rate_limiter = RateLimiter(mathpix_config.get('requests_per_second', MATHPIX_REQUESTS_PER_SECOND))
+    session = create_mathpix_session(concurrency)
     
-    for i, image_path in enumerate(image_files, 1):
-        print("\n 📸 Processing image {i}/{len(image_files)}: {image_path.name}")
-        
+    image_config = config.get('image_processing', {})
+    max_size = image_config.get('max_size', 1024)
+    quality = image_config.get('quality', 95)
+    
+    # Each image is read once; deduplication, the cache key and the upload share the bytes
+    image_data = [f.read_bytes() for f in image_files]
+    
+    def process_image(index: int) -> Dict:
         # Preprocess image for better OCR
-        preprocessed_path = preprocess_image_for_mathpix(str(image_path))
+        upload = preprocess_image_for_mathpix(str(image_files[index]), max_size, quality, image_data[index])
         
         # Extract text using Mathpix
-        result = extract_text_with_mathpix(preprocessed_path, app_id, app_key)
+        rate_limiter.wait()
+        return extract_text_with_mathpix(upload, app_id, app_key, session)
+    
+    # Repeated crops reuse the result of the first copy instead of a new request
+    max_distance = config.get('image_processing', {}).get('dedup_distance')
+    sources = find_near_duplicates(image_files, max_distance, image_data)
+    ocr_results = []
+    
+    # Images OCR'd by an earlier run are read back from the cache
+    cache = OCRCache(ocr_cache_path(config), 'mathpix')
+    cached = {i: cache.get(str(f), image_data[i]) for i, f in enumerate(image_files) if sources[i] == i}
+    pending = [i for i, result in cached.items() if result is None]
+    
+    # Process each image
+    results = []
+    
+    with cache, session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Largest uploads start first so they don't form the tail of the run;
+        # results are still collected in input order
+        futures = {i: executor.submit(process_image, i)
+                   for i in sorted(pending, key=lambda i: len(image_data[i]), reverse=True)}
         
-        if result['success']:
-            print(f"✅ OCR successful (confidence: {result['confidence']:.1%})")
-            successful_extractions += 1
-            total_confidence += result['confidence']
-            
-            # Clean up extracted text
-            text = result['text'].strip()
-            latex = result['latex'].strip()
+        for i, image_path in enumerate(image_files, 1):
+            source = sources[i - 1]
+            if source == i - 1 and cached[source] is not None:
+                result = cached[source]
+                print(f"\n 📸 Cached result for image {i}/{len(image_files)}: {image_path.name}")
+            elif source == i - 1:
+                result = futures[source].result()
+                cache.put(str(image_path), result)
+                print(f"\n 📸 Processed image {i}/{len(image_files)}: {image_path.name}")
+            else:
+                result = ocr_results[source]
+                print(f"\n 📸 Reused result of {image_files[source].name} for image {i}/{len(image_files)}: {image_path.name}")
+            ocr_results.append(result)
             
-            results.append({
-                'image_file': image_path.name,
-                'image_path': str(image_path),
-                'text': text,
-                'latex': latex,
-                'confidence': result['confidence'],
-                'success': True
-            })
-        else:
-            print(f"❌ OCR failed: {result['error']}")
-            results.append({
-                'image_file': image_path.name,
-                'image_path': str(image_path),
-                'text': '',
-                'latex': '',
-                'confidence': 0,
-                'success': False,
-                'error': result['error']
-            })
-        
-        # Clean up preprocessed file if it's different from original
-        if preprocessed_path != str(image_path) and os.path.exists(preprocessed_path):
-            os.remove(preprocessed_path)
-        
-        # Add small delay to respect API rate limits
-        time.sleep(0.5)
+            if result['success']:
+                print(f"✅ OCR successful (confidence: {result['confidence']:.1%})")
+                
+                # Clean up extracted text
+                text = result['text'].strip()
+                latex = result['latex'].strip()
+                
+                results.append({
+                    'image_file': image_path.name,
+                    'image_path': str(image_path),
+                    'text': text,
+                    'latex': latex,
+                    'confidence': result['confidence'],
+                    'success': True
+                })
+            else:
+                print(f"❌ OCR failed: {result['error']}")
+                results.append({
+                    'image_file': image_path.name,
+                    'image_path': str(image_path),
+                    'text': '',
+                    'latex': '',
+                    'confidence': 0,
+                    'success': False,
+                    'error': result['error']
+                })
     
     # Generate statistics
-    success_rate = (successful_extractions / len(image_files)) * 100 if image_files else 0
-    avg_confidence = (total_confidence / successful_extractions) if successful_extractions > 0 else 0
+    stats = compute_ocr_statistics(results)
     
     print("\n 📊  Processing Statistics:")
-    print(f"   • Total images: {len(image_files)}")
-    print(f"   • Successful extractions: {successful_extractions}")
-    print(f"   • Success rate: {success_rate:.1f}%")
-    print(f"   • Average confidence: {avg_confidence:.1%}")
+    print(f"   • Total images: {stats['total_images']}")
+    print(f"   • Successful extractions: {stats['successful_extractions']}")
+    print(f"   • Success rate: {stats['success_rate']:.1f}%")
+    print(f"   • Average confidence: {stats['avg_confidence']:.1%}")
+    print(f"   • Median confidence: {stats['median_confidence']:.1%} (5th percentile: {stats['p5_confidence']:.1%})")
     
     # Generate markdown output
-    generate_mathpix_markdown(results, output_file, {
-        'total_images': len(image_files),
-        'successful_extractions': successful_extractions,
-        'success_rate': success_rate,
-        'avg_confidence': avg_confidence
-    })
+    generate_mathpix_markdown(results, output_file, stats)
+
+def format_mathpix_result(index: int, result: Dict) -> str:
+    """Markdown section for one OCR result, embedding its image"""
+    if result['success']:
+        # Confidence score, extracted text, and LaTeX if available and different from text
+        body = CONFIDENCE_TEMPLATE.format(confidence=result['confidence'])
+        if result['text']:
+            body += TEXT_TEMPLATE.format(text=result['text'])
+        if result['latex'] and result['latex'] != result['text']:
+            body += LATEX_TEMPLATE.format(latex=result['latex'])
+        if not result['text'] and not result['latex']:
+            body += NO_CONTENT_MARKDOWN
+    else:
+        body = ERROR_TEMPLATE.format(error=result.get('error', 'Unknown error'))
+    
+    return EXTRACT_TEMPLATE.format(index=index, image_file=result['image_file'],
+                                   image_path=result['image_path'], body=body)
 
 def generate_mathpix_markdown(results: List[Dict], output_file: str, stats: Dict):
     """Generate markdown file with Mathpix OCR results and embedded images"""
@@ -280,39 +376,15 @@ def generate_mathpix_markdown(results: List[Dict], output_file: str, stats: Dict
         f.write(f"- **Total Images Processed**: {stats['total_images']}\n")
         f.write(f"- **Successful Extractions**: {stats['successful_extractions']}\n")
         f.write(f"- **Success Rate**: {stats['success_rate']:.1f}%\n")
-        f.write(f"- **Average Confidence**: {stats['avg_confidence']:.1%}\n\n")
+        f.write(f"- **Average Confidence**: {stats['avg_confidence']:.1%}\n")
+        f.write(f"- **Median Confidence**: {stats['median_confidence']:.1%}\n")
+        f.write(f"- **5th Percentile Confidence**: {stats['p5_confidence']:.1%}\n\n")
         
         f.write("---\n\n")
         
         # Write results for each image
         for i, result in enumerate(results, 1):
-            f.write(f"## Extract {i}: {result['image_file']}\n\n")
-            
-            # Embed the image
-            f.write(f"![Extract {i}]({result['image_path']})\n\n")
-            
-            if result['success']:
-                # Write confidence score
-                f.write(f"**Confidence**: {result['confidence']:.1%}\n\n")
-                
-                # Write extracted text
-                if result['text']:
-                    f.write("### Extracted Text\n\n")
-                    f.write(f"{result['text']}\n\n")
-                
-                # Write LaTeX if available and different from text
-                if result['latex'] and result['latex'] != result['text']:
-                    f.write("### LaTeX Format\n\n")
-                    f.write("```latex\n")
-                    f.write(f"{result['latex']}\n")
-                    f.write("```\n\n")
-                
-                if not result['text'] and not result['latex']:
-                    f.write("*No text content extracted from this image*\n\n")
-            else:
-                f.write(f"**Error**: {result.get('error', 'Unknown error')}\n\n")
-            
-            f.write("---\n\n")
+            f.write(format_mathpix_result(i, result))
     
     print(f"📝 Markdown file generated: {output_file}")
 
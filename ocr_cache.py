@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+OCR Result Cache
+================
+
+Persists OCR results in a SQLite database keyed by a hash of the image bytes,
+so re-running OCR over unchanged crops is a lookup instead of a Tesseract run
+or Mathpix request. Results are stored per engine, since each engine (and each
+Tesseract language) produces different text for the same image.
+
+Images are hashed with xxh3 when xxhash is installed and BLAKE2b otherwise.
+
+"""
+
+import os
+import sqlite3
+import hashlib
+from typing import Dict, Optional
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+OCR_CACHE_FILE = "ocr_cache.db"
+
+def hash_image_file(image_path: str, data: Optional[bytes] = None) -> str:
+    """Hash the contents of an image file, reading it unless data is given"""
+    if data is None:
+        with open(image_path, 'rb') as f:
+            data = f.read()
+
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def ocr_cache_path(config: Dict) -> Optional[str]:
+    """
+    Location of the OCR cache for a configuration
+
+    Returns:
+        folders.ocr_cache if set, otherwise ocr_cache.db in the output folder;
+        None if folders.ocr_cache is an empty string (cache disabled)
+    """
+    folders = config.get('folders', {})
+    path = folders.get('ocr_cache')
+    if path is None:
+        return os.path.join(folders.get('output', 'output'), OCR_CACHE_FILE)
+    return path or None
+
+class OCRCache:
+    """OCR results for one engine, keyed by image content hash"""
+
+    def __init__(self, db_path: Optional[str], engine: str):
+        """
+        Args:
+            db_path: SQLite database file; None gives a cache that stores nothing
+            engine: Identifier of the OCR engine and settings the results belong to
+        """
+        self.engine = engine
+        self._hashes = {}
+        self._conn = None
+
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+
+            self._conn = sqlite3.connect(db_path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results ("
+                "hash TEXT, engine TEXT, text TEXT, latex TEXT, confidence REAL, "
+                "PRIMARY KEY (hash, engine))"
+            )
+
+    def _hash(self, image_path: str, data: Optional[bytes] = None) -> Optional[str]:
+        if image_path not in self._hashes:
+            try:
+                self._hashes[image_path] = hash_image_file(image_path, data)
+            except OSError:
+                self._hashes[image_path] = None
+        return self._hashes[image_path]
+
+    def get(self, image_path: str, data: Optional[bytes] = None) -> Optional[Dict]:
+        """
+        Look up the cached result for an image
+
+        Args:
+            image_path: Path to the image file
+            data: Contents of the image file, if already read
+
+        Returns:
+            Result dict with text, confidence, success and error (plus latex if
+            the engine returned any), or None if the image is not cached
+        """
+        if self._conn is None:
+            return None
+
+        image_hash = self._hash(image_path, data)
+        if image_hash is None:
+            return None
+
+        row = self._conn.execute(
+            "SELECT text, latex, confidence FROM ocr_results WHERE hash = ? AND engine = ?",
+            (image_hash, self.engine)
+        ).fetchone()
+        if row is None:
+            return None
+
+        text, latex, confidence = row
+        result = {'text': text, 'confidence': confidence, 'success': True, 'error': None}
+        if latex is not None:
+            result['latex'] = latex
+        return result
+
+    def put(self, image_path: str, result: Dict):
+        """Store a successful OCR result; failures are not cached so they are retried"""
+        if self._conn is None or not result.get('success'):
+            return
+
+        image_hash = self._hash(image_path)
+        if image_hash is None:
+            return
+
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results VALUES (?, ?, ?, ?, ?)",
+                (image_hash, self.engine, result['text'], result.get('latex'), result['confidence'])
+            )
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -7,23 +7,49 @@ Uses Tesseract OCR for local text recognition.
 import os
 import json
 import re
+import threading
+import cv2
+import numpy as np
 from PIL import Image
 import pytesseract
 from datetime import datetime
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
 
-def load_config(config_file: str = "config.json") -> Dict:
-    """Load configuration from JSON file"""
-    try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config
-    except FileNotFoundError:
-        print(f"❌ Config file not found: {config_file}")
-        raise
-    except json.JSONDecodeError as e:
-        print(f"❌ Invalid JSON in config file: {e}")
-        raise
+# tesserocr keeps the Tesseract engine loaded in-process instead of running the
+# tesseract binary per image
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+from config_loader import read_config
+from extraction_results import load_extraction_summary
+from image_dedup import find_near_duplicates
+from ocr_cache import OCRCache, OCR_CACHE_FILE
+from tesseract_threads import omp_thread_limit
+
+CONTRAST_FACTOR = 1.5
+
+# ImageEnhance.Sharpness(1.2) blends 1.2x the image with -0.2x PIL's SMOOTH
+# filter; both fold into a single convolution kernel
+_SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+SHARPEN_KERNEL = -0.2 * _SMOOTH_KERNEL
+SHARPEN_KERNEL[1, 1] += 1.2
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Markdown for one extracted image, filled in with str.format and written in one call
+ITEM_TEMPLATE = "#### {heading} {group}{regions_note}\n\n![{filename}]({images_dir}/{filename})\n\n{body}---\n\n"
+READABLE_TEMPLATE = "**Confidence:** {confidence:.1f}%\n\n{text}\n\n"
+UNREADABLE_MARKDOWN = "*OCR could not extract readable text from this image.*\n\n"
+
+# One tesserocr engine per OCR thread
+_thread_local = threading.local()
+
+# Every engine _get_tesserocr_api has loaded, so they can be ended once the OCR pool finishes
+_tesserocr_apis = []
+_tesserocr_apis_lock = threading.Lock()
 
 def setup_tesseract():
     """
@@ -69,37 +95,101 @@ def setup_tesseract():
     
     return False
 
+def _scratch_buffer(name, shape):
+    """
+    Reusable uint8 array for one preprocessing step on the current thread.
+    
+    Reallocated only when the image size changes, so runs of similarly sized
+    crops do not allocate new full-size arrays for every step of every image.
+    """
+    buffers = getattr(_thread_local, 'buffers', None)
+    if buffers is None:
+        buffers = _thread_local.buffers = {}
+    
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape:
+        buffer = buffers[name] = np.empty(shape, dtype=np.uint8)
+    return buffer
+
 def preprocess_image_for_ocr(image_path):
     """
     Preprocess image to improve OCR accuracy.
+    
+    Applies the same contrast (1.5x) and sharpness (1.2x) enhancement as PIL's
+    ImageEnhance, then a 2x Lanczos upscale, as OpenCV operations on one array.
     """
     try:
-        from PIL import ImageEnhance, ImageFilter
-        
-        image = Image.open(image_path)
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        image = np.asarray(Image.open(image_path).convert('RGB'))
+        height, width = image.shape[:2]
         
-        # Enhance contrast
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(1.5)
+        # Enhance contrast: stretch values away from the mean gray level
+        mean = int(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY).mean() + 0.5)
+        contrast_lut = np.clip(mean + CONTRAST_FACTOR * (np.arange(256) - mean) + 0.5, 0, 255).astype(np.uint8)
+        contrasted = cv2.LUT(image, contrast_lut, dst=_scratch_buffer('contrast', image.shape))
         
         # Enhance sharpness
-        enhancer = ImageEnhance.Sharpness(image)
-        image = enhancer.enhance(1.2)
+        sharpened = cv2.filter2D(contrasted, -1, SHARPEN_KERNEL, dst=_scratch_buffer('sharpen', image.shape),
+                                 borderType=cv2.BORDER_REPLICATE)
         
         # Scale up image for better OCR (2x)
-        width, height = image.size
-        image = image.resize((width * 2, height * 2), Image.Resampling.LANCZOS)
+        upscaled = cv2.resize(sharpened, (width * 2, height * 2), dst=_scratch_buffer('upscale', (height * 2, width * 2, 3)),
+                              interpolation=cv2.INTER_LANCZOS4)
         
-        return image
+        # fromarray copies RGB data, so the scratch buffers are free for the next image
+        return Image.fromarray(upscaled)
     
     except Exception as e:
         print(f"⚠️  Could not preprocess {image_path}: {e}")
         return Image.open(image_path)
 
+def _get_tesserocr_api():
+    """Tesseract engine for the current thread, loaded on first use"""
+    api = getattr(_thread_local, 'api', None)
+    if api is None:
+        # Same settings as '--oem 3 --psm 6'
+        api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_BLOCK, oem=tesserocr.OEM.DEFAULT)
+        _thread_local.api = api
+        with _tesserocr_apis_lock:
+            _tesserocr_apis.append(api)
+    return api
+
+def _end_tesserocr_apis():
+    """
+    Free the engines loaded by _get_tesserocr_api.
+    
+    Only call this once the threads that used them have finished, since their
+    thread-local references are not cleared.
+    """
+    with _tesserocr_apis_lock:
+        apis = _tesserocr_apis[:]
+        _tesserocr_apis.clear()
+    for api in apis:
+        api.End()
+
+def recognize_words(image):
+    """
+    Run Tesseract on an image.
+    
+    Returns:
+        list: (word, confidence) pairs
+    """
+    if TESSEROCR_AVAILABLE:
+        api = _get_tesserocr_api()
+        api.SetImage(image)
+        api.Recognize()
+        
+        level = tesserocr.RIL.WORD
+        return [
+            (word.GetUTF8Text(level) or '', word.Confidence(level))
+            for word in tesserocr.iterate_level(api.GetIterator(), level)
+        ]
+    
+    # OCR configuration for better accuracy
+    custom_config = r'--oem 3 --psm 6'
+    
+    data = pytesseract.image_to_data(image, config=custom_config, output_type=pytesseract.Output.DICT)
+    return list(zip(data['text'], data['conf']))
+
 def extract_text_from_image(image_path, confidence_threshold=30):
     """
     Extract text from an image using OCR.
@@ -115,22 +205,16 @@ def extract_text_from_image(image_path, confidence_threshold=30):
         # Preprocess image
         image = preprocess_image_for_ocr(image_path)
         
-        # OCR configuration for better accuracy
-        custom_config = r'--oem 3 --psm 6'
-        
-        # Extract text with confidence scores
-        data = pytesseract.image_to_data(image, config=custom_config, output_type=pytesseract.Output.DICT)
-        
         # Filter by confidence and combine text
         text_parts = []
         confidences = []
         
-        for i in range(len(data['text'])):
-            if int(data['conf'][i]) > confidence_threshold:
-                text = data['text'][i].strip()
+        for text, conf in recognize_words(image):
+            if int(conf) > confidence_threshold:
+                text = text.strip()
                 if text:
                     text_parts.append(text)
-                    confidences.append(int(data['conf'][i]))
+                    confidences.append(int(conf))
         
         # Combine text parts
         extracted_text = ' '.join(text_parts)
@@ -153,22 +237,55 @@ def clean_extracted_text(text):
         return ""
     
     # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text)
+    text = WHITESPACE_RE.sub(' ', text)
     
     # Fix common OCR mistakes
     text = text.replace('|', 'I')  # Common pipe/I confusion
-    text = text.replace('0', 'O', text.count('0') // 3)  # Some zero/O fixes (conservative)
     
     # Capitalize first letter of sentences
-    sentences = text.split('. ')
-    sentences = [s.capitalize() if s else s for s in sentences]
-    text = '. '.join(sentences)
+    text = '. '.join(s.capitalize() for s in text.split('. '))
     
     return text.strip()
 
-def process_extracted_images(images_dir="extracted_content_grouped", output_file="extracted_text.md"):
+def write_item_markdown(f, item, heading, images_dir, text, confidence):
+    """
+    Write the markdown section for one extracted image.
+    
+    Args:
+        f: Open markdown file
+        item (dict): Extraction summary entry of the image
+        heading (str): Section heading, followed by the group number
+        images_dir (str): Directory the image links point into
+        text (str): OCR text of the image
+        confidence (float): OCR confidence in percent
+    
+    Returns:
+        bool: Whether the text was readable enough to include
+    """
+    filename = item['filename']
+    readable = bool(text) and confidence > 30
+    
+    if readable:
+        individual_count = item.get('individual_regions', 1)
+        regions_note = f" *(merged from {individual_count} regions)*" if individual_count > 1 else ""
+        body = READABLE_TEMPLATE.format(confidence=confidence, text=text)
+    else:
+        regions_note = ""
+        body = UNREADABLE_MARKDOWN
+    
+    f.write(ITEM_TEMPLATE.format(heading=heading, group=filename.rpartition('_')[2].partition('.')[0],
+                                 regions_note=regions_note, filename=filename,
+                                 images_dir=images_dir, body=body))
+    return readable
+
+def process_extracted_images(images_dir="extracted_content_grouped", output_file="extracted_text.md",
+                             dedup_distance=None, omp_threads=None):
     """
     Process all extracted images and create a markdown file with OCR results.
+    
+    dedup_distance is image_processing.dedup_distance: None reuses OCR results
+    only between identical images (see image_dedup.find_near_duplicates).
+    omp_threads is tesseract.omp_threads.
     """
     
     if not os.path.exists(images_dir):
@@ -181,8 +298,7 @@ def process_extracted_images(images_dir="extracted_content_grouped", output_file
         print(f"❌ Summary file not found: {summary_file}")
         return
     
-    with open(summary_file, 'r') as f:
-        extraction_data = json.load(f)
+    extraction_data = load_extraction_summary(summary_file)
     
     # Group by page
     pages = {}
@@ -196,82 +312,78 @@ def process_extracted_images(images_dir="extracted_content_grouped", output_file
         else:
             pages[page]['red'].append(item)
     
-    # Process images and create markdown
-    markdown_content = generate_markdown_header()
-    
-    total_processed = 0
-    successful_extractions = 0
+    # Repeated crops reuse the OCR result of the first copy
+    image_paths = [os.path.join(images_dir, item['filename']) for item in extraction_data]
+    sources = find_near_duplicates(image_paths, dedup_distance)
+    source_of = {path: image_paths[source] for path, source in zip(image_paths, sources)}
+    results_by_source = {}
     
-    for page_num in sorted(pages.keys()):
-        print("\n📄 Processing Page {page_num}...")
+    # Results from earlier runs over the same image bytes are kept next to the images
+    with OCRCache(os.path.join(images_dir, OCR_CACHE_FILE), 'tesseract-psm6') as cache:
+        pending = []
         
-        page_data = pages[page_num]
-        page_content = "\n## Page {page_num}\n\n"
-        
-        # Process yellow highlights
-        if page_data['yellow']:
-            page_content += "### 📝 Highlighted Content\n\n"
+        for source in dict.fromkeys(source_of.values()):
+            if not os.path.exists(source):
+                continue
             
-            for item in page_data['yellow']:
-                image_path = os.path.join(images_dir, item['filename'])
-                
-                if os.path.exists(image_path):
-                    print(f"  🔍 OCR on {item['filename']}...")
-                    text, confidence = extract_text_from_image(image_path)
-                    total_processed += 1
-                    
-                    if text and confidence > 30:
-                        successful_extractions += 1
-                        individual_count = item.get('individual_regions', 1)
-                        regions_note = f" *(merged from {individual_count} regions)*" if individual_count > 1 else ""
-                        
-                        page_content += f"#### Highlight Group {item['filename'].split('_')[-1].split('.')[0]}{regions_note}\n\n"
-                        page_content += f"![{item['filename']}]({images_dir}/{item['filename']})\n\n"
-                        page_content += f"**Confidence:** {confidence:.1f}%\n\n"
-                        page_content += f"{text}\n\n"
-                        page_content += "---\n\n"
-                    else:
-                        page_content += f"#### Highlight Group {item['filename'].split('_')[-1].split('.')[0]}\n\n"
-                        page_content += f"![{item['filename']}]({images_dir}/{item['filename']})\n\n"
-                        page_content += "*OCR could not extract readable text from this image.*\n\n"
-                        page_content += "---\n\n"
+            cached = cache.get(source)
+            if cached is not None:
+                results_by_source[source] = (cached['text'], cached['confidence'])
+            else:
+                pending.append(source)
+        
+        # OCR the remaining images up front; each thread drives its own tesserocr
+        # engine, or its own tesseract subprocess without tesserocr
+        workers = os.cpu_count() or 1
         
-        # Process red marks
-        if page_data['red']:
-            page_content += "### 🔴 Red Annotations\n\n"
+        if pending:
+            print(f"🔍 Running OCR on {len(pending)} images...")
+        
+        # The thread limit reaches the subprocesses; the in-process tesserocr engine
+        # reads OMP_THREAD_LIMIT once, when its library loads
+        try:
+            with omp_thread_limit(omp_threads, parallel=workers > 1), ThreadPoolExecutor(max_workers=workers) as executor:
+                for source, (text, confidence) in zip(pending, executor.map(extract_text_from_image, pending)):
+                    cache.put(source, {'text': text, 'confidence': confidence, 'success': bool(text)})
+                    results_by_source[source] = (text, confidence)
+        finally:
+            # The pool's threads have exited, so nothing uses their engines any more
+            _end_tesserocr_apis()
+    
+    # Process images, writing the markdown page by page
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(generate_markdown_header())
+        
+        total_processed = 0
+        successful_extractions = 0
+        
+        for page_num in sorted(pages.keys()):
+            print("\n📄 Processing Page {page_num}...")
+            
+            page_data = pages[page_num]
+            f.write("\n## Page {page_num}\n\n")
             
-            for item in page_data['red']:
-                image_path = os.path.join(images_dir, item['filename'])
+            # Process yellow highlights, then red marks
+            for kind, section_title, heading in (('yellow', "### 📝 Highlighted Content", "Highlight Group"),
+                                                 ('red', "### 🔴 Red Annotations", "Red Annotation")):
+                if not page_data[kind]:
+                    continue
+                
+                f.write(f"{section_title}\n\n")
                 
-                if os.path.exists(image_path):
-                    print(f"  🔍 OCR on {item['filename']}...")
-                    text, confidence = extract_text_from_image(image_path)
-                    total_processed += 1
+                for item in page_data[kind]:
+                    image_path = os.path.join(images_dir, item['filename'])
                     
-                    if text and confidence > 30:
-                        successful_extractions += 1
-                        individual_count = item.get('individual_regions', 1)
-                        regions_note = f" *(merged from {individual_count} regions)*" if individual_count > 1 else ""
+                    if os.path.exists(image_path):
+                        print(f"  🔍 OCR on {item['filename']}...")
+                        text, confidence = results_by_source[source_of[image_path]]
+                        total_processed += 1
                         
-                        page_content += f"#### Red Annotation {item['filename'].split('_')[-1].split('.')[0]}{regions_note}\n\n"
-                        page_content += f"![{item['filename']}]({images_dir}/{item['filename']})\n\n"
-                        page_content += f"**Confidence:** {confidence:.1f}%\n\n"
-                        page_content += f"{text}\n\n"
-                        page_content += "---\n\n"
-                    else:
-                        page_content += f"#### Red Annotation {item['filename'].split('_')[-1].split('.')[0]}\n\n"
-                        page_content += f"![{item['filename']}]({images_dir}/{item['filename']})\n\n"
-                        page_content += "*OCR could not extract readable text from this image.*\n\n"
-                        page_content += "---\n\n"
-        
-        markdown_content += page_content
-    
-    # Add summary
-    markdown_content += generate_markdown_footer(total_processed, successful_extractions)
-    
-    # Save markdown file
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
+                        if write_item_markdown(f, item, heading, images_dir, text, confidence):
+                            successful_extractions += 1
+            
+        # Add summary
+        f.write(generate_markdown_footer(total_processed, successful_extractions))
     
     print(f"\n✅ OCR processing complete!")
     print(f"📊 Results:")
@@ -367,9 +479,17 @@ def main():
         print("❌ No PNG images found in the directory")
         return
     
+    # Deduplication and Tesseract threads are configured in config.json, if there is one
+    try:
+        config = read_config('config.json')
+    except (OSError, ValueError):
+        config = {}
+    dedup_distance = config.get('image_processing', {}).get('dedup_distance')
+    omp_threads = config.get('tesseract', {}).get('omp_threads')
+    
     # Run OCR processing
     output_file = "extracted_text.md"
-    process_extracted_images(images_dir, output_file)
+    process_extracted_images(images_dir, output_file, dedup_distance, omp_threads)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+OCR Statistics
+==============
+
+Summary statistics over a list of OCR result dicts, computed in one numpy
+pass after OCR has finished.
+
+"""
+
+import numpy as np
+from typing import Dict, List
+
+def compute_ocr_statistics(results: List[Dict]) -> Dict:
+    """
+    Summarize OCR results
+
+    Args:
+        results: OCR result dicts with 'success' and 'confidence' keys
+
+    Returns:
+        Dictionary with total_images, successful_extractions, success_rate
+        (percent), and the avg, median and 5th percentile (p5) confidence of
+        the successful extractions
+    """
+    confidences = np.fromiter((r['confidence'] for r in results if r['success']), dtype=np.float64)
+    successful = int(confidences.size)
+
+    return {
+        'total_images': len(results),
+        'successful_extractions': successful,
+        'success_rate': successful / len(results) * 100 if results else 0,
+        'avg_confidence': float(confidences.mean()) if successful else 0,
+        'median_confidence': float(np.median(confidences)) if successful else 0,
+        'p5_confidence': float(np.percentile(confidences, 5)) if successful else 0
+    }
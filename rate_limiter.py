@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter
+============
+
+Thread-safe limiter for spacing out API requests made from worker threads.
+
+"""
+
+import time
+import threading
+
+class RateLimiter:
+    """Space calls at least 1/rate_per_second seconds apart across all threads"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second and rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        """Block until the caller may make its next request"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_time, now)
+            self._next_time = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
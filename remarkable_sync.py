@@ -16,18 +16,52 @@ Requires rmapi to be installed and configured:
 """
 
 import os
-import json
+import re
+import hashlib
 import logging
 import subprocess
-import tempfile
+import threading
 from pathlib import Path
-from typing import Dict, List, Tuple
-import shutil
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 import time
 
+from json_io import read_json, write_json
+from config_loader import read_config
+
+logger = logging.getLogger(__name__)
+
+# Local record of uploaded files, kept next to the to-read folder
+SYNC_STATE_FILE = '.rm_sync_state.json'
+
+# rmapi errors that mean the reMarkable cloud is throttling us. A 429 only counts
+# next to a status word, so file names and document IDs containing 429 don't match
+RATE_LIMIT_RE = re.compile(
+    r'\b(?:status(?:\s*code)?|http(?:/[\d.]+)?|code|error)[\s:=]*429\b'
+    r'|\b429\s+too\s+many\s+requests\b|\brate[\s_-]?limit|\btoo\s+many\s+requests\b',
+    re.IGNORECASE
+)
+
+# One rmapi ls entry: an optional [d]/[f] type marker, then the name (which may contain spaces)
+LS_ENTRY_RE = re.compile(r'^\s*(?:\[\w\]\s+)?(.+?)\s*$', re.MULTILINE)
+
+# Attempts per rmapi command while throttled, and the longest pause between them
+RATE_LIMIT_ATTEMPTS = 4
+MAX_BACKOFF_SECONDS = 30.0
+
+# rmapi commands that move a whole PDF and so get the longer transfer_timeout
+TRANSFER_COMMANDS = ('put', 'get')
+
+# rmapi commands whose stdout is used; the rest send it to /dev/null
+OUTPUT_COMMANDS = ('ls',)
+
 class RemarkableSync:
     """Handles reMarkable tablet synchronization"""
     
+    # Set once rmapi has been found, so later instances skip the check
+    _rmapi_verified = False
+    
     def __init__(self, config: Dict):
         """
         Initialize Remarkable sync with configuration
@@ -53,17 +87,42 @@ class RemarkableSync:
         self.delete_after_upload = remarkable_config.get('delete_after_upload', False)
         self.delete_after_download = remarkable_config.get('delete_after_download', False)
         
-        # Setup logging
-        logging.basicConfig(level=logging.INFO)
-        self.logger = logging.getLogger(__name__)
+        # Number of rmapi transfers to run at once
+        self.max_workers = max(1, remarkable_config.get('max_workers', 4))
+        
+        # Seconds before an rmapi command is abandoned; None waits indefinitely.
+        # Transfers of large annotated PDFs get far longer than listings
+        self.command_timeout = remarkable_config.get('command_timeout', 60)
+        self.transfer_timeout = remarkable_config.get('transfer_timeout', 600)
+        
+        # Parsed rmapi ls output by folder ('' for the root), reused for a short
+        # time since every rmapi call is a cloud round-trip
+        self._ls_cache: Dict[str, Tuple[float, List[str]]] = {}
+        self._ls_ttl = remarkable_config.get('ls_cache_ttl', 60)
+        
+        # Pause before retrying a throttled command; grows on rate-limit errors, decays on success
+        self._backoff = 0.0
+        
+        # Guards _ls_cache and _backoff, which upload and download threads share
+        # during a full sync; never held while rmapi runs
+        self._lock = threading.Lock()
+        
+        # [size, mtime, sha1] of each file as last uploaded, so unchanged files are
+        # not uploaded again after they are moved out of the reMarkable to-read folder
+        self._state_path = Path(self.to_read_folder).parent / SYNC_STATE_FILE
+        self._sync_state = self._load_sync_state()
+        
+        self.logger = logger
         
         # Ensure local directories exist
         Path(self.to_read_folder).mkdir(parents=True, exist_ok=True)
         Path(self.read_folder).mkdir(parents=True, exist_ok=True)
         
-        # Check if rmapi is available
-        if not self._check_rmapi():
-            raise RuntimeError("rmapi is not available. Please install and configure rmapi.")
+        # Check if rmapi is available; a failed check is repeated in case it has since been installed
+        if not RemarkableSync._rmapi_verified:
+            if not self._check_rmapi():
+                raise RuntimeError("rmapi is not available. Please install and configure rmapi.")
+            RemarkableSync._rmapi_verified = True
     
     def _check_rmapi(self) -> bool:
         """
@@ -89,27 +148,81 @@ class RemarkableSync:
         Returns:
             Tuple of (success, stdout, stderr)
         """
+        for attempt in range(RATE_LIMIT_ATTEMPTS):
+            success, stdout, stderr = self._run_rmapi_once(command)
+            
+            if success:
+                with self._lock:
+                    self._backoff *= 0.5
+            elif RATE_LIMIT_RE.search(stderr) and attempt + 1 < RATE_LIMIT_ATTEMPTS:
+                with self._lock:
+                    self._backoff = backoff = min(max(self._backoff * 2, 1.0), MAX_BACKOFF_SECONDS)
+                self.logger.warning("reMarkable cloud is rate limiting, retrying in %.0fs", backoff)
+                time.sleep(backoff)
+                continue
+            
+            return success, stdout, stderr
+    
+    def _run_rmapi_once(self, command: List[str]) -> Tuple[bool, str, str]:
+        """Run an rmapi command a single time, returning (success, stdout, stderr)"""
+        timeout = self.transfer_timeout if command[0] in TRANSFER_COMMANDS else self.command_timeout
         try:
-            self.logger.debug(f"Running rmapi command: {' '.join(command)}")
-            result = subprocess.run(['rmapi'] + command, 
-                                  capture_output=True, text=True, timeout=60)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Running rmapi command: %s", ' '.join(command))
+            stdout_target = subprocess.PIPE if command[0] in OUTPUT_COMMANDS else subprocess.DEVNULL
+            result = subprocess.run(['rmapi'] + command, stdout=stdout_target,
+                                  stderr=subprocess.PIPE, text=True, timeout=timeout)
             
             success = result.returncode == 0
-            stdout = result.stdout.strip()
+            stdout = (result.stdout or "").strip()
             stderr = result.stderr.strip()
             
             if not success:
-                self.logger.error(f"rmapi command failed: {stderr}")
+                self.logger.error("rmapi command failed: %s", stderr)
             
             return success, stdout, stderr
             
         except subprocess.TimeoutExpired:
-            self.logger.error("rmapi command timed out")
+            self.logger.error("rmapi command timed out after %ss: %s", timeout, ' '.join(command))
             return False, "", "Command timed out"
         except Exception as e:
-            self.logger.error(f"Error running rmapi command: {e}")
+            self.logger.error("Error running rmapi command: %s", e)
             return False, "", str(e)
     
+    @staticmethod
+    def _parse_ls(stdout: str) -> List[str]:
+        """Names listed in rmapi ls output, in listing order"""
+        return [name for name in LS_ENTRY_RE.findall(stdout) if not name.startswith('total')]
+    
+    def _ls(self, folder_name: str) -> Tuple[bool, List[str]]:
+        """
+        Run rmapi ls on a folder, reusing a listing made within the last ls_cache_ttl seconds
+        
+        Args:
+            folder_name: Name of the folder, or '' for the root
+            
+        Returns:
+            Tuple of (success, names in the folder)
+        """
+        with self._lock:
+            cached = self._ls_cache.get(folder_name)
+        if cached is not None and time.monotonic() - cached[0] < self._ls_ttl:
+            return True, cached[1]
+        
+        success, stdout, _ = self._run_rmapi_command(['ls', folder_name] if folder_name else ['ls'])
+        if not success:
+            return False, []
+        
+        names = self._parse_ls(stdout)
+        with self._lock:
+            self._ls_cache[folder_name] = (time.monotonic(), names)
+        return True, names
+    
+    def _invalidate_ls(self, folder_name: str):
+        """Drop the cached listing of a folder after changing its contents"""
+        with self._lock:
+            self._ls_cache.pop(folder_name, None)
+    
     def _ensure_rm_folder_exists(self, folder_name: str) -> bool:
         """
         Ensure a folder exists on reMarkable
@@ -121,13 +234,14 @@ class RemarkableSync:
             True if folder exists or was created successfully
         """
         # Check if folder already exists
-        success, stdout, _ = self._run_rmapi_command(['ls'])
-        if success and folder_name in stdout:
+        success, names = self._ls('')
+        if success and folder_name in names:
             return True
         
         # Create the folder
-        self.logger.info(f"Creating reMarkable folder: {folder_name}")
+        self.logger.info("Creating reMarkable folder: %s", folder_name)
         success, _, _ = self._run_rmapi_command(['mkdir', folder_name])
+        self._invalidate_ls('')
         return success
     
     def _list_rm_folder_contents(self, folder_name: str) -> List[str]:
@@ -140,21 +254,61 @@ class RemarkableSync:
         Returns:
             List of file/folder names in the folder
         """
-        success, stdout, _ = self._run_rmapi_command(['ls', folder_name])
-        if not success:
-            return []
+        _, names = self._ls(folder_name)
+        return names
+    
+    def _load_sync_state(self) -> Dict:
+        """Load the record of previous uploads, or start an empty one"""
+        try:
+            state = read_json(str(self._state_path))
+        except (OSError, ValueError):
+            state = {}
+        if not isinstance(state, dict) or not isinstance(state.get('uploaded', {}), dict):
+            state = {}
+        state.setdefault('uploaded', {})
+        return state
+    
+    def _save_sync_state(self):
+        """Write the record of uploads, replacing the old file in one rename"""
+        temp_path = f"{self._state_path}.tmp"
+        try:
+            write_json(temp_path, self._sync_state)
+            os.replace(temp_path, self._state_path)
+        except OSError as e:
+            self.logger.error("Failed to save sync state: %s", e)
+    
+    @staticmethod
+    def _file_sha1(file_path: str) -> str:
+        """SHA-1 of a file's contents, read in 1 MiB chunks"""
+        sha1 = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+    
+    def _already_uploaded(self, file_path: str, signature: List) -> bool:
+        """
+        Check a local file against its last successful upload
+        
+        Args:
+            file_path: Path to the local PDF
+            signature: [size, mtime] of the file; the SHA-1 is appended if it had to be computed
+            
+        Returns:
+            True if the file is unchanged since it was uploaded
+        """
+        previous = self._sync_state['uploaded'].get(Path(file_path).name)
+        if not previous or previous[0] != signature[0]:
+            return False
+        if previous[1] == signature[1]:
+            return True
         
-        # Parse the output - rmapi ls returns lines with file info
-        files = []
-        for line in stdout.split('\\n'):
-            if line.strip() and not line.startswith('total'):
-                # Extract filename from ls output (format may vary)
-                parts = line.strip().split()
-                if parts:
-                    filename = parts[-1]  # Last part is usually the filename
-                    files.append(filename)
-        
-        return files
+        # Same size but touched since: only the contents can tell
+        signature.append(self._file_sha1(file_path))
+        if previous[2] != signature[2]:
+            return False
+        previous[1] = signature[1]
+        return True
     
     def _get_local_pdf_files(self, folder_path: str) -> List[str]:
         """
@@ -166,16 +320,60 @@ class RemarkableSync:
         Returns:
             List of PDF file paths
         """
-        folder = Path(folder_path)
-        if not folder.exists():
+        try:
+            with os.scandir(folder_path) as entries:
+                return [
+                    entry.path for entry in entries
+                    if entry.name.endswith('.pdf') and entry.is_file()
+                ]
+        except FileNotFoundError:
             return []
+    
+    def _upload_one(self, file_path: str) -> Tuple[str, bool, str]:
+        """
+        Upload one PDF to the reMarkable to-read folder
         
-        return [str(f) for f in folder.glob('*.pdf')]
+        Args:
+            file_path: Path to the local PDF
+            
+        Returns:
+            Tuple of (filename, success, stderr)
+        """
+        filename = Path(file_path).name
+        self.logger.info("Uploading: %s", filename)
+        
+        success, _, stderr = self._run_rmapi_command([
+            'put', file_path, self.rm_to_read_folder
+        ])
+        
+        if success:
+            self._invalidate_ls(self.rm_to_read_folder)
+            self.logger.info("Successfully uploaded: %s", filename)
+            
+            # Optionally delete local file after upload
+            if self.delete_after_upload:
+                try:
+                    os.remove(file_path)
+                    self.logger.info("Deleted local file: %s", filename)
+                except Exception as e:
+                    self.logger.error("Failed to delete local file %s: %s", filename, e)
+        
+        return filename, success, stderr
     
-    def upload_to_read_files(self) -> int:
+    def _transfer_pool(self, executor: Optional[Executor]):
+        """Context for running transfers on executor, or on a pool of max_workers of its own"""
+        if executor is not None:
+            return nullcontext(executor)
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+    
+    def upload_to_read_files(self, executor: Optional[Executor] = None) -> int:
         """
         Upload PDF files from local to-read folder to reMarkable to-read folder
         
+        Args:
+            executor: Pool to run the uploads on, shared with downloads during a
+                full sync; defaults to a pool of max_workers
+        
         Returns:
             Number of successfully uploaded files
         """
@@ -198,49 +396,105 @@ class RemarkableSync:
             return 0
         
         # Get existing files on reMarkable
-        rm_files = self._list_rm_folder_contents(self.rm_to_read_folder)
-        
-        uploaded_count = 0
+        rm_files = set(self._list_rm_folder_contents(self.rm_to_read_folder))
         
+        to_upload = []
+        signatures = {}
         for file_path in local_files:
             filename = Path(file_path).name
             
             # Skip if file already exists on reMarkable
             if filename in rm_files:
-                self.logger.info(f"File already exists on reMarkable: {filename}")
+                self.logger.info("File already exists on reMarkable: %s", filename)
+                continue
+            
+            # Skip if this exact file was uploaded before (and since moved on the tablet)
+            stat = os.stat(file_path)
+            signature = [stat.st_size, int(stat.st_mtime)]
+            if self._already_uploaded(file_path, signature):
+                self.logger.info("File already uploaded: %s", filename)
                 continue
             
-            self.logger.info(f"Uploading: {filename}")
+            # Hash before uploading, since delete_after_upload may remove the file
+            if len(signature) == 2:
+                signature.append(self._file_sha1(file_path))
+            signatures[filename] = signature
+            to_upload.append(file_path)
+        
+        # Uploads are bound by network round-trips, so run several rmapi processes at once
+        uploaded_count = 0
+        with self._transfer_pool(executor) as pool:
+            futures = [pool.submit(self._upload_one, file_path) for file_path in to_upload]
+            for future in as_completed(futures):
+                filename, success, stderr = future.result()
+                if success:
+                    uploaded_count += 1
+                    self._sync_state['uploaded'][filename] = signatures[filename]
+                else:
+                    self.logger.error("Failed to upload %s: %s", filename, stderr)
+        
+        self._save_sync_state()
+        self.logger.info("Upload complete. Uploaded %s files.", uploaded_count)
+        return uploaded_count
+    
+    def _download_one(self, filename: str) -> Tuple[str, bool, str]:
+        """
+        Download one PDF from the reMarkable read folder to the local read folder
+        
+        Args:
+            filename: Name of the PDF on reMarkable
             
-            # Upload the file
+        Returns:
+            Tuple of (filename, success, stderr); stderr is empty if the
+            error was already logged
+        """
+        self.logger.info("Downloading: %s", filename)
+        
+        # Download next to the destination so moving it into place is a rename
+        final_path = Path(self.read_folder) / filename
+        temp_path = f"{final_path}.part"
+        
+        try:
+            # Download the file
             success, _, stderr = self._run_rmapi_command([
-                'put', file_path, self.rm_to_read_folder
+                'get', f"{self.rm_read_folder}/{filename}", temp_path
             ])
             
             if success:
-                self.logger.info(f"Successfully uploaded: {filename}")
-                uploaded_count += 1
+                # Move to final destination
+                os.replace(temp_path, final_path)
                 
-                # Optionally delete local file after upload
-                if self.delete_after_upload:
-                    try:
-                        os.remove(file_path)
-                        self.logger.info(f"Deleted local file: {filename}")
-                    except Exception as e:
-                        self.logger.error(f"Failed to delete local file {filename}: {e}")
-            else:
-                self.logger.error(f"Failed to upload {filename}: {stderr}")
+                self.logger.info("Successfully downloaded: %s", filename)
+                
+                # Optionally delete from reMarkable after download
+                if self.delete_after_download:
+                    rm_success, _, _ = self._run_rmapi_command([
+                        'rm', f"{self.rm_read_folder}/{filename}"
+                    ])
+                    if rm_success:
+                        self._invalidate_ls(self.rm_read_folder)
+                        self.logger.info("Deleted from reMarkable: %s", filename)
+                    else:
+                        self.logger.error("Failed to delete from reMarkable: %s", filename)
             
-            # Rate limiting
-            time.sleep(1)
-        
-        self.logger.info(f"Upload complete. Uploaded {uploaded_count} files.")
-        return uploaded_count
+            return filename, success, stderr
+            
+        except Exception as e:
+            self.logger.error("Error processing %s: %s", filename, e)
+            return filename, False, ""
+        finally:
+            # Clean up temp file if it still exists
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
     
-    def download_read_files(self) -> int:
+    def download_read_files(self, executor: Optional[Executor] = None) -> int:
         """
         Download annotated PDF files from reMarkable read folder to local read folder
         
+        Args:
+            executor: Pool to run the downloads on, shared with uploads during a
+                full sync; defaults to a pool of max_workers
+        
         Returns:
             Number of successfully downloaded files
         """
@@ -258,62 +512,31 @@ class RemarkableSync:
             return 0
         
         # Get existing local files
-        local_files = [Path(f).name for f in self._get_local_pdf_files(self.read_folder)]
-        
-        downloaded_count = 0
+        local_files = {Path(f).name for f in self._get_local_pdf_files(self.read_folder)}
         
+        to_download = []
         for filename in rm_files:
             # Skip if not a PDF or already exists locally
             if not filename.endswith('.pdf'):
                 continue
             
             if filename in local_files:
-                self.logger.info(f"File already exists locally: {filename}")
+                self.logger.info("File already exists locally: %s", filename)
                 continue
             
-            self.logger.info(f"Downloading: {filename}")
-            
-            # Create temporary file for download
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-                temp_path = temp_file.name
-            
-            try:
-                # Download the file
-                success, _, stderr = self._run_rmapi_command([
-                    'get', f"{self.rm_read_folder}/{filename}", temp_path
-                ])
-                
+            to_download.append(filename)
+        
+        downloaded_count = 0
+        with self._transfer_pool(executor) as pool:
+            futures = [pool.submit(self._download_one, filename) for filename in to_download]
+            for future in as_completed(futures):
+                filename, success, stderr = future.result()
                 if success:
-                    # Move to final destination
-                    final_path = Path(self.read_folder) / filename
-                    shutil.move(temp_path, final_path)
-                    
-                    self.logger.info(f"Successfully downloaded: {filename}")
                     downloaded_count += 1
-                    
-                    # Optionally delete from reMarkable after download
-                    if self.delete_after_download:
-                        rm_success, _, _ = self._run_rmapi_command([
-                            'rm', f"{self.rm_read_folder}/{filename}"
-                        ])
-                        if rm_success:
-                            self.logger.info(f"Deleted from reMarkable: {filename}")
-                        else:
-                            self.logger.error(f"Failed to delete from reMarkable: {filename}")
-                else:
-                    self.logger.error(f"Failed to download {filename}: {stderr}")
-                
-            except Exception as e:
-                self.logger.error(f"Error processing {filename}: {e}")
-            finally:
-                # Clean up temp file if it still exists
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-            
-            # Rate limiting
-            time.sleep(1)
+                elif stderr:
+                    self.logger.error("Failed to download %s: %s", filename, stderr)
         
-        self.logger.info(f"Download complete. Downloaded {downloaded_count} files.")
+        self.logger.info("Download complete. Downloaded %s files.", downloaded_count)
         return downloaded_count
     
     def full_sync(self) -> Tuple[int, int]:
@@ -325,22 +548,28 @@ class RemarkableSync:
         """
         self.logger.info("🚀 Starting full reMarkable sync...")
         
-        uploaded = self.upload_to_read_files()
-        downloaded = self.download_read_files()
+        # The two directions touch different reMarkable folders, so run them side by side,
+        # sharing one transfer pool so at most max_workers files move at once
+        with ThreadPoolExecutor(max_workers=self.max_workers) as transfers, \
+                ThreadPoolExecutor(max_workers=2) as directions:
+            uploads = directions.submit(self.upload_to_read_files, transfers)
+            downloads = directions.submit(self.download_read_files, transfers)
+            uploaded, downloaded = uploads.result(), downloads.result()
         
-        self.logger.info(f"✅ Full sync complete! Uploaded: {uploaded}, Downloaded: {downloaded}")
+        self.logger.info("✅ Full sync complete! Uploaded: %s, Downloaded: %s", uploaded, downloaded)
         return uploaded, downloaded
 
 
 def main():
     """CLI interface for Remarkable sync"""
+    logging.basicConfig(level=logging.INFO)
+    
     print("📱 reMarkable Synchronization")
     print("=" * 30)
     
     # Load configuration
     try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
+        config = read_config('config.json')
     except Exception as e:
         print(f"❌ Failed to load config: {e}")
         return
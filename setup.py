@@ -9,6 +9,7 @@ and initial configuration.
 """
 
 
+import os
 import sys
 import json
 import subprocess
@@ -133,8 +134,18 @@ def create_sample_config():
     else:
         config_file = "config.json"
     
-    with open(config_file, 'w') as f:
-        json.dump(sample_config, f, indent=2)
+    # Leave an identical file alone so its mtime (and any cached parse) stays valid
+    contents = json.dumps(sample_config, indent=2)
+    config_path = Path(config_file)
+    if config_path.exists() and config_path.read_text() == contents:
+        print(f"✅ Configuration unchanged: {config_file}")
+        return config_file
+    
+    # Write to a temporary file and rename it, so an interrupted run never leaves a partial config
+    temp_file = f"{config_file}.tmp"
+    with open(temp_file, 'w') as f:
+        f.write(contents)
+    os.replace(temp_file, config_file)
     
     print(f"✅ Configuration created: {config_file}")
     return config_file
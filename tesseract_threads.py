@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tesseract Thread Limit
+======================
+
+Scopes OMP_THREAD_LIMIT to a block of Tesseract runs. pytesseract starts each
+tesseract subprocess with the current environment, so the limit is set for the
+block and the previous value restored afterwards, leaving later serial runs
+free to use OpenMP.
+
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+@contextmanager
+def omp_thread_limit(threads: Optional[int] = None, parallel: bool = False):
+    """
+    Limit the OpenMP threads of the Tesseract processes started inside the block
+
+    Args:
+        threads: tesseract.omp_threads from the config, which always applies
+        parallel: Whether several Tesseract processes run side by side; they get
+            one thread each unless threads or the environment says otherwise,
+            since more would oversubscribe the cores
+    """
+    previous = os.environ.get('OMP_THREAD_LIMIT')
+
+    if threads is not None:
+        limit = str(threads)
+    elif parallel and previous is None:
+        limit = '1'
+    else:
+        limit = None
+
+    if limit is None:
+        yield
+        return
+
+    os.environ['OMP_THREAD_LIMIT'] = limit
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop('OMP_THREAD_LIMIT', None)
+        else:
+            os.environ['OMP_THREAD_LIMIT'] = previous
@@ -1,13 +1,14 @@
 import json
 import os
 
+from config_loader import read_config
+
 CONFIG_PATH = "config.json"
 
 def load_config(path):
     """Load and validate the JSON config file"""
     try:
-        with open(path, "r") as f:
-            config = json.load(f)
+        config = read_config(path)
         print(f"✓ Successfully loaded config from {path}")
         return config
     except FileNotFoundError:
@@ -17,6 +18,27 @@ def load_config(path):
         print(f"✗ Invalid JSON in config file: {e}")
         return None
 
+def existing_paths(paths):
+    """Return the subset of paths that exist, listing each parent directory once"""
+    by_parent = {}
+    for path in paths:
+        parent, name = os.path.split(os.path.normpath(path))
+        by_parent.setdefault(parent, []).append((path, name))
+    
+    found = set()
+    for parent, children in by_parent.items():
+        try:
+            with os.scandir(parent or ".") as entries:
+                names = {entry.name for entry in entries}
+        except OSError:
+            # Unreadable or missing parent: check the paths one by one
+            found.update(path for path, _ in children if os.path.exists(path))
+            continue
+        # scandir never lists '.' or '..', and a root path has no name to look up
+        found.update(path for path, name in children
+                     if name in names or (name in ("", ".", "..") and os.path.exists(path)))
+    return found
+
 def validate_config(config):
     """Validate the config structure and required fields"""
     if config is None:
@@ -35,8 +57,9 @@ def validate_config(config):
     
     # Check folders exist or can be created
     folders = config.get("folders", {})
+    existing = existing_paths(folders.values())
     for folder_type, path in folders.items():
-        if os.path.exists(path):
+        if path in existing:
             print(f"✓ Folder exists: {folder_type} -> {path}")
         else:
             print(f"⚠ Folder doesn't exist (will be created): {folder_type} -> {path}")
@@ -10,6 +10,7 @@ Test suite for the better-research workflow components.
 import os
 import json
 import tempfile
+import subprocess
 import unittest
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
@@ -67,6 +68,164 @@ class TestZoteroSync(unittest.TestCase):
         
         self.assertEqual(len(items), 2)
         mock_client.items.assert_called_once_with(tag='test_sync')
+    
+    def _download_sync(self, temp_dir):
+        """ZoteroSync downloading into temp_dir, with the pyzotero client mocked out"""
+        from zotero_sync import ZoteroSync
+        
+        config = dict(self.test_config, folders={'to_read': os.path.join(temp_dir, 'to-read')})
+        # Download threads build their own clients, so the mock stays in place for the test
+        patcher = patch('zotero_sync.zotero.Zotero')
+        mock_zotero = patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_zotero.return_value.backoff_until = 0.0
+        
+        sync = ZoteroSync(config)
+        sync._session = Mock(return_value=Mock())
+        return sync
+    
+    @staticmethod
+    def _response(status_code, body=b'', headers=None, error=None):
+        """Streamed file response; error is raised after body has been sent"""
+        import requests
+        
+        response = MagicMock(status_code=status_code, headers=headers or {})
+        response.__enter__.return_value = response
+        
+        def iter_content(chunk_size):
+            yield body
+            if error is not None:
+                raise error
+        
+        response.iter_content.side_effect = iter_content
+        if status_code >= 400:
+            response.raise_for_status.side_effect = requests.HTTPError(str(status_code))
+        return response
+    
+    @patch('zotero_sync.time.sleep')
+    def test_download_rate_limit(self, mock_sleep):
+        """Test that a 429 is waited out whether Retry-After is a date, absent or unreadable"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sync = self._download_sync(temp_dir)
+            part_path = Path(temp_dir) / 'paper.pdf.part'
+            
+            sync._session.return_value.get.side_effect = [
+                self._response(429, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}),
+                self._response(429, headers={'Retry-After': 'soon'}),
+                self._response(200, b'%PDF whole')
+            ]
+            sync._stream_file('ATT1', part_path)
+            
+            self.assertEqual(part_path.read_bytes(), b'%PDF whole')
+            # The past date gives no wait, the unreadable header the minimal backoff
+            self.assertEqual(mock_sleep.call_count, 1)
+    
+    def test_download_resumes_after_dropped_stream(self):
+        """Test that a dropped download is resumed with a Range request"""
+        import hashlib
+        import requests
+        
+        content = b'%PDF first half, second half'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sync = self._download_sync(temp_dir)
+            part_path = Path(temp_dir) / 'paper.pdf.part'
+            get = sync._session.return_value.get
+            
+            get.side_effect = [
+                self._response(200, content[:16], error=requests.exceptions.ChunkedEncodingError('dropped')),
+                self._response(206, content[16:])
+            ]
+            sync._stream_file('ATT1', part_path, hashlib.md5(content).hexdigest())
+            
+            self.assertEqual(part_path.read_bytes(), content)
+            self.assertEqual(get.call_args_list[0].kwargs['headers'], {})
+            self.assertEqual(get.call_args_list[1].kwargs['headers'], {'Range': 'bytes=16-'})
+    
+    def test_download_replaces_stale_part_file(self):
+        """Test that a part file failing the MD5 check, or rejected with 416, is fetched again whole"""
+        import hashlib
+        
+        content = b'%PDF current version'
+        md5 = hashlib.md5(content).hexdigest()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sync = self._download_sync(temp_dir)
+            part_path = Path(temp_dir) / 'paper.pdf.part'
+            get = sync._session.return_value.get
+            
+            # Resuming onto an old version of the file gives the wrong checksum
+            part_path.write_bytes(b'%PDF old')
+            get.side_effect = [self._response(206, content[8:]), self._response(200, content)]
+            sync._stream_file('ATT1', part_path, md5)
+            self.assertEqual(part_path.read_bytes(), content)
+            self.assertEqual(get.call_args_list[1].kwargs['headers'], {})
+            
+            # A part file longer than the current file is refused outright
+            part_path.write_bytes(b'x' * 100)
+            get.reset_mock()
+            get.side_effect = [self._response(416), self._response(200, content)]
+            sync._stream_file('ATT1', part_path, md5)
+            self.assertEqual(part_path.read_bytes(), content)
+            self.assertEqual(get.call_args_list[0].kwargs['headers'], {'Range': 'bytes=100-'})
+            self.assertEqual(get.call_args_list[1].kwargs['headers'], {})
+    
+    def _tagged_sync(self, temp_dir, version=7, failed_downloads=()):
+        """ZoteroSync with two tagged items of one PDF each, at library version"""
+        sync = self._download_sync(temp_dir)
+        sync.zot.last_modified_version.return_value = version
+        sync.zot.items.return_value = [
+            {'key': key, 'data': {'title': key, 'tags': [{'tag': 'test_sync'}]}, 'meta': {'numChildren': 1}}
+            for key in ('ITEM1', 'ITEM2')
+        ]
+        sync.zot.children.side_effect = lambda key: [
+            {'key': f'ATT-{key}', 'data': {'contentType': 'application/pdf'}}
+        ]
+        sync.zot.request.json.return_value = {'success': {}, 'failed': {}}
+        sync.download_attachment = Mock(side_effect=lambda attachment, title: (
+            None if title in failed_downloads else os.path.join(temp_dir, f'{title}.pdf')
+        ))
+        return sync
+    
+    def test_sync_keeps_failed_downloads_tagged(self):
+        """Test that an item whose PDF failed to download keeps its sync tag"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sync = self._tagged_sync(temp_dir, failed_downloads=('ITEM2',))
+            
+            self.assertEqual(sync.sync_to_read_items(), 1)
+            
+            retagged = sync.zot.update_items.call_args.args[0]
+            self.assertEqual([item['key'] for item in retagged], ['ITEM1'])
+            self.assertEqual(retagged[0]['data']['tags'], [{'tag': 'test_processed'}])
+            self.assertIsNone(sync._synced_library_version())
+    
+    def test_sync_partial_tag_failure(self):
+        """Test that items refused in a 200 tag update keep the library version unsaved"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sync = self._tagged_sync(temp_dir)
+            sync.zot.request.json.return_value = {
+                'success': {'0': 'ITEM1'},
+                'failed': {'1': {'code': 412, 'message': 'Item has been modified since specified version'}}
+            }
+            
+            self.assertFalse(sync.update_items_tags(sync.zot.items.return_value, remove_tag='test_sync'))
+            self.assertEqual(sync.sync_to_read_items(), 2)
+            self.assertIsNone(sync._synced_library_version())
+    
+    def test_sync_skips_unchanged_library(self):
+        """Test that a library still at the version of the last clean sync is not queried"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sync = self._tagged_sync(temp_dir)
+            
+            self.assertEqual(sync.sync_to_read_items(), 2)
+            self.assertEqual(sync._synced_library_version(), 7)
+            
+            sync.zot.items.reset_mock()
+            self.assertEqual(sync.sync_to_read_items(), 0)
+            sync.zot.items.assert_not_called()
+            
+            # A newer version is queried again
+            sync.zot.last_modified_version.return_value = 8
+            sync.sync_to_read_items()
+            sync.zot.items.assert_called_once()
 
 
 class TestRemarkableSync(unittest.TestCase):
@@ -119,14 +278,118 @@ class TestRemarkableSync(unittest.TestCase):
         
         self.assertTrue(success)
         self.assertEqual(stdout, "test output")
+    
+    @patch('remarkable_sync.time.sleep')
+    @patch('remarkable_sync.subprocess.run')
+    def test_rate_limit_retry(self, mock_run, mock_sleep):
+        """Test that only throttling errors are retried, not names containing 429"""
+        from remarkable_sync import RemarkableSync
+        
+        mock_run.return_value.returncode = 0
+        sync = RemarkableSync(self.test_config)
+        
+        throttled = Mock(returncode=1, stdout="", stderr="request failed with status 429")
+        done = Mock(returncode=0, stdout="", stderr="")
+        mock_run.reset_mock(return_value=True)
+        mock_run.side_effect = [throttled, done]
+        success, _, _ = sync._run_rmapi_command(['get', 'read/paper.pdf', 'paper.pdf'])
+        self.assertTrue(success)
+        self.assertEqual(mock_run.call_count, 2)
+        
+        missing = Mock(returncode=1, stdout="", stderr="file not found: read/paper_429.pdf")
+        mock_run.reset_mock(side_effect=True)
+        mock_run.return_value = missing
+        success, _, _ = sync._run_rmapi_command(['get', 'read/paper_429.pdf', 'paper_429.pdf'])
+        self.assertFalse(success)
+        self.assertEqual(mock_run.call_count, 1)
+    
+    @patch('remarkable_sync.subprocess.run')
+    def test_folder_listing(self, mock_run):
+        """Test parsing rmapi ls output into folder entries"""
+        from remarkable_sync import RemarkableSync
+        
+        mock_run.return_value.returncode = 0
+        mock_run.return_value.stdout = "[d]\tto-read\n[f]\tNotes on papers.pdf"
+        mock_run.return_value.stderr = ""
+        
+        sync = RemarkableSync(self.test_config)
+        self.assertEqual(sync._list_rm_folder_contents(''), ['to-read', 'Notes on papers.pdf'])
+        
+        # 'read' only appears inside 'to-read', so the folder has to be created
+        sync._ensure_rm_folder_exists('read')
+        mock_run.assert_called_with(['rmapi', 'mkdir', 'read'], stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, text=True, timeout=60)
+    
+    def _upload_sync(self, temp_dir):
+        """RemarkableSync on folders inside temp_dir, with rmapi mocked out"""
+        from remarkable_sync import RemarkableSync
+        
+        config = {
+            'remarkable': {'to_read_folder': 'to-read', 'read_folder': 'read'},
+            'folders': {'to_read': os.path.join(temp_dir, 'to-read'), 'input': os.path.join(temp_dir, 'read')}
+        }
+        with patch('remarkable_sync.subprocess.run') as mock_run:
+            mock_run.return_value.returncode = 0
+            sync = RemarkableSync(config)
+        
+        sync._ensure_rm_folder_exists = Mock(return_value=True)
+        sync._list_rm_folder_contents = Mock(return_value=[])
+        sync._run_rmapi_command = Mock(return_value=(True, '', ''))
+        return sync
+    
+    def test_upload_skips_unchanged_files(self):
+        """Test that uploaded files are only uploaded again once their contents change"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sync = self._upload_sync(temp_dir)
+            pdf = os.path.join(temp_dir, 'to-read', 'paper.pdf')
+            with open(pdf, 'wb') as f:
+                f.write(b'%PDF first')
+            
+            self.assertEqual(sync.upload_to_read_files(), 1)
+            
+            # Unchanged, or only touched: the recorded size, mtime and SHA-1 match
+            self.assertEqual(sync.upload_to_read_files(), 0)
+            os.utime(pdf, (1000000000, 1000000000))
+            self.assertEqual(sync.upload_to_read_files(), 0)
+            
+            # Same size but new contents, then a new size: uploaded again each time
+            with open(pdf, 'wb') as f:
+                f.write(b'%PDF other')
+            os.utime(pdf, (1100000000, 1100000000))
+            self.assertEqual(sync.upload_to_read_files(), 1)
+            with open(pdf, 'wb') as f:
+                f.write(b'%PDF longer contents')
+            self.assertEqual(sync.upload_to_read_files(), 1)
+            
+            # The record survives into the next sync
+            self.assertEqual(self._upload_sync(temp_dir).upload_to_read_files(), 0)
+            self.assertEqual(sync._run_rmapi_command.call_count, 3)
+    
+    def test_corrupt_upload_state(self):
+        """Test that an unreadable state file is treated as no earlier uploads"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, '.rm_sync_state.json'), 'w') as f:
+                f.write('{"uploaded": {"paper.pdf": [1')
+            
+            sync = self._upload_sync(temp_dir)
+            self.assertEqual(sync._sync_state, {'uploaded': {}})
+            
+            with open(os.path.join(temp_dir, '.rm_sync_state.json'), 'w') as f:
+                f.write('["paper.pdf"]')
+            self.assertEqual(self._upload_sync(temp_dir)._sync_state, {'uploaded': {}})
+            
+            with open(os.path.join(temp_dir, 'to-read', 'paper.pdf'), 'wb') as f:
+                f.write(b'%PDF')
+            self.assertEqual(sync.upload_to_read_files(), 1)
 
 
 class TestWorkflowOrchestrator(unittest.TestCase):
     """Test workflow orchestration"""
     
-    def setUp(self):
-        """Set up test configuration"""
-        self.test_config = {
+    @classmethod
+    def setUpClass(cls):
+        """Write the test configuration once for all tests"""
+        cls.test_config = {
             'folders': {
                 'to_read': 'test-to-read',
                 'input': 'test-read',
@@ -143,20 +406,21 @@ class TestWorkflowOrchestrator(unittest.TestCase):
                 'level': 'INFO'
             }
         }
+        
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            json.dump(cls.test_config, f)
+            cls.config_file = f.name
+    
+    @classmethod
+    def tearDownClass(cls):
+        os.unlink(cls.config_file)
     
     def test_config_loading(self):
         """Test configuration loading"""
         from workflow_orchestrator import WorkflowOrchestrator
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(self.test_config, f)
-            config_file = f.name
-        
-        try:
-            orchestrator = WorkflowOrchestrator(config_file)
-            self.assertEqual(orchestrator.config['folders']['to_read'], 'test-to-read')
-        finally:
-            os.unlink(config_file)
+        orchestrator = WorkflowOrchestrator(self.config_file)
+        self.assertEqual(orchestrator.config['folders']['to_read'], 'test-to-read')
     
     @patch('workflow_orchestrator.ZoteroSync')
     @patch('workflow_orchestrator.RemarkableSync')
@@ -164,28 +428,20 @@ class TestWorkflowOrchestrator(unittest.TestCase):
         """Test initialization of sync components"""
         from workflow_orchestrator import WorkflowOrchestrator
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(self.test_config, f)
-            config_file = f.name
+        orchestrator = WorkflowOrchestrator(self.config_file)
         
-        try:
-            orchestrator = WorkflowOrchestrator(config_file)
-            
-            # Should initialize both components
-            mock_zot_sync.assert_called_once()
-            mock_rm_sync.assert_called_once()
-        finally:
-            os.unlink(config_file)
+        # Should initialize both components
+        mock_zot_sync.assert_called_once()
+        mock_rm_sync.assert_called_once()
 
 
 class TestBatchProcessor(unittest.TestCase):
     """Test batch processing functionality"""
     
-    def test_config_loading(self):
-        """Test configuration loading in batch processor"""
-        from batch_processor import load_config
-        
-        test_config = {
+    @classmethod
+    def setUpClass(cls):
+        """Write the test configuration once for all tests"""
+        cls.test_config = {
             'ocr_engine': 'tesseract',
             'folders': {
                 'input': 'test-read'
@@ -193,39 +449,268 @@ class TestBatchProcessor(unittest.TestCase):
         }
         
         with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(test_config, f)
-            config_file = f.name
+            json.dump(cls.test_config, f)
+            cls.config_file = f.name
+    
+    @classmethod
+    def tearDownClass(cls):
+        os.unlink(cls.config_file)
+    
+    def test_config_loading(self):
+        """Test configuration loading in batch processor"""
+        from batch_processor import load_config
         
-        try:
-            config = load_config(config_file)
-            self.assertEqual(config['ocr_engine'], 'tesseract')
-        finally:
-            os.unlink(config_file)
+        config = load_config(self.config_file)
+        self.assertEqual(config['ocr_engine'], 'tesseract')
     
     def test_pdf_file_finding(self):
         """Test finding PDF files in directory"""
-        from batch_processor import find_pdf_files
+        import batch_processor
+        
+        def entry(name, is_file=True):
+            dir_entry = Mock(path=os.path.join('/papers', name), is_file=Mock(return_value=is_file))
+            dir_entry.name = name
+            return dir_entry
+        
+        # A directory listing needs no real files; a folder named like a PDF must be skipped
+        entries = [entry('test2.pdf'), entry('test.txt'), entry('old.pdf', is_file=False), entry('test1.pdf')]
+        
+        with patch.object(batch_processor.os, 'scandir') as mock_scandir:
+            mock_scandir.return_value.__enter__.return_value = entries
+            pdf_files = batch_processor.find_pdf_files('/papers')
+        
+        mock_scandir.assert_called_once_with('/papers')
+        self.assertEqual(pdf_files, [os.path.join('/papers', 'test1.pdf'), os.path.join('/papers', 'test2.pdf')])
+
+
+class TestExtraction(unittest.TestCase):
+    """Test highlight extraction helpers"""
+    
+    def test_merge_nearby_rectangles(self):
+        """Test that nearby rectangles are grouped transitively"""
+        from extracting_highlights_images import merge_nearby_rectangles
+        
+        rectangles = [
+            (0, 0, 10, 10),      # chained to the next two
+            (300, 300, 10, 10),  # isolated
+            (15, 0, 10, 10),
+            (30, 5, 10, 10)
+        ]
+        
+        merged = merge_nearby_rectangles(rectangles, horizontal_threshold=10, vertical_threshold=10)
+        
+        self.assertEqual(merged, [(0, 0, 40, 15), (300, 300, 10, 10)])
+        self.assertEqual(merge_nearby_rectangles([]), [])
+    
+    def test_color_masks_match_opencv(self):
+        """Test that the color masks match cv2.cvtColor + cv2.inRange"""
+        import cv2
+        import numpy as np
+        import color_kernels
+        
+        img = np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        expected_yellow = cv2.inRange(hsv, color_kernels.YELLOW_LOWER, color_kernels.YELLOW_UPPER)
+        expected_red = cv2.inRange(hsv, color_kernels.RED_LOWER1, color_kernels.RED_UPPER1) | \
+            cv2.inRange(hsv, color_kernels.RED_LOWER2, color_kernels.RED_UPPER2)
+        
+        yellow_mask, red_mask = color_kernels.color_masks(img)
+        
+        np.testing.assert_array_equal(yellow_mask, expected_yellow)
+        np.testing.assert_array_equal(red_mask, expected_red)
+        self.assertEqual(color_kernels.color_masks(img, False, False), (None, None))
+    
+    def test_extraction_summary_formats(self):
+        """Test that summaries round-trip as columns and legacy per-item lists still load"""
+        from extraction_results import ExtractedItems, save_extraction_summary, load_extraction_summary
+        
+        items = ExtractedItems()
+        items.add(2, 'red_mark_group', 'page_2_red_mark_group_1.png', (5, 6, 7, 8), 3)
+        items.add(1, 'Highlight', 'page_1_Highlight_1.png', (1, 2, 3, 4))
+        items = items.sorted_by_page()
+        
+        self.assertEqual(items.pages, [1, 2])
+        self.assertEqual(items.coordinates.tolist(), [[1, 2, 3, 4], [5, 6, 7, 8]])
+        self.assertNotIn('individual_regions', items[0])
+        self.assertEqual(items[1]['coordinates'], {'x1': 5, 'y1': 6, 'x2': 7, 'y2': 8})
+        self.assertEqual(items.type_mask('red').tolist(), [False, True])
+        self.assertEqual(items.region_counts.tolist(), [1, 3])
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            columnar_file = os.path.join(temp_dir, 'columnar.json')
+            save_extraction_summary(columnar_file, items)
+            self.assertEqual(list(load_extraction_summary(columnar_file)), list(items))
+            
+            legacy_file = os.path.join(temp_dir, 'legacy.json')
+            with open(legacy_file, 'w') as f:
+                json.dump(list(items), f)
+            self.assertEqual(list(load_extraction_summary(legacy_file)), list(items))
+
+
+class TestUnifiedOCR(unittest.TestCase):
+    """Test OCR result handling"""
+    
+    @patch('unified_ocr_processor.pytesseract', create=True)
+    def test_tesseract_batch_splits_by_page(self, mock_tesseract):
+        """Test that one batched Tesseract run is split back into per-image results"""
+        import unified_ocr_processor
+        
+        columns = ['level', 'page_num', 'block_num', 'par_num', 'line_num', 'conf', 'text']
+        rows = [
+            (1, 1, 0, 0, 0, -1, ''),
+            (5, 1, 1, 1, 1, 90, 'first'),
+            (5, 1, 1, 1, 2, 80, 'image'),
+            (1, 2, 0, 0, 0, -1, ''),
+            (5, 2, 1, 1, 1, 95, 'second')
+        ]
+        mock_tesseract.image_to_data.return_value = {c: [row[i] for row in rows] for i, c in enumerate(columns)}
+        
+        with patch.object(unified_ocr_processor, 'TESSERACT_AVAILABLE', True):
+            results = unified_ocr_processor.extract_text_with_tesseract_batch(['a.png', 'b.png', 'c.png'], 'eng')
+        
+        mock_tesseract.image_to_data.assert_called_once()
+        self.assertEqual([r['text'] for r in results], ['first\nimage', 'second', ''])
+        self.assertAlmostEqual(results[0]['confidence'], 0.85)
+        self.assertEqual([r['success'] for r in results], [True, True, False])
+    
+    @patch('unified_ocr_processor.pytesseract', create=True)
+    def test_tesseract_batch_falls_back_per_image(self, mock_tesseract):
+        """Test that a failed batched Tesseract run only fails the images that can't be read"""
+        import unified_ocr_processor
+        from PIL import Image
+        
+        columns = ['level', 'page_num', 'block_num', 'par_num', 'line_num', 'conf', 'text']
+        word = {c: [v] for c, v in zip(columns, (5, 1, 1, 1, 1, 90, 'ok'))}
+        
+        def image_to_data(image, **kwargs):
+            if isinstance(image, str):
+                raise RuntimeError('Tesseract could not read an image in the list')
+            return word
+        mock_tesseract.image_to_data.side_effect = image_to_data
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = [os.path.join(temp_dir, name) for name in ('a.png', 'missing.png', 'b.png')]
+            for path in (paths[0], paths[2]):
+                Image.new('L', (20, 10), 255).save(path)
+            
+            with patch.object(unified_ocr_processor, 'TESSERACT_AVAILABLE', True):
+                results = unified_ocr_processor.extract_text_with_tesseract_batch(paths, 'eng')
+        
+        self.assertEqual([r['text'] for r in results], ['ok', '', 'ok'])
+        self.assertEqual([r['success'] for r in results], [True, False, True])
+    
+    def test_omp_thread_limit_is_restored(self):
+        """Test that the Tesseract thread limit only applies inside the block"""
+        from tesseract_threads import omp_thread_limit
+        
+        with patch.dict(os.environ, clear=False):
+            os.environ.pop('OMP_THREAD_LIMIT', None)
+            
+            with omp_thread_limit(parallel=True):
+                self.assertEqual(os.environ['OMP_THREAD_LIMIT'], '1')
+            self.assertNotIn('OMP_THREAD_LIMIT', os.environ)
+            
+            with omp_thread_limit():
+                self.assertNotIn('OMP_THREAD_LIMIT', os.environ)
+            
+            os.environ['OMP_THREAD_LIMIT'] = '3'
+            with omp_thread_limit(parallel=True):
+                self.assertEqual(os.environ['OMP_THREAD_LIMIT'], '3')
+            with omp_thread_limit(2, parallel=True):
+                self.assertEqual(os.environ['OMP_THREAD_LIMIT'], '2')
+            self.assertEqual(os.environ['OMP_THREAD_LIMIT'], '3')
+    
+    def test_near_duplicate_images(self):
+        """Test that only identical crops share a result by default, and similar-looking text stays apart"""
+        import cv2
+        import numpy as np
+        from image_dedup import find_near_duplicates, compute_phash
+        
+        def text_crop(text):
+            image = np.full((60, 200), 255, dtype=np.uint8)
+            cv2.putText(image, text, (5, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2)
+            return image
+        
+        rng = np.random.default_rng(0)
+        plus = text_crop('x = a + b')
+        noisy = np.clip(plus.astype(int) + rng.integers(-10, 10, plus.shape), 0, 255).astype(np.uint8)
+        crops = [plus, text_crop('x = a - b'), noisy, plus, text_crop('the model'), text_crop('the modal')]
         
         with tempfile.TemporaryDirectory() as temp_dir:
-            # Create test PDF files
-            pdf1 = Path(temp_dir) / "test1.pdf"
-            pdf2 = Path(temp_dir) / "test2.pdf"
-            txt_file = Path(temp_dir) / "test.txt"
+            paths = []
+            for i, img in enumerate(crops):
+                paths.append(os.path.join(temp_dir, f'{i}.png'))
+                cv2.imwrite(paths[-1], img)
+            paths.append(os.path.join(temp_dir, 'missing.png'))
             
-            pdf1.touch()
-            pdf2.touch()
-            txt_file.touch()
+            # The one-character differences are within the near-duplicate distance
+            hashes = [compute_phash(path) for path in paths[:6]]
+            self.assertLessEqual(bin(hashes[0] ^ hashes[1]).count('1'), 4)
+            self.assertLessEqual(bin(hashes[4] ^ hashes[5]).count('1'), 4)
             
-            pdf_files = find_pdf_files(temp_dir)
+            self.assertEqual(find_near_duplicates(paths), [0, 1, 2, 0, 4, 5, 6])
+            self.assertEqual(find_near_duplicates(paths, 4), [0, 1, 0, 0, 4, 5, 6])
+            self.assertEqual(find_near_duplicates(paths, -1), [0, 1, 2, 3, 4, 5, 6])
+    
+    def test_ocr_cache_round_trip(self):
+        """Test that OCR results are cached per image content and engine, and failures are not"""
+        from ocr_cache import OCRCache
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, 'cache', 'ocr_cache.db')
+            image_path = os.path.join(temp_dir, 'a.png')
+            copy_path = os.path.join(temp_dir, 'b.png')
+            failed_path = os.path.join(temp_dir, 'c.png')
+            for path, data in [(image_path, b'image'), (copy_path, b'image'), (failed_path, b'other')]:
+                with open(path, 'wb') as f:
+                    f.write(data)
             
-            self.assertEqual(len(pdf_files), 2)
-            self.assertTrue(any("test1.pdf" in f for f in pdf_files))
-            self.assertTrue(any("test2.pdf" in f for f in pdf_files))
+            with OCRCache(db_path, 'tesseract:eng') as cache:
+                cache.put(image_path, {'text': 'hello', 'confidence': 0.9, 'success': True})
+                cache.put(failed_path, {'text': '', 'confidence': 0, 'success': False, 'error': 'failed'})
+            
+            with OCRCache(db_path, 'tesseract:eng') as cache:
+                self.assertEqual(cache.get(copy_path),
+                                 {'text': 'hello', 'confidence': 0.9, 'success': True, 'error': None})
+                self.assertIsNone(cache.get(failed_path))
+            
+            with OCRCache(db_path, 'mathpix') as cache:
+                self.assertIsNone(cache.get(image_path))
+            
+            self.assertIsNone(OCRCache(None, 'mathpix').get(image_path))
+    
+    def test_ocr_statistics(self):
+        """Test that statistics only count confidences of successful extractions"""
+        from ocr_stats import compute_ocr_statistics
+        
+        results = [
+            {'success': True, 'confidence': 0.9},
+            {'success': False, 'confidence': 0},
+            {'success': True, 'confidence': 0.5},
+            {'success': True, 'confidence': 0.7}
+        ]
+        stats = compute_ocr_statistics(results)
+        
+        self.assertEqual(stats['total_images'], 4)
+        self.assertEqual(stats['successful_extractions'], 3)
+        self.assertAlmostEqual(stats['success_rate'], 75.0)
+        self.assertAlmostEqual(stats['avg_confidence'], 0.7)
+        self.assertAlmostEqual(stats['median_confidence'], 0.7)
+        self.assertAlmostEqual(stats['p5_confidence'], 0.52)
+        self.assertEqual(compute_ocr_statistics([])['avg_confidence'], 0)
 
 
 class TestIntegration(unittest.TestCase):
     """Integration tests for the complete workflow"""
     
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+    
     def test_folder_structure_creation(self):
         """Test that all necessary folders are created"""
         from batch_processor import ensure_directories
@@ -241,49 +726,33 @@ class TestIntegration(unittest.TestCase):
             }
         }
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Change to temp directory
-            old_cwd = os.getcwd()
-            os.chdir(temp_dir)
-            
-            try:
-                ensure_directories(test_config)
-                
-                # Check that all folders exist
-                self.assertTrue(Path('test-to-read').exists())
-                self.assertTrue(Path('test-read').exists())
-                self.assertTrue(Path('test-output').exists())
-                self.assertTrue(Path('test-output/images').exists())
-                self.assertTrue(Path('test-output/markdown').exists())
-                self.assertTrue(Path('test-output/html').exists())
-            finally:
-                os.chdir(old_cwd)
+        base = Path(self.temp_dir.name)
+        ensure_directories(test_config, self.temp_dir.name)
+        
+        # Check that all folders exist
+        self.assertTrue((base / 'test-to-read').exists())
+        self.assertTrue((base / 'test-read').exists())
+        self.assertTrue((base / 'test-output').exists())
+        self.assertTrue((base / 'test-output/images').exists())
+        self.assertTrue((base / 'test-output/markdown').exists())
+        self.assertTrue((base / 'test-output/html').exists())
 
 
-def run_tests():
-    """Run all tests"""
+def run_tests(verbosity: int = 1):
+    """
+    Run all tests
+    
+    Args:
+        verbosity: unittest verbosity; 1 prints a dot per test, 2 a line per test
+    """
     print("🧪 Running better-research Test Suite")
     print("=" * 40)
     
-    # Create test suite
-    loader = unittest.TestLoader()
-    suite = unittest.TestSuite()
-    
-    # Add test classes
-    test_classes = [
-        TestZoteroSync,
-        TestRemarkableSync, 
-        TestWorkflowOrchestrator,
-        TestBatchProcessor,
-        TestIntegration
-    ]
-    
-    for test_class in test_classes:
-        tests = loader.loadTestsFromTestCase(test_class)
-        suite.addTests(tests)
+    # Create test suite from every test class in this module
+    suite = unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
     
     # Run tests
-    runner = unittest.TextTestRunner(verbosity=2)
+    runner = unittest.TextTestRunner(verbosity=verbosity)
     result = runner.run(suite)
     
     # Print summary
@@ -298,5 +767,22 @@ def run_tests():
     return 0 if result.wasSuccessful() else 1
 
 
+def run_tests_parallel(verbosity: int = 1):
+    """Run the test classes across all CPU cores with pytest-xdist, if installed"""
+    try:
+        import pytest
+        import xdist  # noqa: F401
+    except ImportError:
+        pytest = None
+    
+    if pytest is None:
+        print("⚠️ pytest-xdist not installed (pip install pytest-xdist) - running tests serially")
+        return run_tests(verbosity)
+    
+    # Classes share setUpClass resources, so keep each class on one worker
+    return pytest.main([__file__, '-n', 'auto', '--dist', 'loadscope'] + (['-v'] if verbosity > 1 else ['-q']))
+
+
 if __name__ == "__main__":
-    sys.exit(run_tests())
+    verbosity = 2 if '-v' in sys.argv[1:] else 1
+    sys.exit(run_tests_parallel(verbosity) if '--parallel' in sys.argv[1:] else run_tests(verbosity))
@@ -8,34 +8,122 @@ import cv2
 import numpy as np
 import os
 import json
-from extracting_highlights_images import extract_highlights_and_red_annotations
+import functools
+from extracting_highlights_images import (
+    extract_highlights_and_red_annotations, load_config, find_color_rects, merge_nearby_rectangles,
+    page_has_color, pixmap_to_bgr, should_extract_annotation,
+    CROP_ZOOM, DETECTION_ZOOM, YELLOW_MERGE_THRESHOLDS, RED_MERGE_THRESHOLDS
+)
+from extraction_results import load_extraction_summary
 
-def extract_with_custom_params(pdf_path, horizontal_threshold=100, vertical_threshold=50, 
-                             yellow_area_min=500, red_area_min=200, padding=15):
+def merge_thresholds_for(horizontal_threshold, vertical_threshold):
     """
-    Extract with custom parameters for fine-tuning.
+    Yellow and red merge thresholds for a yellow (horizontal, vertical) setting.
+    
+    Red marks use the setting scaled by the same ratio as the default red thresholds.
+    
+    Returns:
+        Tuple of ((h, v) for yellow, (h, v) for red) in crop pixels
+    """
+    red_ratio = RED_MERGE_THRESHOLDS[0] / YELLOW_MERGE_THRESHOLDS[0]
+    return ((horizontal_threshold, vertical_threshold),
+            (horizontal_threshold * red_ratio, vertical_threshold * red_ratio))
+
+def extract_with_custom_params(pdf_path, horizontal_threshold=100, vertical_threshold=50):
+    """
+    Extract with custom merge thresholds for fine-tuning.
     """
+    yellow_thresholds, red_thresholds = merge_thresholds_for(horizontal_threshold, vertical_threshold)
+    
     print(f"\n🔧 EXTRACTION PARAMETERS:")
-    print(f"  - Horizontal merge threshold: {horizontal_threshold}px")
-    print(f"  - Vertical merge threshold: {vertical_threshold}px") 
-    print(f"  - Yellow region minimum area: {yellow_area_min}px²")
-    print(f"  - Red region minimum area: {red_area_min}px²")
-    print(f"  - Padding around regions: {padding}px")
+    print(f"  - Horizontal merge threshold: {horizontal_threshold}px (red: {red_thresholds[0]:g}px)")
+    print(f"  - Vertical merge threshold: {vertical_threshold}px (red: {red_thresholds[1]:g}px)")
     print()
     
-    # Temporarily modify the global parameters (not ideal, but works for demo)
-    # In a production version, you'd pass these as parameters
-    
     output_dir = f"extracted_content_h{horizontal_threshold}_v{vertical_threshold}"
     
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    # For now, use the default function but you could modify it to accept parameters
-    extracted_items = extract_highlights_and_red_annotations(pdf_path, output_dir)
+    extracted_items = extract_highlights_and_red_annotations(
+        pdf_path, output_dir, merge_thresholds=(yellow_thresholds, red_thresholds)
+    )
     
     return extracted_items, output_dir
 
+def detect_page_rects(pdf_path, extract_highlights=True, extract_handwriting=True):
+    """
+    Render and color-mask each page once, keeping the ungrouped regions.
+    
+    Grouping is the only step that depends on the merge thresholds, so these
+    can be regrouped with any number of settings without touching the pixels again.
+    
+    Returns:
+        Tuple of (annotation_count, page_rects): the number of PDF annotations
+        extraction would crop, and a (yellow_rects, red_rects) pair per page
+        in DETECTION_ZOOM pixels
+    """
+    annotation_count = 0
+    page_rects = []
+    
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            annots = [annot for annot in page.annots() if annot.type[1] != "Popup"]
+            extracted = sum(1 for annot in annots
+                            if should_extract_annotation(annot, annot.type[1], extract_highlights, extract_handwriting))
+            annotation_count += extracted
+            
+            # As in extraction, annotations that each get their own crop are left out of the detection render
+            render_annots = not (annots and extracted == len(annots))
+            if not page_has_color(page, extract_highlights, extract_handwriting, annots=render_annots):
+                continue
+            
+            pix = page.get_pixmap(matrix=fitz.Matrix(DETECTION_ZOOM, DETECTION_ZOOM), annots=render_annots)
+            page_img = pixmap_to_bgr(pix)
+            if page_img is not None:
+                page_rects.append(find_color_rects(page_img, extract_highlights, extract_handwriting, DETECTION_ZOOM))
+    
+    return annotation_count, page_rects
+
+@functools.lru_cache(maxsize=4)
+def _cached_page_rects(pdf_path, mtime_ns, extract_highlights, extract_handwriting):
+    """detect_page_rects memoized; mtime_ns is part of the key so an edited PDF is re-rendered"""
+    return detect_page_rects(pdf_path, extract_highlights, extract_handwriting)
+
+def cached_page_rects(pdf_path, extraction):
+    """
+    detect_page_rects for a PDF, rendered once per file version and extraction
+    settings and shared between tuning runs (treat as read-only)
+    
+    Args:
+        pdf_path: Path to the PDF
+        extraction: The "extraction" section of the config
+    """
+    pdf_path = os.path.abspath(pdf_path)
+    return _cached_page_rects(pdf_path, os.stat(pdf_path).st_mtime_ns,
+                              extraction.get("extract_highlights", True), extraction.get("extract_handwriting", True))
+
+@functools.lru_cache(maxsize=8)
+def _cached_summary(summary_file, mtime_ns):
+    """load_extraction_summary memoized; a re-run extraction rewrites the file and changes mtime_ns"""
+    return load_extraction_summary(summary_file)
+
+def count_groups(page_rects, horizontal_threshold, vertical_threshold):
+    """
+    Count the groups detect_page_rects' regions merge into at the given thresholds.
+    
+    The thresholds are for yellow highlights in crop pixels; red marks use
+    merge_thresholds_for's scaled version.
+    
+    Returns:
+        Tuple of (yellow_groups, red_groups)
+    """
+    scale = DETECTION_ZOOM / CROP_ZOOM
+    (yellow_h, yellow_v), (red_h, red_v) = merge_thresholds_for(horizontal_threshold, vertical_threshold)
+    
+    yellow_groups = red_groups = 0
+    for yellow_rects, red_rects in page_rects:
+        yellow_groups += len(merge_nearby_rectangles(yellow_rects, yellow_h * scale, yellow_v * scale))
+        red_groups += len(merge_nearby_rectangles(red_rects, red_h * scale, red_v * scale))
+    return yellow_groups, red_groups
+
 def compare_different_settings(pdf_path="Coldwell22.pdf"):
     """
     Test different parameter combinations to find optimal settings.
@@ -54,33 +142,27 @@ def compare_different_settings(pdf_path="Coldwell22.pdf"):
     
     results = []
     
+    # Rendering and color masking don't depend on the thresholds, so do them once
+    annotation_count, page_rects = cached_page_rects(pdf_path, load_config().get("extraction", {}))
+    
     for config in test_configs:
         print("\n 📊  Testing {config['name']} grouping...")
         
-        # Note: This is a simplified version. The actual implementation would need
-        # the functions to accept parameters
-        items, output_dir = extract_with_custom_params(
-            pdf_path, 
-            horizontal_threshold=config['h_thresh'],
-            vertical_threshold=config['v_thresh']
-        )
-        
-        yellow_groups = [item for item in items if 'yellow' in item['type']]
-        red_groups = [item for item in items if 'red' in item['type']]
+        yellow_groups, red_groups = count_groups(page_rects, config['h_thresh'], config['v_thresh'])
+        total_groups = annotation_count + yellow_groups + red_groups
         
         result = {
             "config": config['name'],
-            "total_groups": len(items),
-            "yellow_groups": len(yellow_groups),
-            "red_groups": len(red_groups),
-            "output_dir": output_dir
+            "total_groups": total_groups,
+            "yellow_groups": yellow_groups,
+            "red_groups": red_groups
         }
         
         results.append(result)
         
-        print(f"  - Total groups: {len(items)}")
-        print(f"  - Yellow groups: {len(yellow_groups)}")
-        print(f"  - Red groups: {len(red_groups)}")
+        print(f"  - Total groups: {total_groups}")
+        print(f"  - Yellow groups: {yellow_groups}")
+        print(f"  - Red groups: {red_groups}")
     
     print(f"\n📈 COMPARISON SUMMARY:")
     print("-" * 40)
@@ -89,7 +171,7 @@ def compare_different_settings(pdf_path="Coldwell22.pdf"):
     
     return results
 
-def interactive_parameter_tuning():
+def interactive_parameter_tuning(pdf_path="Coldwell22.pdf"):
     """
     Interactive tool for adjusting parameters.
     """
@@ -98,13 +180,15 @@ def interactive_parameter_tuning():
     print("=" * 40)
     print("Adjust these parameters to control how regions are grouped:")
     print()
+    print("Current grouping behavior:")
+    print("- Horizontal threshold: How far apart horizontally regions can be to still merge")
+    print("- Vertical threshold: How far apart vertically regions can be to still merge")
+    print("- Higher values = more aggressive grouping (fewer, larger groups)")
+    print("- Lower values = more conservative grouping (more, smaller groups)")
+    
+    extraction = load_config().get("extraction", {})
     
     while True:
-        print("Current grouping behavior:")
-        print("- Horizontal threshold: How far apart horizontally regions can be to still merge")
-        print("- Vertical threshold: How far apart vertically regions can be to still merge")
-        print("- Higher values = more aggressive grouping (fewer, larger groups)")
-        print("- Lower values = more conservative grouping (more, smaller groups)")
         print()
         
         try:
@@ -119,26 +203,25 @@ def interactive_parameter_tuning():
                 print("⚠️  Vertical threshold should be between 5-200")
                 continue
             
-            print(f"\n🔄 Running extraction with h_thresh={h_thresh}, v_thresh={v_thresh}...")
-            
-            # Run extraction with these parameters
-            items, output_dir = extract_with_custom_params(
-                "Coldwell22.pdf",
-                horizontal_threshold=h_thresh,
-                vertical_threshold=v_thresh
-            )
+            print(f"\n🔄 Grouping with h_thresh={h_thresh}, v_thresh={v_thresh}...")
             
-            yellow_groups = [item for item in items if 'yellow' in item['type']]
-            red_groups = [item for item in items if 'red' in item['type']]
+            # Pages are rendered and masked on the first try only; later tries just regroup
+            annotation_count, page_rects = cached_page_rects(pdf_path, extraction)
+            yellow_groups, red_groups = count_groups(page_rects, h_thresh, v_thresh)
             
             print(f"\n✅ Results:")
-            print(f"  - Total groups: {len(items)}")
-            print(f"  - Yellow groups: {len(yellow_groups)}")
-            print(f"  - Red groups: {len(red_groups)}")
-            print(f"  - Output saved to: {output_dir}/")
+            print(f"  - Total groups: {annotation_count + yellow_groups + red_groups}")
+            print(f"  - Yellow groups: {yellow_groups}")
+            print(f"  - Red groups: {red_groups}")
             
             satisfied = input("\nSatisfied with these results? (y/n): ").lower().strip()
             if satisfied in ['y', 'yes']:
+                # Only write the crops for the settings that were kept
+                items, output_dir = extract_with_custom_params(
+                    pdf_path,
+                    horizontal_threshold=h_thresh,
+                    vertical_threshold=v_thresh
+                )
                 print(f"\n🎉 Great! Your optimized extraction is in: {output_dir}/")
                 break
                 
@@ -161,41 +244,33 @@ def analyze_current_extraction():
         print("❌ No grouped extraction found. Run the main script first.")
         return
     
-    with open(summary_file, 'r') as f:
-        items = json.load(f)
+    summary_file = os.path.abspath(summary_file)
+    items = _cached_summary(summary_file, os.stat(summary_file).st_mtime_ns)
     
     print("📋 CURRENT EXTRACTION ANALYSIS")
     print("=" * 40)
     
     # Analyze grouping efficiency
-    total_individual_regions = sum(item.get('individual_regions', 1) for item in items)
+    region_counts = items.region_counts
+    total_individual_regions = int(region_counts.sum())
     
     print(f"Total groups created: {len(items)}")
     print(f"Total individual regions merged: {total_individual_regions}")
     print(f"Average regions per group: {total_individual_regions / len(items):.1f}")
     print()
     
-    # Analyze by page
-    by_page = {}
-    for item in items:
-        page = item['page']
-        if page not in by_page:
-            by_page[page] = {'yellow': [], 'red': []}
-        
-        if 'yellow' in item['type']:
-            by_page[page]['yellow'].append(item)
-        else:
-            by_page[page]['red'].append(item)
+    # Analyze by page in one pass; anything that isn't a yellow highlight counts as red
+    pages, page_index = np.unique(np.array(items.pages), return_inverse=True)
+    is_yellow = items.type_mask('yellow')
+    yellow_counts = np.bincount(page_index, weights=is_yellow, minlength=len(pages)).astype(int)
+    red_counts = np.bincount(page_index, weights=~is_yellow, minlength=len(pages)).astype(int)
+    yellow_regions = np.bincount(page_index, weights=region_counts * is_yellow, minlength=len(pages)).astype(int)
+    red_regions = np.bincount(page_index, weights=region_counts * ~is_yellow, minlength=len(pages)).astype(int)
     
     print("Page-by-page breakdown:")
-    for page in sorted(by_page.keys()):
-        yellow_count = len(by_page[page]['yellow'])
-        red_count = len(by_page[page]['red'])
-        
-        yellow_regions = sum(item.get('individual_regions', 1) for item in by_page[page]['yellow'])
-        red_regions = sum(item.get('individual_regions', 1) for item in by_page[page]['red'])
-        
-        print(f"  Page {page}: {yellow_count} yellow groups ({yellow_regions} regions), {red_count} red groups ({red_regions} regions)")
+    for page, y_count, r_count, y_regions, r_regions in zip(pages.tolist(), yellow_counts.tolist(), red_counts.tolist(),
+                                                            yellow_regions.tolist(), red_regions.tolist()):
+        print(f"  Page {page}: {y_count} yellow groups ({y_regions} regions), {r_count} red groups ({r_regions} regions)")
 
 def main():
     """Main menu for parameter tuning."""
@@ -8,15 +8,26 @@ based on configuration settings and generates both markdown and HTML output.
 """
 
 import os
-import json
-import base64
 from pathlib import Path
 from PIL import Image
 import requests
-import time
-import markdown
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 
+from config_loader import load_config
+from convert_to_html import render_markdown
+from image_dedup import find_near_duplicates
+from tesseract_threads import omp_thread_limit
+from ocr_cache import OCRCache, ocr_cache_path
+from mathpix_ocr_extractor import (
+    create_mathpix_session, MATHPIX_URL, MATHPIX_OPTIONS_JSON, MATHPIX_TIMEOUT, MATHPIX_CONCURRENCY,
+    MATHPIX_REQUESTS_PER_SECOND,
+    EXTRACT_TEMPLATE, CONFIDENCE_TEMPLATE, TEXT_TEMPLATE, LATEX_TEMPLATE, NO_CONTENT_MARKDOWN, ERROR_TEMPLATE
+)
+from rate_limiter import RateLimiter
+from ocr_stats import compute_ocr_statistics
+
 # Import Tesseract if available
 try:
     import pytesseract
@@ -30,18 +41,8 @@ try:
 except ImportError:
     CV2_AVAILABLE = False
 
-def load_config(config_file: str = "config.json") -> Dict:
-    """Load configuration from JSON file"""
-    try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config
-    except FileNotFoundError:
-        print(f"❌ Config file not found: {config_file}")
-        raise
-    except json.JSONDecodeError as e:
-        print(f"❌ Invalid JSON in config file: {e}")
-        raise
+# Smallest shard worth its own Tesseract process when OCR runs in parallel
+TESSERACT_MIN_BATCH = 4
 
 def setup_tesseract(config: Dict):
     """Setup Tesseract OCR based on configuration"""
@@ -94,68 +95,32 @@ def setup_mathpix_credentials(config: Dict):
     return app_id, app_key
 
 def extract_text_with_tesseract(image_path: str, language: str) -> Dict:
-    """Extract text using Tesseract OCR"""
+    """Extract text using Tesseract OCR, with one Tesseract run for both text and confidence"""
     if not TESSERACT_AVAILABLE:
-        return {
-            'text': '',
-            'confidence': 0,
-            'success': False,
-            'error': "pytesseract not available"
-        }
+        return _tesseract_failure("pytesseract not available")
     
     try:
-        img = Image.open(image_path)
-        
-        # Simple OCR configuration
-        text = pytesseract.image_to_string(img, lang=language)
-        text = text.strip()
-        
-        # Get confidence data
-        data = pytesseract.image_to_data(img, lang=language, output_type=pytesseract.Output.DICT)
-        confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-        
-        return {
-            'text': text,
-            'confidence': avg_confidence / 100,
-            'success': bool(text and avg_confidence > 30),
-            'error': None
-        }
-        
+        with Image.open(image_path) as img:
+            data = pytesseract.image_to_data(img, lang=language, output_type=pytesseract.Output.DICT)
     except Exception as e:
-        return {
-            'text': '',
-            'confidence': 0,
-            'success': False,
-            'error': f"Tesseract OCR failed: {str(e)}"
-        }
+        return _tesseract_failure(f"Tesseract OCR failed: {str(e)}")
+    
+    return _results_from_tsv(data, 1)[0]
 
-def extract_text_with_mathpix(image_path: str, app_id: str, app_key: str) -> Dict:
-    """Extract text using Mathpix OCR API"""
+def extract_text_with_mathpix(image_path: str, app_id: str, app_key: str, session: requests.Session = None) -> Dict:
+    """Extract text using Mathpix OCR API, on the given session if any"""
     try:
-        # Encode image to base64
-        with open(image_path, 'rb') as image_file:
-            image_base64 = base64.b64encode(image_file.read()).decode('utf-8')
-        
-        # Prepare API request
-        url = "https://api.mathpix.com/v3/text"
+        # Prepare API request; the image goes up as a raw multipart file
         headers = {
             "app_id": app_id,
-            "app_key": app_key,
-            "Content-type": "application/json"
+            "app_key": app_key
         }
         
-        data = {
-            "src": f"data:image/jpeg;base64,{image_base64}",
-            "formats": ["text", "latex_styled"],
-            "data_options": {
-                "include_asciimath": True,
-                "include_latex": True,
-                "include_tsv": False
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=data)
+        with open(image_path, 'rb') as image_file:
+            response = (session or requests).post(MATHPIX_URL, headers=headers,
+                                                  files={"file": image_file},
+                                                  data={"options_json": MATHPIX_OPTIONS_JSON},
+                                                  timeout=MATHPIX_TIMEOUT)
         response.raise_for_status()
         
         result = response.json()
@@ -181,76 +146,283 @@ def extract_text_with_mathpix(image_path: str, app_id: str, app_key: str) -> Dic
             'error': f"Mathpix OCR failed: {str(e)}"
         }
 
-def process_images_with_ocr(images_dir: str, config: Dict) -> List[Dict]:
-    """Process images with the configured OCR engine"""
+def extract_text_with_tesseract_batch(image_paths: List[str], language: str) -> List[Dict]:
+    """
+    Extract text from many images with a single Tesseract run
+
+    Tesseract accepts a text file listing one image per line, so the engine and
+    language data load once per batch instead of twice per image. Every TSV row
+    is tagged with the page_num of its image, which splits the results back out.
+
+    Returns:
+        One result dict per image, in the same order as image_paths
+    """
+    if not TESSERACT_AVAILABLE:
+        return [_tesseract_failure("pytesseract not available") for _ in image_paths]
+    
+    if not image_paths:
+        return []
+    
+    list_file = None
+    try:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write('\n'.join(os.path.abspath(p) for p in image_paths) + '\n')
+            list_file = f.name
+        
+        data = pytesseract.image_to_data(list_file, lang=language, output_type=pytesseract.Output.DICT)
+    except Exception:
+        # One unreadable image fails the whole run; OCR the images one at a
+        # time instead, so only the bad ones fail
+        data = None
+    finally:
+        if list_file:
+            os.unlink(list_file)
+    
+    if data is None:
+        return [extract_text_with_tesseract(path, language) for path in image_paths]
+    
+    return _results_from_tsv(data, len(image_paths))
+
+def _results_from_tsv(data: Dict, image_count: int) -> List[Dict]:
+    """
+    Build result dicts from image_to_data output covering image_count images
+
+    The text is rebuilt from the word rows, so a single Tesseract run gives
+    both the text and its confidence.
+    """
+    # Group word rows by image, then paragraph and line, in reading order
+    pages = [{} for _ in range(image_count)]
+    confidences = [[] for _ in range(image_count)]
+    
+    for i, page_num in enumerate(data['page_num']):
+        page_index = int(page_num) - 1
+        if not 0 <= page_index < image_count:
+            continue
+        
+        conf = int(float(data['conf'][i]))
+        if conf > 0:
+            confidences[page_index].append(conf)
+        
+        word = str(data['text'][i]).strip()
+        if int(data['level'][i]) == 5 and word:
+            paragraph = pages[page_index].setdefault((data['block_num'][i], data['par_num'][i]), {})
+            paragraph.setdefault(data['line_num'][i], []).append(word)
+    
+    results = []
+    for paragraphs, page_confidences in zip(pages, confidences):
+        # Same layout as image_to_string: lines break, paragraphs get a blank line
+        text = '\n\n'.join(
+            '\n'.join(' '.join(words) for words in lines.values())
+            for lines in paragraphs.values()
+        ).strip()
+        avg_confidence = sum(page_confidences) / len(page_confidences) if page_confidences else 0
+        
+        results.append({
+            'text': text,
+            'confidence': avg_confidence / 100,
+            'success': bool(text and avg_confidence > 30),
+            'error': None
+        })
+    
+    return results
+
+def extract_text_with_tesseract_parallel(image_paths: List[str], language: str, workers: int = None,
+                                         omp_threads: int = None) -> List[Dict]:
+    """
+    Extract text from many images with concurrent Tesseract batches
+
+    The images are split into contiguous shards of one list-file batch each, and
+    the Tesseract subprocesses run side by side from a thread pool. Parallel
+    processes get one OpenMP thread each unless omp_threads
+    (tesseract.omp_threads) says otherwise; it also applies to a single batch.
+
+    Returns:
+        One result dict per image, in the same order as image_paths
+    """
+    workers = min(workers or os.cpu_count() or 1, -(-len(image_paths) // TESSERACT_MIN_BATCH))
+    if workers <= 1:
+        with omp_thread_limit(omp_threads):
+            return extract_text_with_tesseract_batch(image_paths, language)
+    
+    shard_size = -(-len(image_paths) // workers)
+    shards = [image_paths[i:i + shard_size] for i in range(0, len(image_paths), shard_size)]
+    
+    with omp_thread_limit(omp_threads, parallel=True), ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        shard_results = list(executor.map(lambda shard: extract_text_with_tesseract_batch(shard, language), shards))
+    
+    return [result for results in shard_results for result in results]
+
+def extract_text_with_mathpix_parallel(image_paths: List[str], app_id: str, app_key: str, config: Dict) -> List[Dict]:
+    """
+    Extract text from many images with overlapping Mathpix requests
+
+    Requests run on mathpix.concurrency worker threads over one pooled session,
+    started no faster than mathpix.requests_per_second.
+
+    Returns:
+        One result dict per image, in the same order as image_paths
+    """
+    mathpix_config = config.get('mathpix', {})
+    concurrency = max(1, mathpix_config.get('concurrency', MATHPIX_CONCURRENCY))
+    rate_limiter = RateLimiter(mathpix_config.get('requests_per_second', MATHPIX_REQUESTS_PER_SECOND))
+    
+    def process_image(image_path: str) -> Dict:
+        rate_limiter.wait()
+        return extract_text_with_mathpix(image_path, app_id, app_key, session)
+    
+    with create_mathpix_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(process_image, image_paths))
+
+def _tesseract_failure(error: str) -> Dict:
+    """Result dict for an image Tesseract could not process"""
+    return {
+        'text': '',
+        'confidence': 0,
+        'success': False,
+        'error': error
+    }
+
+def find_image_files(images_dir: str) -> List[Path]:
+    """Find the extracted images in a directory, skipping preprocessed copies"""
+    # Filter on scandir entry names and only build Paths for the matches
+    with os.scandir(images_dir) as entries:
+        names = sorted(
+            entry.name for entry in entries
+            if entry.name.endswith('.png') and not entry.name.endswith('_preprocessed.png')
+            and entry.is_file()
+        )
+    return [Path(images_dir) / name for name in names]
+
+def ocr_image_files(image_files: List[Path], config: Dict) -> List[Dict]:
+    """
+    Run the configured OCR engine over a list of images
+
+    Tesseract processes the list in a few concurrent batches, so callers can pass
+    images from several PDFs at once to share the engine startups.
+
+    Returns:
+        One result dict per image, in the same order as image_files
+    """
     ocr_engine = config.get('ocr_engine', 'tesseract').lower()
     
-    print(f"🔍 Using OCR Engine: {ocr_engine.upper()}")
+    # Repeated crops reuse the result of the first copy instead of a new OCR run
+    max_distance = config.get('image_processing', {}).get('dedup_distance')
+    sources = find_near_duplicates(image_files, max_distance)
     
     # Setup OCR engine
     if ocr_engine == 'mathpix':
         app_id, app_key = setup_mathpix_credentials(config)
-        ocr_func = lambda img_path: extract_text_with_mathpix(img_path, app_id, app_key)
+        cache_engine = 'mathpix'
     elif ocr_engine == 'tesseract':
         language = setup_tesseract(config)
-        ocr_func = lambda img_path: extract_text_with_tesseract(img_path, language)
+        cache_engine = f'tesseract:{language}'
     else:
         raise ValueError(f"Unknown OCR engine: {ocr_engine}")
     
+    results = []
+    # Per-image status lines; results are all known by the time the loop runs,
+    # so they are printed together in one write
+    status = []
+    
+    with OCRCache(ocr_cache_path(config), cache_engine) as cache:
+        # Images OCR'd by an earlier run are read back from the cache
+        cached = {i: cache.get(str(f)) for i, f in enumerate(image_files) if sources[i] == i}
+        pending = [str(image_files[i]) for i, result in cached.items() if result is None]
+        
+        if ocr_engine == 'tesseract':
+            tesseract_config = config.get('tesseract', {})
+            batch_results = iter(extract_text_with_tesseract_parallel(pending, language, tesseract_config.get('workers'),
+                                                                      tesseract_config.get('omp_threads')))
+        else:
+            batch_results = iter(extract_text_with_mathpix_parallel(pending, app_id, app_key, config))
+        
+        for i, image_path in enumerate(image_files, 1):
+            source = sources[i - 1]
+            
+            if source != i - 1:
+                status.append(f"\n 📸 Reusing result of {image_files[source].name} for image {i}/{len(image_files)}: {image_path.name}")
+                results.append({
+                    **results[source],
+                    'image_file': image_path.name,
+                    'image_path': str(image_path)
+                })
+                continue
+            
+            result = cached[i - 1]
+            
+            if result is not None:
+                status.append(f"\n 📸 Cached result for image {i}/{len(image_files)}: {image_path.name}")
+            else:
+                status.append(f"\n 📸 Processed image {i}/{len(image_files)}: {image_path.name}")
+                
+                result = next(batch_results)
+                cache.put(str(image_path), result)
+            
+            if result['success']:
+                status.append(f"✅ OCR successful (confidence: {result['confidence']:.1%})")
+            else:
+                status.append(f"❌ OCR failed: {result['error']}")
+            
+            results.append({
+                'image_file': image_path.name,
+                'image_path': str(image_path),
+                'ocr_engine': ocr_engine,
+                **result
+            })
+    
+    if status:
+        print('\n'.join(status))
+    
+    return results
+
+def process_images_with_ocr(images_dir: str, config: Dict) -> List[Dict]:
+    """Process images with the configured OCR engine"""
+    ocr_engine = config.get('ocr_engine', 'tesseract').lower()
+    
+    print(f"🔍 Using OCR Engine: {ocr_engine.upper()}")
+    
     # Find image files
-    images_dir_path = Path(images_dir)
-    if not images_dir_path.exists():
+    if not Path(images_dir).exists():
         print(f"❌ Images directory not found: {images_dir}")
         return []
     
-    image_files = sorted([
-        f for f in images_dir_path.glob('*.png') 
-        if not f.name.endswith('_preprocessed.png')
-    ])
+    image_files = find_image_files(images_dir)
     
     print(f"📁 Found {len(image_files)} images to process")
     
-    results = []
-    successful_extractions = 0
-    total_confidence = 0
-    
-    for i, image_path in enumerate(image_files, 1):
-        print(f"\\n 📸 Processing image {i}/{len(image_files)}: {image_path.name}")
-        
-        # Extract text
-        result = ocr_func(str(image_path))
-        
-        if result['success']:
-            print(f"✅ OCR successful (confidence: {result['confidence']:.1%})")
-            successful_extractions += 1
-            total_confidence += result['confidence']
-        else:
-            print(f"❌ OCR failed: {result['error']}")
-        
-        results.append({
-            'image_file': image_path.name,
-            'image_path': str(image_path),
-            'ocr_engine': ocr_engine,
-            **result
-        })
-        
-        # Rate limiting for API calls
-        if ocr_engine == 'mathpix':
-            time.sleep(0.5)
+    results = ocr_image_files(image_files, config)
     
     # Print statistics
-    success_rate = (successful_extractions / len(image_files)) * 100 if image_files else 0
-    avg_confidence = (total_confidence / successful_extractions) if successful_extractions > 0 else 0
+    stats = compute_ocr_statistics(results)
     
     print(f"\\n 📊  Processing Statistics:")
     print(f"   • OCR Engine: {ocr_engine.upper()}")
-    print(f"   • Total images: {len(image_files)}")
-    print(f"   • Successful extractions: {successful_extractions}")
-    print(f"   • Success rate: {success_rate:.1f}%")
-    print(f"   • Average confidence: {avg_confidence:.1%}")
+    print(f"   • Total images: {stats['total_images']}")
+    print(f"   • Successful extractions: {stats['successful_extractions']}")
+    print(f"   • Success rate: {stats['success_rate']:.1f}%")
+    print(f"   • Average confidence: {stats['avg_confidence']:.1%}")
+    print(f"   • Median confidence: {stats['median_confidence']:.1%} (5th percentile: {stats['p5_confidence']:.1%})")
     
     return results
 
+def format_ocr_result(index: int, result: Dict, image_path: str) -> str:
+    """Markdown section for one OCR result, embedding its image from image_path"""
+    if result['success']:
+        body = CONFIDENCE_TEMPLATE.format(confidence=result['confidence'])
+        if result['text']:
+            body += TEXT_TEMPLATE.format(text=result['text'])
+        
+        # Add LaTeX if available (Mathpix)
+        if result.get('latex') and result['latex'] != result['text']:
+            body += LATEX_TEMPLATE.format(latex=result['latex'])
+        
+        if not result['text']:
+            body += NO_CONTENT_MARKDOWN
+    else:
+        body = ERROR_TEMPLATE.format(error=result.get('error', 'Unknown error'))
+    
+    return EXTRACT_TEMPLATE.format(index=index, image_file=result['image_file'], image_path=image_path, body=body)
+
 def generate_markdown(results: List[Dict], output_file: str, config: Dict):
     """Generate markdown file with OCR results"""
     ocr_engine = config.get('ocr_engine', 'tesseract').upper()
@@ -258,63 +430,37 @@ def generate_markdown(results: List[Dict], output_file: str, config: Dict):
     # Calculate relative path from markdown file to images
     output_dir = os.path.dirname(output_file)
     
+    # Statistics
+    stats = compute_ocr_statistics(results)
+    
+    parts = [
+        f"# PDF Highlights & Annotations - {ocr_engine} OCR Results\n\n",
+        f"*Generated using {ocr_engine} OCR engine*\n\n",
+        "## Processing Statistics\n\n",
+        f"- **OCR Engine**: {ocr_engine}\n",
+        f"- **Total Images Processed**: {stats['total_images']}\n",
+        f"- **Successful Extractions**: {stats['successful_extractions']}\n",
+        f"- **Success Rate**: {stats['success_rate']:.1f}%\n",
+        f"- **Average Confidence**: {stats['avg_confidence']:.1%}\n",
+        f"- **Median Confidence**: {stats['median_confidence']:.1%}\n",
+        f"- **5th Percentile Confidence**: {stats['p5_confidence']:.1%}\n\n",
+        "---\n\n"
+    ]
+    
+    # Results for each image
+    for i, result in enumerate(results, 1):
+        try:
+            image_path = os.path.relpath(result['image_path'], output_dir)
+        except ValueError as e:
+            # Fallback to original path if relative path calculation fails (e.g. another drive on Windows)
+            print(f"⚠️  Path calculation failed for {result['image_path']}: {e}")
+            image_path = result['image_path']
+        
+        parts.append(format_ocr_result(i, result, image_path))
+    
+    # The whole document is written in one call
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(f"# PDF Highlights & Annotations - {ocr_engine} OCR Results\n\n")
-        f.write(f"*Generated using {ocr_engine} OCR engine*\n\n")
-        
-        # Statistics
-        total_images = len(results)
-        successful = sum(1 for r in results if r['success'])
-        success_rate = (successful / total_images) * 100 if total_images > 0 else 0
-        avg_confidence = sum(r['confidence'] for r in results if r['success']) / successful if successful > 0 else 0
-        
-        f.write("## Processing Statistics\n\n")
-        f.write(f"- **OCR Engine**: {ocr_engine}\n")
-        f.write(f"- **Total Images Processed**: {total_images}\n")
-        f.write(f"- **Successful Extractions**: {successful}\n")
-        f.write(f"- **Success Rate**: {success_rate:.1f}%\n")
-        f.write(f"- **Average Confidence**: {avg_confidence:.1%}\n\n")
-        f.write("---\n\n")
-        
-        # Results for each image
-        for i, result in enumerate(results, 1):
-            f.write(f"## Extract {i}: {result['image_file']}\n\n")
-            
-            # Calculate relative path from markdown file to image
-            try:
-                image_path = result['image_path']
-                if os.path.isabs(image_path):
-                    # Convert absolute path to relative path from markdown file
-                    rel_path = os.path.relpath(image_path, output_dir)
-                else:
-                    # For relative paths, calculate relative to markdown output directory
-                    rel_path = os.path.relpath(image_path, output_dir)
-                f.write(f"![Extract {i}]({rel_path})\n\n")
-            except Exception as e:
-                # Fallback to original path if relative path calculation fails
-                print(f"⚠️  Path calculation failed for {result['image_path']}: {e}")
-                f.write(f"![Extract {i}]({result['image_path']})\n\n")
-            
-            if result['success']:
-                f.write(f"**Confidence**: {result['confidence']:.1%}\n\n")
-                
-                if result['text']:
-                    f.write("### Extracted Text\n\n")
-                    f.write(f"{result['text']}\n\n")
-                
-                # Add LaTeX if available (Mathpix)
-                if 'latex' in result and result['latex'] and result['latex'] != result['text']:
-                    f.write("### LaTeX Format\n\n")
-                    f.write("```latex\n")
-                    f.write(f"{result['latex']}\n")
-                    f.write("```\n\n")
-                
-                if not result['text']:
-                    f.write("*No text content extracted from this image*\n\n")
-            else:
-                f.write(f"**Error**: {result.get('error', 'Unknown error')}\n\n")
-            
-            f.write("---\n\n")
+        f.write(''.join(parts))
     
     print(f"📝 Markdown file generated: {output_file}")
 
@@ -328,7 +474,7 @@ def generate_html(markdown_file: str, html_file: str, config: Dict):
         markdown_content = f.read()
     
     # Convert markdown to HTML
-    html_content = markdown.markdown(markdown_content, extensions=['extra', 'codehilite'])
+    html_content = render_markdown(markdown_content)
     
     ocr_engine = config.get('ocr_engine', 'tesseract').upper()
     
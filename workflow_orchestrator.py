@@ -18,15 +18,17 @@ import os
 import json
 import logging
 import argparse
-from typing import Dict
+from typing import Dict, Optional
 import sys
-import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
 
 # Import our sync modules
 try:
     from zotero_sync import ZoteroSync
     from remarkable_sync import RemarkableSync
     from batch_processor import ensure_directories, process_all_pdfs
+    from config_loader import read_config
 except ImportError as e:
     print(f"❌ Import error: {e}")
     print("💡 Make sure all required modules are available")
@@ -62,9 +64,7 @@ class WorkflowOrchestrator:
     def _load_config(self) -> Dict:
         """Load configuration from file"""
         try:
-            with open(self.config_file, 'r') as f:
-                config = json.load(f)
-            return config
+            return read_config(self.config_file)
         except Exception as e:
             raise RuntimeError(f"Failed to load configuration: {e}")
     
@@ -107,10 +107,14 @@ class WorkflowOrchestrator:
             self.logger.error(f"❌ Zotero sync failed: {e}")
             return 0
     
-    def step2_remarkable_upload(self) -> int:
+    def step2_remarkable_upload(self, executor: Optional[Executor] = None) -> int:
         """
         Step 2: Upload to reMarkable
         
+        Args:
+            executor: Pool to run the uploads on, shared with the download when
+                the two run side by side
+        
         Returns:
             Number of files uploaded to reMarkable
         """
@@ -121,17 +125,21 @@ class WorkflowOrchestrator:
             return 0
         
         try:
-            uploaded = self.remarkable_sync.upload_to_read_files()
+            uploaded = self.remarkable_sync.upload_to_read_files(executor=executor)
             self.logger.info(f"✅ reMarkable upload complete: {uploaded} files uploaded")
             return uploaded
         except Exception as e:
             self.logger.error(f"❌ reMarkable upload failed: {e}")
             return 0
     
-    def step3_remarkable_download(self) -> int:
+    def step3_remarkable_download(self, executor: Optional[Executor] = None) -> int:
         """
         Step 3: Download annotated files from reMarkable
         
+        Args:
+            executor: Pool to run the downloads on, shared with the upload when
+                the two run side by side
+        
         Returns:
             Number of annotated files downloaded
         """
@@ -142,7 +150,7 @@ class WorkflowOrchestrator:
             return 0
         
         try:
-            downloaded = self.remarkable_sync.download_read_files()
+            downloaded = self.remarkable_sync.download_read_files(executor=executor)
             self.logger.info(f"✅ reMarkable download complete: {downloaded} files downloaded")
             return downloaded
         except Exception as e:
@@ -187,17 +195,8 @@ class WorkflowOrchestrator:
             'batch_processing': False
         }
         
-        # Step 1: Zotero sync
-        results['zotero_downloads'] = self.step1_zotero_sync()
-        
-        # Wait a bit between steps
-        time.sleep(2)
-        
-        # Step 2: Upload to reMarkable
-        results['remarkable_uploads'] = self.step2_remarkable_upload()
-        
-        # Step 3: Download from reMarkable (may not have new files immediately)
-        results['remarkable_downloads'] = self.step3_remarkable_download()
+        # Steps 1-3: Zotero sync, upload to and download from reMarkable
+        self._run_sync_steps(results, zotero=True, upload=True, download=True)
         
         # Step 4: Process annotations
         results['batch_processing'] = self.step4_batch_processing()
@@ -226,17 +225,8 @@ class WorkflowOrchestrator:
             'batch_processing': False
         }
         
-        if 'zotero' in steps:
-            results['zotero_downloads'] = self.step1_zotero_sync()
-            time.sleep(1)
-        
-        if 'upload' in steps:
-            results['remarkable_uploads'] = self.step2_remarkable_upload()
-            time.sleep(1)
-        
-        if 'download' in steps:
-            results['remarkable_downloads'] = self.step3_remarkable_download()
-            time.sleep(1)
+        self._run_sync_steps(results, zotero='zotero' in steps, upload='upload' in steps,
+                             download='download' in steps)
         
         if 'process' in steps:
             results['batch_processing'] = self.step4_batch_processing()
@@ -244,6 +234,36 @@ class WorkflowOrchestrator:
         self._print_workflow_summary(results)
         return results
     
+    def _run_sync_steps(self, results: Dict, zotero: bool, upload: bool, download: bool):
+        """
+        Run the selected sync steps, filling in their counts in results
+        
+        The upload sends the to-read folder that the Zotero sync fills, so those
+        two run in order. The download only touches the read folders and runs
+        alongside them; processing waits for all three as it reads the downloads.
+        The upload and download share one transfer pool, so at most
+        remarkable.max_workers rmapi transfers run at once.
+        """
+        def zotero_then_upload(transfers: Optional[Executor] = None):
+            if zotero:
+                results['zotero_downloads'] = self.step1_zotero_sync()
+            if upload:
+                results['remarkable_uploads'] = self.step2_remarkable_upload(transfers)
+        
+        if not download:
+            zotero_then_upload()
+            return
+        
+        if self.remarkable_sync:
+            transfer_pool = ThreadPoolExecutor(max_workers=self.remarkable_sync.max_workers)
+        else:
+            transfer_pool = nullcontext()
+        
+        with transfer_pool as transfers, ThreadPoolExecutor(max_workers=2) as executor:
+            upload_future = executor.submit(zotero_then_upload, transfers)
+            results['remarkable_downloads'] = self.step3_remarkable_download(transfers)
+            upload_future.result()
+    
     def _print_workflow_summary(self, results: Dict):
         """Print a summary of workflow results"""
         print("="*50)
@@ -11,13 +11,59 @@ This module handles synchronization with Zotero library, specifically:
 """
 
 import os
-import json
+import hashlib
 import logging
+import threading
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pyzotero import zotero
+import requests
 import time
 
+from config_loader import read_config
+from json_io import read_json, write_json
+
+ZOTERO_API_URL = "https://api.zotero.org"
+DOWNLOAD_TIMEOUT = (10, 60)  # (connect, read) seconds
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+DOWNLOAD_ATTEMPTS = 3
+
+# Seconds to wait after a 429 that names no Backoff or Retry-After, doubled on each retry
+RATE_LIMIT_BACKOFF = 1.0
+
+SYNC_STATE_FILE = '.zotero_sync_state.json'
+
+# The Zotero API takes at most 50 objects per write request
+TAG_BATCH_SIZE = 50
+
+# Characters that aren't allowed in filenames on common filesystems, plus
+# the C0 control characters
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*' + ''.join(map(chr, range(32)))})
+
+def _parse_backoff(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Backoff or Retry-After header
+    
+    Args:
+        value: Header value, either a number of seconds or an HTTP date
+        
+    Returns:
+        Seconds from now (0 for a date in the past), or None if the header is
+        missing or unreadable
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
 class ZoteroSync:
     """Handles Zotero library synchronization"""
     
@@ -37,9 +83,16 @@ class ZoteroSync:
         self.sync_tag = zotero_config.get('sync_tag', 'rm_to_sync')
         self.processed_tag = zotero_config.get('processed_tag', 'rm_processed')
         
+        # Number of PDF downloads to run at once
+        self.max_workers = max(1, zotero_config.get('max_workers', 4))
+        
         # Initialize folders
         folders = config.get('folders', {})
         self.to_read_folder = folders.get('to_read', 'to-read')
+        self._to_read_path = Path(self.to_read_folder)
+        
+        # Files already in the to-read folder, listed once per sync
+        self._existing_files: Optional[set] = None
         
         if not all([self.library_id, self.api_key]):
             raise ValueError("Zotero library_id and api_key are required")
@@ -47,12 +100,34 @@ class ZoteroSync:
         # Initialize Zotero client
         self.zot = zotero.Zotero(self.library_id, self.library_type, self.api_key)
         
+        # A pyzotero client keeps the last response and paging links on itself,
+        # so download threads each get their own
+        self._thread_clients = threading.local()
+        self._thread_clients.zot = self.zot
+        self._clients = [self.zot]
+        self._clients_lock = threading.Lock()
+        
+        # Backoff requested by the server on a streamed file download, which
+        # bypasses pyzotero's own handling
+        self._backoff_until = 0.0
+        
         # Setup logging
         # Setup logger (let application configure logging)
         self.logger = logging.getLogger(__name__)
         
         # Ensure directories exist
-        Path(self.to_read_folder).mkdir(parents=True, exist_ok=True)
+        self._to_read_path.mkdir(parents=True, exist_ok=True)
+        
+        # Library version left behind by the last sync; while the library is
+        # still at that version there is nothing new to fetch
+        self._state_path = self._to_read_path.parent / SYNC_STATE_FILE
+        self._library = f"{self.library_type}:{self.library_id}:{self.sync_tag}"
+    
+    def _query_tagged_items(self) -> List[Dict]:
+        self.logger.info(f"Fetching items tagged with '{self.sync_tag}'...")
+        items = self.zot.items(tag=self.sync_tag)
+        self.logger.info(f"Found {len(items)} items to sync")
+        return items
     
     def fetch_tagged_items(self) -> List[Dict]:
         """
@@ -62,14 +137,38 @@ class ZoteroSync:
             List of Zotero items with the sync tag
         """
         try:
-            self.logger.info(f"Fetching items tagged with '{self.sync_tag}'...")
-            items = self.zot.items(tag=self.sync_tag)
-            self.logger.info(f"Found {len(items)} items to sync")
-            return items
+            return self._query_tagged_items()
         except Exception as e:
             self.logger.error(f"Error fetching tagged items: {e}")
             return []
     
+    def _synced_library_version(self) -> Optional[int]:
+        """Library version recorded after the last complete sync, if any"""
+        try:
+            state = read_json(str(self._state_path))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or state.get('library') != self._library:
+            return None
+        return state.get('library_version')
+    
+    def _save_library_version(self, version: Optional[int]):
+        """Record the library version after a sync, replacing the old file in one rename"""
+        temp_path = f"{self._state_path}.tmp"
+        try:
+            write_json(temp_path, {'library': self._library, 'library_version': version})
+            os.replace(temp_path, self._state_path)
+        except OSError as e:
+            self.logger.error(f"Failed to save sync state: {e}")
+    
+    def _query_item_attachments(self, item_key: str) -> List[Dict]:
+        attachments = self._client().children(item_key)
+        pdf_attachments = [
+            att for att in attachments 
+            if att['data'].get('contentType') == 'application/pdf'
+        ]
+        return pdf_attachments
+    
     def get_item_attachments(self, item_key: str) -> List[Dict]:
         """
         Get attachments for a specific Zotero item
@@ -81,16 +180,134 @@ class ZoteroSync:
             List of attachment items
         """
         try:
-            attachments = self.zot.children(item_key)
-            pdf_attachments = [
-                att for att in attachments 
-                if att['data'].get('contentType') == 'application/pdf'
-            ]
-            return pdf_attachments
+            return self._query_item_attachments(item_key)
         except Exception as e:
             self.logger.error(f"Error fetching attachments for item {item_key}: {e}")
             return []
     
+    def _client(self) -> zotero.Zotero:
+        """
+        Zotero client for the current thread; the creating thread uses self.zot
+        
+        Waits first if the server has asked any of the clients to back off.
+        """
+        client = getattr(self._thread_clients, 'zot', None)
+        if client is None:
+            # Share the main client's connection pool, so worker threads reuse
+            # its open TLS connections instead of each making their own
+            http_client = getattr(self.zot, 'client', None)
+            if http_client is not None:
+                client = zotero.Zotero(self.library_id, self.library_type, self.api_key, client=http_client)
+            else:
+                client = zotero.Zotero(self.library_id, self.library_type, self.api_key)
+            self._thread_clients.zot = client
+            with self._clients_lock:
+                self._clients.append(client)
+        
+        self._wait_if_throttled()
+        return client
+    
+    def _wait_if_throttled(self):
+        """
+        Sleep until every Backoff/Retry-After the server has sent has expired
+        
+        Each pyzotero client waits out (and retries on 429) the backoffs from
+        its own responses; this makes the other threads' clients honor them too.
+        """
+        with self._clients_lock:
+            backoff_until = max([self._backoff_until] +
+                                [getattr(c, 'backoff_until', 0.0) for c in self._clients])
+        
+        remaining = backoff_until - time.time()
+        if remaining > 0:
+            self.logger.info(f"Zotero asked to back off, waiting {remaining:.1f}s")
+            time.sleep(remaining)
+    
+    def _session(self) -> requests.Session:
+        """HTTP session for the current thread's file downloads, kept alive between files"""
+        session = getattr(self._thread_clients, 'session', None)
+        if session is None:
+            session = requests.Session()
+            # Sent as Authorization, which requests drops when the file endpoint
+            # redirects to the storage host, unlike a custom header
+            session.headers.update({'Authorization': f'Bearer {self.api_key}', 'Zotero-API-Version': '3'})
+            self._thread_clients.session = session
+        return session
+    
+    def _stream_file(self, attachment_key: str, part_path: Path, md5: Optional[str] = None):
+        """
+        Stream an attachment's file to disk in chunks
+        
+        A part file left by an interrupted download is resumed with a Range
+        request, both by the next attempt after a dropped connection and by a
+        later sync. Honors Backoff/Retry-After like the pyzotero clients; 429
+        responses and dropped connections are retried up to DOWNLOAD_ATTEMPTS
+        times in all.
+        
+        Args:
+            attachment_key: Zotero attachment item key
+            part_path: File to write the contents to
+            md5: Expected MD5 of the whole file, from the attachment metadata
+            
+        Raises:
+            ValueError: If the downloaded file doesn't match md5
+        """
+        url = f"{ZOTERO_API_URL}/{self.library_type}s/{self.library_id}/items/{attachment_key}/file"
+        
+        last_error = None
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            
+            self._wait_if_throttled()
+            try:
+                with self._session().get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                    backoff = _parse_backoff(response.headers.get('Backoff') or response.headers.get('Retry-After'))
+                    if backoff is None and response.status_code == 429:
+                        backoff = RATE_LIMIT_BACKOFF * 2 ** attempt
+                    if backoff:
+                        with self._clients_lock:
+                            self._backoff_until = max(self._backoff_until, time.time() + backoff)
+                    if response.status_code == 429:
+                        self.logger.warning(f"Zotero is rate limiting the download of attachment {attachment_key}")
+                        continue
+                    if response.status_code == 416:
+                        # The part file is no prefix of the current file
+                        part_path.unlink()
+                        continue
+                    
+                    response.raise_for_status()
+                    
+                    # A server that ignores the Range header sends the whole file
+                    resumed = offset > 0 and response.status_code == 206
+                    digest = hashlib.md5()
+                    if resumed:
+                        self.logger.info(f"Resuming download at {offset} bytes")
+                        with open(part_path, 'rb') as f:
+                            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                                digest.update(chunk)
+                    
+                    with open(part_path, 'ab' if resumed else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            digest.update(chunk)
+            
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                # What arrived stays in the part file; the next attempt asks for the rest
+                self.logger.warning(f"Download of attachment {attachment_key} interrupted, retrying: {e}")
+                last_error = e
+                continue
+            
+            if md5 and digest.hexdigest() != md5:
+                part_path.unlink()
+                if resumed:
+                    # The partial file was stale; fetch the whole file instead
+                    continue
+                raise ValueError(f"Checksum mismatch for attachment {attachment_key}")
+            return
+        
+        raise RuntimeError(f"Download failed after {DOWNLOAD_ATTEMPTS} attempts") from last_error
+    
     def download_attachment(self, attachment: Dict, item_title: str) -> Optional[str]:
         """
         Download a PDF attachment from Zotero
@@ -111,20 +328,26 @@ class ZoteroSync:
             if not filename.endswith('.pdf'):
                 filename += '.pdf'
             
-            file_path = Path(self.to_read_folder) / filename
+            file_path = self._to_read_path / filename
             
             # Check if file already exists
-            if file_path.exists():
+            if self._existing_files is not None:
+                exists = filename in self._existing_files
+            else:
+                exists = file_path.exists()
+            if exists:
                 self.logger.info(f"File already exists: {filename}")
                 return str(file_path)
             
             self.logger.info(f"Downloading: {filename}")
             
-            # Download the file
-            file_content = self.zot.file(attachment_key)
-            
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
+            # Download under a temporary name so an interrupted download isn't
+            # mistaken for a finished one; the next sync resumes it
+            part_path = file_path.with_name(f"{filename}.{attachment_key}.part")
+            self._stream_file(attachment_key, part_path, attachment['data'].get('md5'))
+            os.replace(part_path, file_path)
+            if self._existing_files is not None:
+                self._existing_files.add(filename)
             
             self.logger.info(f"Successfully downloaded: {filename}")
             return str(file_path)
@@ -133,37 +356,80 @@ class ZoteroSync:
             self.logger.error(f"Error downloading attachment: {e}")
             return None
     
-    def update_item_tags(self, item_key: str, remove_tag: Optional[str] = None, add_tag: Optional[str] = None):
+    def _retag(self, item: Dict, remove_tag: Optional[str] = None, add_tag: Optional[str] = None):
+        """Change the tags on an item dict in place, without saving it"""
+        tags = item['data'].get('tags', [])
+        
+        # Remove specified tag
+        if remove_tag:
+            tags = [tag for tag in tags if tag.get('tag') != remove_tag]
+        
+        # Add new tag
+        if add_tag:
+            if not any(tag.get('tag') == add_tag for tag in tags):
+                tags.append({'tag': add_tag})
+        
+        item['data']['tags'] = tags
+    
+    def update_item_tags(self, item: Dict, remove_tag: Optional[str] = None, add_tag: Optional[str] = None):
         """
         Update tags for a Zotero item
         
         Args:
-            item_key: Zotero item key
+            item: Zotero item as returned by the API (its version guards the update)
             remove_tag: Tag to remove
             add_tag: Tag to add
         """
+        item_key = item.get('key', 'unknown')
         try:
-            item = self.zot.item(item_key)
-            tags = item['data'].get('tags', [])
-            
-            # Remove specified tag
-            if remove_tag:
-                tags = [tag for tag in tags if tag.get('tag') != remove_tag]
-            
-            # Add new tag
-            if add_tag:
-                if not any(tag.get('tag') == add_tag for tag in tags):
-                    tags.append({'tag': add_tag})
-            
-            # Update the item
-            item['data']['tags'] = tags
-            self.zot.update_item(item)
+            self._retag(item, remove_tag, add_tag)
+            self._client().update_item(item)
             
             self.logger.info(f"Updated tags for item {item_key}")
             
         except Exception as e:
             self.logger.error(f"Error updating tags for item {item_key}: {e}")
     
+    def update_items_tags(self, items: List[Dict], remove_tag: Optional[str] = None,
+                          add_tag: Optional[str] = None) -> bool:
+        """
+        Update tags for several Zotero items, 50 per request
+        
+        Args:
+            items: Zotero items as returned by the API
+            remove_tag: Tag to remove
+            add_tag: Tag to add
+            
+        Returns:
+            True if every item was updated
+        """
+        client = self._client()
+        all_updated = True
+        
+        for start in range(0, len(items), TAG_BATCH_SIZE):
+            batch = items[start:start + TAG_BATCH_SIZE]
+            try:
+                for item in batch:
+                    self._retag(item, remove_tag, add_tag)
+                client.update_items(batch)
+                
+                # A multi-object write answers 200 even when some objects were
+                # refused (e.g. 412 for an item edited since it was fetched)
+                failed = client.request.json().get('failed', {})
+                if failed:
+                    all_updated = False
+                    for index, error in failed.items():
+                        self.logger.error(f"Error updating tags for item {batch[int(index)]['key']}: "
+                                          f"{error.get('message', error)}")
+                
+                self.logger.info(f"Updated tags for {len(batch) - len(failed)} items")
+                
+            except Exception as e:
+                all_updated = False
+                self.logger.error(f"Error updating tags for {len(batch)} items: {e}")
+        
+        return all_updated
+    
     def sync_to_read_items(self) -> int:
         """
         Main sync function: fetch tagged items and download PDFs
@@ -171,48 +437,130 @@ class ZoteroSync:
         Returns:
             Number of successfully downloaded files
         """
-        items = self.fetch_tagged_items()
+        try:
+            library_version = self.zot.last_modified_version()
+        except Exception as e:
+            self.logger.warning(f"Could not read the library version: {e}")
+            library_version = None
+        
+        if library_version is not None and library_version == self._synced_library_version():
+            self.logger.info("Library unchanged since the last sync. Nothing to do.")
+            return 0
+        
+        try:
+            items = self._query_tagged_items()
+        except Exception as e:
+            self.logger.error(f"Error fetching tagged items: {e}")
+            return 0
         downloaded_count = 0
         
-        for item in items:
-            try:
-                item_key = item['key']
-                item_data = item['data']
-                item_title = item_data.get('title', f'Item_{item_key}')
-                
-                self.logger.info(f"Processing item: {item_title}")
-                
-                # Get PDF attachments
-                attachments = self.get_item_attachments(item_key)
+        # Whether every tagged item was handled without an error; only then may
+        # later syncs skip the library at this version
+        complete = True
+        
+        self._to_read_path.mkdir(parents=True, exist_ok=True)
+        self._existing_files = set(os.listdir(self._to_read_path))
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Look up each item's PDFs concurrently; the tagged items already say
+            # how many children they have, so childless ones need no request
+            lookups = {}
+            for index, item in enumerate(items):
+                try:
+                    item_key = item['key']
+                    item_data = item['data']
+                    item_title = item_data.get('title', f'Item_{item_key}')
+                    self.logger.info(f"Processing item: {item_title}")
+                    
+                    if item.get('meta', {}).get('numChildren', 1) == 0:
+                        self.logger.warning(f"No PDF attachments found for: {item_title}")
+                        continue
+                    
+                    lookup = executor.submit(self._query_item_attachments, item_key)
+                    lookups[lookup] = (index, item, item_title)
+                    
+                except Exception as e:
+                    self.logger.error(f"Error processing item {item.get('key', 'unknown')}: {e}")
+                    complete = False
+                    continue
+            
+            # Start each item's downloads as soon as its own lookup is back,
+            # rather than waiting for the lookups of the items before it
+            downloads = {}
+            for lookup in as_completed(lookups):
+                index, item, item_title = lookups[lookup]
+                try:
+                    attachments = lookup.result()
+                except Exception as e:
+                    self.logger.error(f"Error fetching attachments for item {item['key']}: {e}")
+                    complete = False
+                    continue
                 
                 if not attachments:
                     self.logger.warning(f"No PDF attachments found for: {item_title}")
                     continue
                 
-                # Download each PDF attachment
-                for attachment in attachments:
-                    downloaded_file = self.download_attachment(attachment, item_title)
+                downloads[index] = (item, attachments,
+                                    [executor.submit(self.download_attachment, attachment, item_title)
+                                     for attachment in attachments])
+            
+            # Update tags (remove sync tag, add processed tag) a batch at a time
+            # as items finish, so an interrupted sync keeps most of its progress
+            processed = []
+            processed_attachments = []
+            for index in sorted(downloads):
+                item, attachments, futures = downloads[index]
+                try:
+                    paths = [future.result() for future in futures]
+                    downloaded_count += sum(1 for path in paths if path)
                     
-                    if downloaded_file:
-                        downloaded_count += 1
+                except Exception as e:
+                    self.logger.error(f"Error processing item {item['key']}: {e}")
+                    complete = False
+                    continue
                 
-                # Update tags: remove sync tag, add processed tag
-                self.update_item_tags(
-                    item_key, 
-                    remove_tag=self.sync_tag, 
-                    add_tag=self.processed_tag
-                )
+                # An item with a failed download keeps its sync tag, so the next
+                # sync retries (and resumes) the download
+                if not all(paths):
+                    self.logger.warning(f"Keeping '{self.sync_tag}' on {item['key']} until all its PDFs download")
+                    complete = False
+                    continue
                 
-                # Rate limiting to be nice to Zotero API
-                time.sleep(0.5)
+                processed.append(item)
+                processed_attachments.extend(attachment['key'] for attachment in attachments)
                 
-            except Exception as e:
-                self.logger.error(f"Error processing item {item.get('key', 'unknown')}: {e}")
-                continue
+                if len(processed) == TAG_BATCH_SIZE:
+                    complete &= self.update_items_tags(processed, remove_tag=self.sync_tag,
+                                                       add_tag=self.processed_tag)
+                    self._remove_part_files(processed_attachments)
+                    processed, processed_attachments = [], []
+        
+        if processed:
+            complete &= self.update_items_tags(processed, remove_tag=self.sync_tag, add_tag=self.processed_tag)
+            self._remove_part_files(processed_attachments)
+        
+        # Record the version the items were queried at, not the one after our
+        # own retagging: a tag added while the sync ran must not count as seen.
+        # Retagging moves the library on, so the next sync queries once more.
+        if complete:
+            self._save_library_version(library_version)
         
         self.logger.info(f"Sync complete. Downloaded {downloaded_count} files.")
         return downloaded_count
     
+    def _remove_part_files(self, attachment_keys: List[str]):
+        """Delete part files left for attachments whose items are done syncing"""
+        suffixes = tuple(f".{key}.part" for key in attachment_keys)
+        if not suffixes:
+            return
+        
+        for name in os.listdir(self._to_read_path):
+            if name.endswith(suffixes):
+                try:
+                    (self._to_read_path / name).unlink()
+                except OSError as e:
+                    self.logger.warning(f"Could not remove {name}: {e}")
+    
     def _sanitize_filename(self, filename: str) -> str:
         """
         Sanitize filename for filesystem compatibility
@@ -223,10 +571,8 @@ class ZoteroSync:
         Returns:
             Sanitized filename
         """
-        # Remove or replace problematic characters
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
+        # Replace problematic characters
+        filename = filename.translate(_SANITIZE_TABLE)
         
         # Limit length
         if len(filename) > 200:
@@ -243,8 +589,7 @@ def main():
     
     # Load configuration
     try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
+        config = read_config('config.json')
     except Exception as e:
         print(f"❌ Failed to load config: {e}")
         return